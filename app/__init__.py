@@ -24,7 +24,13 @@ def create_app(config_class=Config):
     
     # Create database tables
     with app.app_context():
+        # WAL, busy timeout ושאר הגדרות SQLite לכל חיבור - ראו app/database.py
+        from app.database import configure_sqlite
+        configure_sqlite(db.engine)
         db.create_all()
+        # אינדקס החיפוש (FTS5) וה-triggers שמסנכרנים אותו - ראו app/client_search.py
+        from app.client_search import ensure_search_index
+        ensure_search_index()
     
     # Register error handlers
     @app.errorhandler(404)
@@ -0,0 +1,107 @@
+"""
+סיכומי פטור לקבוצות גדולות של לקוחות.
+
+הלקוחות נטענים בקבוצות (chunk) עם כל הנתונים הקשורים במספר קבוע של שאילתות
+לקבוצה, מקדמי ההצמדה של כל המענקים בקבוצה נשלפים בקריאה אחת (זוג חודשים
+ייחודי = שליפה אחת), והסכומים המוצמדים מחושבים וקטורית (engine_batch).
+הסיכום של כל לקוח מורכב ב-engine.compute_summary ולכן זהה ל-calculate_summary.
+
+כמו calculate_summary בברירת המחדל (ללא persist), זו קריאה בלבד - לא נשמרות תוצאות במענקים.
+"""
+import numpy as np
+from sqlalchemy import select
+
+from app.models import db, Client
+from app.engine import resolve_eligibility_date, compute_summary
+from app.engine_batch import round_cents
+from app.repository import load_client_graphs, first_pension, included_commutations
+from app.utils import to_client_input, to_grant_inputs, to_commutation_inputs
+
+# מספר לקוחות בכל קבוצה
+DEFAULT_CHUNK_SIZE = 200
+
+
+def summaries_for_clients(clients: list) -> list:
+    """
+    סיכומים ללקוחות שכבר נטענו עם הגרף שלהם (load_client_graphs).
+
+    :return: רשימה באותו סדר - מילון הסיכום, או {"client_id", "error"} ללקוח שנכשל
+    """
+    from app.indexation import get_indexation_factors
+
+    prepared = []
+    results = {}
+    for client in clients:
+        try:
+            client_input = to_client_input(client)
+            pension = first_pension(client)
+            eligibility_date = resolve_eligibility_date(client_input, pension.start_date if pension else None)
+            prepared.append((client, client_input, eligibility_date, to_grant_inputs(client.grants)))
+        except Exception as e:
+            results[client.id] = {"client_id": client.id, "error": str(e)}
+
+    # כל המענקים בקבוצה שאפשר להצמיד - שליפת מקדמים אחת וחישוב וקטורי אחד
+    indexable = [(grant, eligibility_date)
+                 for _, _, eligibility_date, grants in prepared
+                 for grant in grants
+                 if grant.amount and grant.work_start_date and grant.work_end_date]
+    factors = get_indexation_factors([(grant.work_end_date, elig) for grant, elig in indexable])
+    # None (הצמדה שנכשלה) הופך ל-NaN
+    grant_factors = np.array([factors.get((grant.work_end_date.isoformat()[:7], elig.isoformat()[:7]))
+                              for grant, elig in indexable], dtype=np.float64)
+    indexed = round_cents(np.array([grant.amount for grant, _ in indexable], dtype=np.float64) * grant_factors)
+    indexed_amounts = {
+        grant.id: None if np.isnan(amount) else float(amount)
+        for (grant, _), amount in zip(indexable, indexed)
+    }
+
+    for client, client_input, eligibility_date, grants in prepared:
+        try:
+            result = compute_summary(client_input, grants, to_commutation_inputs(included_commutations(client)),
+                                     eligibility_date, indexed_amounts)
+            results[client.id] = result.to_dict()
+        except Exception as e:
+            results[client.id] = {"client_id": client.id, "error": str(e)}
+
+    return [results[client.id] for client in clients]
+
+
+def iter_client_ids(client_ids: list | None = None, filters: dict | None = None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    מזהי לקוחות בקבוצות: הרשימה שהתקבלה כמו שהיא, או כל הלקוחות שעונים על הסינון
+    (לפי סדר המזהה, keyset - ללא OFFSET)
+
+    :param filters: last_name (תחילית), gender
+    """
+    if client_ids is not None:
+        for i in range(0, len(client_ids), chunk_size):
+            yield client_ids[i:i + chunk_size]
+        return
+
+    filters = filters or {}
+    after_id = 0
+    while True:
+        query = select(Client.id).where(Client.id > after_id)
+        if filters.get('last_name'):
+            query = query.where(Client.last_name.startswith(filters['last_name'], autoescape=True))
+        if filters.get('gender'):
+            query = query.where(Client.gender == filters['gender'])
+        ids = db.session.execute(query.order_by(Client.id).limit(chunk_size)).scalars().all()
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+
+def iter_summaries(client_ids: list | None = None, filters: dict | None = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    מחולל סיכומים - קבוצה אחרי קבוצה, כך שהזיכרון תלוי בגודל הקבוצה ולא במספר הלקוחות.
+    מזהה שלא נמצא מחזיר {"client_id", "error"}.
+    """
+    for chunk in iter_client_ids(client_ids, filters, chunk_size):
+        clients = load_client_graphs(chunk)
+        summaries = {client.id: summary for client, summary in zip(clients, summaries_for_clients(clients))}
+        for client_id in chunk:
+            yield summaries.get(client_id) or {"client_id": client_id, "error": "לקוח לא נמצא"}
+        db.session.expunge_all()
@@ -0,0 +1,331 @@
+"""
+ייבוא מרוכז של לקוחות עם המענקים, הקצבאות וההיוונים שלהם (קליטת משרד חדש).
+
+שני פורמטים, שניהם נקראים בזרימה (לא נטענים לזיכרון בבת אחת):
+
+- JSON lines: לקוח בכל שורה, עם רשימות מקוננות
+    {"ref": "A1", "first_name": ..., "last_name": ..., "birth_date": "1960-05-10", "gender": "male",
+     "grants": [{"employer_name": ..., "grant_amount": ..., "work_start_date": ..., "work_end_date": ...}],
+     "pensions": [{"payer_name": ..., "start_date": ..., "commutations": [{"amount": ..., "date": ...}]}]}
+
+- CSV: רשומה בכל שורה, עם עמודת record_type (client / grant / pension / commutation).
+  client_ref מקשר מענק / קצבה ללקוח, ו-pension_ref מקשר היוון לקצבה של אותו לקוח.
+  שורות של לקוח מופיעות ברצף, מיד אחרי שורת ה-client שלו.
+
+הלקוחות מעובדים בקבוצות: כל קבוצה נבדקת (כולל שאילתה אחת לכפילויות ת"ז מול המסד),
+נכתבת ב-insert מרוכז לכל טבלה ונשמרת ב-commit אחד. לקוח שנכשל בבדיקה לא נכנס
+ומופיע בדוח השגיאות עם מספר השורה; שאר הקבוצה נכנסת.
+"""
+import csv
+import json
+from datetime import date
+from logging import getLogger
+
+from sqlalchemy import insert, select
+
+from app.models import db, Client, Grant, Pension, Commutation
+from app.summary_cache import bump_client_versions
+from app.utils import normalize_tz
+
+logger = getLogger(__name__)
+
+# מספר לקוחות בכל טרנזקציה
+DEFAULT_CHUNK_SIZE = 500
+
+CLIENT_FIELDS = ('first_name', 'last_name', 'tz', 'birth_date', 'phone', 'address', 'gender',
+                 'reserved_grant_amount')
+GRANT_FIELDS = ('employer_name', 'work_start_date', 'work_end_date', 'grant_amount', 'grant_date')
+PENSION_FIELDS = ('payer_name', 'start_date')
+COMMUTATION_FIELDS = ('withholding_file', 'amount', 'date', 'full_or_partial', 'include_calc')
+
+
+class ImportRowError(ValueError):
+    """שורה שלא עברה בדיקה; errors הוא רשימת ההודעות"""
+
+    def __init__(self, errors: list):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+# ---------- קריאת הקובץ ----------
+
+def iter_jsonl_records(stream):
+    """(מספר שורה, לקוח) לכל שורה לא ריקה; שורה שאינה JSON תקין מוחזרת כשגיאה"""
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            record = {'_error': f"JSON לא תקין: {e.msg}"}
+        yield line_no, record
+
+
+def iter_csv_records(stream):
+    """
+    מקבץ את שורות ה-CSV ללקוחות מקוננים כמו ב-JSON lines.
+    מספר השורה של לקוח הוא שורת ה-client שלו (השורה הראשונה בקובץ היא הכותרת).
+    """
+    current = None
+    current_line = None
+    pensions = {}
+    for line_no, row in enumerate(csv.DictReader(stream), start=2):
+        row = {key: value for key, value in row.items() if key and value not in (None, '')}
+        record_type = row.pop('record_type', None)
+        client_ref = row.pop('client_ref', None)
+        pension_ref = row.pop('pension_ref', None)
+
+        if record_type == 'client':
+            if current is not None:
+                yield current_line, current
+            current = dict(row, ref=client_ref, grants=[], pensions=[])
+            current_line = line_no
+            pensions = {}
+            continue
+
+        if current is None or client_ref != current['ref']:
+            yield line_no, {'ref': client_ref, '_error': f"שורת {record_type} ללא שורת client לפניה"}
+            continue
+        if record_type == 'grant':
+            current['grants'].append(row)
+        elif record_type == 'pension':
+            pension = dict(row, commutations=[])
+            current['pensions'].append(pension)
+            if pension_ref:
+                pensions[pension_ref] = pension
+        elif record_type == 'commutation' and pension_ref in pensions:
+            pensions[pension_ref]['commutations'].append(row)
+        else:
+            current.setdefault('_row_errors', []).append(f"שורה {line_no}: רשומה לא מוכרת או ללא קצבה ({record_type})")
+
+    if current is not None:
+        yield current_line, current
+
+
+def iter_records(stream, fmt: str):
+    if fmt == 'jsonl':
+        return iter_jsonl_records(stream)
+    if fmt == 'csv':
+        return iter_csv_records(stream)
+    raise ValueError(f"פורמט לא מוכר: {fmt}")
+
+
+# ---------- בדיקה ----------
+
+def _date(record: dict, field: str, errors: list, required: bool = False):
+    value = record.get(field)
+    if not value:
+        if required:
+            errors.append(f"{field}: שדה חובה")
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        errors.append(f"{field}: תאריך לא תקין ({value})")
+        return None
+
+
+def _amount(record: dict, field: str, errors: list, required: bool = False):
+    value = record.get(field)
+    if value in (None, ''):
+        if required:
+            errors.append(f"{field}: שדה חובה")
+        return None
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        errors.append(f"{field}: סכום לא תקין ({value})")
+        return None
+    if amount < 0:
+        errors.append(f"{field}: סכום שלילי")
+    return amount
+
+
+def _bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() not in ('0', 'false', 'no', 'לא')
+    return bool(value) if value is not None else True
+
+
+def validate_record(record: dict) -> dict:
+    """
+    בודק לקוח אחד וממיר אותו לשורות מוכנות ל-insert.
+
+    :raises ImportRowError: עם כל השגיאות של הלקוח (לא רק הראשונה)
+    """
+    errors = []
+    if '_error' in record:
+        raise ImportRowError([record['_error']])
+    errors.extend(record.get('_row_errors', []))
+
+    client = {field: record.get(field) for field in ('first_name', 'last_name', 'phone', 'address')}
+    for field in ('first_name', 'last_name'):
+        if not client[field]:
+            errors.append(f"{field}: שדה חובה")
+    try:
+        client['tz'] = normalize_tz(record.get('tz'))
+    except ValueError as e:
+        errors.append(f"tz: {e}")
+        client['tz'] = None
+    client['birth_date'] = _date(record, 'birth_date', errors, required=True)
+    client['gender'] = record.get('gender')
+    if client['gender'] not in ('male', 'female'):
+        errors.append(f"gender: חייב להיות male או female ({client['gender']})")
+    client['reserved_grant_amount'] = _amount(record, 'reserved_grant_amount', errors) or 0.0
+
+    grants = []
+    for i, grant in enumerate(record.get('grants') or [], start=1):
+        grant_errors = []
+        row = {
+            'employer_name': grant.get('employer_name'),
+            'grant_amount': _amount(grant, 'grant_amount', grant_errors, required=True),
+            'work_start_date': _date(grant, 'work_start_date', grant_errors),
+            'work_end_date': _date(grant, 'work_end_date', grant_errors),
+            'grant_date': _date(grant, 'grant_date', grant_errors),
+        }
+        if row['work_start_date'] and row['work_end_date'] and row['work_start_date'] > row['work_end_date']:
+            grant_errors.append("work_start_date אחרי work_end_date")
+        errors.extend(f"מענק {i}: {error}" for error in grant_errors)
+        grants.append(row)
+
+    pensions = []
+    for i, pension in enumerate(record.get('pensions') or [], start=1):
+        pension_errors = []
+        row = {
+            'payer_name': pension.get('payer_name'),
+            'start_date': _date(pension, 'start_date', pension_errors, required=True),
+        }
+        commutations = []
+        for j, commutation in enumerate(pension.get('commutations') or [], start=1):
+            commutation_errors = []
+            full_or_partial = commutation.get('full_or_partial')
+            if full_or_partial not in (None, 'full', 'partial'):
+                commutation_errors.append(f"full_or_partial: חייב להיות full או partial ({full_or_partial})")
+            commutations.append({
+                'withholding_file': commutation.get('withholding_file'),
+                'amount': _amount(commutation, 'amount', commutation_errors, required=True),
+                'date': _date(commutation, 'date', commutation_errors),
+                'full_or_partial': full_or_partial,
+                'include_calc': _bool(commutation.get('include_calc')),
+            })
+            pension_errors.extend(f"היוון {j}: {error}" for error in commutation_errors)
+        errors.extend(f"קצבה {i}: {error}" for error in pension_errors)
+        pensions.append((row, commutations))
+
+    if errors:
+        raise ImportRowError(errors)
+    return {'client': client, 'grants': grants, 'pensions': pensions}
+
+
+# ---------- כתיבה ----------
+
+def _insert_chunk(validated: list) -> list:
+    """
+    insert מרוכז של קבוצת לקוחות: שאילתה אחת לכל טבלה (ועוד שלוש לגרסאות הלקוחות).
+    :return: מזהי הלקוחות החדשים, באותו סדר
+    """
+    client_ids = db.session.execute(
+        insert(Client).returning(Client.id, sort_by_parameter_order=True),
+        [item['client'] for item in validated]
+    ).scalars().all()
+
+    grant_rows = []
+    pension_rows = []
+    pension_commutations = []
+    for client_id, item in zip(client_ids, validated):
+        grant_rows.extend(dict(grant, client_id=client_id) for grant in item['grants'])
+        for pension, commutations in item['pensions']:
+            pension_rows.append(dict(pension, client_id=client_id))
+            pension_commutations.append(commutations)
+
+    if grant_rows:
+        db.session.execute(insert(Grant), grant_rows)
+    if pension_rows:
+        pension_ids = db.session.execute(
+            insert(Pension).returning(Pension.id, sort_by_parameter_order=True), pension_rows
+        ).scalars().all()
+        commutation_rows = [
+            dict(commutation, pension_id=pension_id)
+            for pension_id, commutations in zip(pension_ids, pension_commutations)
+            for commutation in commutations
+        ]
+        if commutation_rows:
+            db.session.execute(insert(Commutation), commutation_rows)
+
+    bump_client_versions(client_ids)
+    return client_ids
+
+
+def _import_chunk(chunk: list, report: dict):
+    """בדיקה וכתיבה של קבוצה אחת; השגיאות נרשמות בדוח"""
+    validated = []
+    lines = []
+    for line_no, record in chunk:
+        try:
+            validated.append(validate_record(record))
+            lines.append((line_no, record.get('ref')))
+        except ImportRowError as e:
+            report['errors'].append({'line': line_no, 'ref': record.get('ref'), 'errors': e.errors})
+
+    # כפילויות ת"ז - בתוך הקבוצה, מול קבוצות קודמות ומול המסד (שאילתה אחת)
+    tzs = {item['client']['tz'] for item in validated if item['client']['tz']}
+    taken = set(db.session.execute(select(Client.tz).where(Client.tz.in_(tzs))).scalars()) if tzs else set()
+    unique = []
+    for item, (line_no, ref) in zip(validated, lines):
+        tz = item['client']['tz']
+        if tz and tz in taken:
+            report['errors'].append({'line': line_no, 'ref': ref, 'errors': [f"tz: לקוח עם ת\"ז {tz} כבר קיים"]})
+            continue
+        if tz:
+            taken.add(tz)
+        unique.append((item, line_no, ref))
+
+    if not unique:
+        return
+    try:
+        client_ids = _insert_chunk([item for item, _, _ in unique])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("כתיבת קבוצת ייבוא נכשלה: %s", e)
+        report['errors'].extend({'line': line_no, 'ref': ref, 'errors': [f"שגיאת מסד נתונים: {e}"]}
+                                for _, line_no, ref in unique)
+        return
+    report['imported'] += len(client_ids)
+    report['client_ids'].extend(client_ids)
+    report['grants'] += sum(len(item['grants']) for item, _, _ in unique)
+    report['pensions'] += sum(len(item['pensions']) for item, _, _ in unique)
+    report['commutations'] += sum(len(c) for item, _, _ in unique for _, c in item['pensions'])
+
+
+def import_records(records, chunk_size: int = DEFAULT_CHUNK_SIZE, compute_summaries: bool = False) -> dict:
+    """
+    ייבוא של (מספר שורה, לקוח) בקבוצות.
+
+    :param compute_summaries: בסוף הייבוא לחשב את המענקים ואת הסיכום השמור (client_summary) של הלקוחות החדשים
+    :return: דוח - כמה נקלטו, מזהי הלקוחות החדשים ושגיאה לכל לקוח שלא נקלט
+    """
+    from app.client_summary import rebuild_summaries
+
+    report = {'imported': 0, 'grants': 0, 'pensions': 0, 'commutations': 0,
+              'client_ids': [], 'errors': [], 'summaries': None}
+    chunk = []
+    for line_no, record in records:
+        chunk.append((line_no, record))
+        if len(chunk) >= chunk_size:
+            _import_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        _import_chunk(chunk, report)
+
+    if compute_summaries:
+        client_ids = report['client_ids']
+        report['summaries'] = sum(rebuild_summaries(client_ids=client_ids[i:i + chunk_size])
+                                  for i in range(0, len(client_ids), chunk_size))
+    report['failed'] = len(report['errors'])
+    return report
+
+
+def import_stream(stream, fmt: str, chunk_size: int = DEFAULT_CHUNK_SIZE, compute_summaries: bool = False) -> dict:
+    """import_records מתוך קובץ טקסט פתוח (jsonl / csv)"""
+    return import_records(iter_records(stream, fmt), chunk_size=chunk_size, compute_summaries=compute_summaries)
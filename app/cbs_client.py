@@ -0,0 +1,221 @@
+"""
+לקוח HTTP משותף ל-API של הלמ"ס.
+
+- requests.Session אחד לתהליך עם חיבורי keep-alive ממוחזרים (connection pool)
+- מספר ניסיונות חוזרים מוגבל עם השהיה אקספוננציאלית ורעש אקראי (jitter)
+- מפסק זרם (circuit breaker): אחרי רצף כשלונות נכשלים מיד בלי לפנות לרשת,
+  עד שחולף זמן ההמתנה ואז מתבצע ניסיון בודק אחד. גם תשובת שגיאה שאין טעם
+  לנסות שוב (4xx, JSON שבור) נספרת ככשלון
+- מוני קריאות, שגיאות וזמני תגובה לניטור
+"""
+import random
+import threading
+import time
+from logging import getLogger
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+logger = getLogger(__name__)
+
+# שגיאות HTTP שכדאי לנסות שוב עבורן
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CBSError(Exception):
+    """שגיאה בפנייה ל-API של הלמ"ס"""
+
+
+class CircuitOpenError(CBSError):
+    """המפסק פתוח - הלמ"ס ידוע כלא זמין ולכן לא מתבצעת פנייה"""
+
+
+class CircuitBreaker:
+    """מפסק זרם פשוט: closed → open אחרי failure_threshold כשלונות רצופים → half-open"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self) -> bool:
+        """האם מותר לבצע קריאה כעת; במצב half-open מותרת קריאה בודקת אחת"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._probing:
+                    logger.warning("מפסק הלמ\"ס נפתח אחרי %s כשלונות", self._failures)
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class CBSClient:
+    """לקוח ל-API של הלמ"ס עם pooling, ניסיונות חוזרים ומפסק זרם"""
+
+    def __init__(self,
+                 base_url: str = 'https://api.cbs.gov.il',
+                 timeout: float = 5.0,
+                 max_retries: int = 2,
+                 backoff: float = 0.3,
+                 pool_size: int = 10,
+                 breaker: CircuitBreaker | None = None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'calls': 0,
+            'errors': 0,
+            'retries': 0,
+            'short_circuited': 0,
+            'latency_total_ms': 0.0,
+            'latency_max_ms': 0.0,
+            'last_error': None,
+        }
+
+    def _record(self, latency_ms: float | None = None, error: str | None = None, **counters):
+        with self._stats_lock:
+            for key, value in counters.items():
+                self._stats[key] += value
+            if latency_ms is not None:
+                self._stats['latency_total_ms'] += latency_ms
+                self._stats['latency_max_ms'] = max(self._stats['latency_max_ms'], latency_ms)
+            if error is not None:
+                self._stats['last_error'] = error
+
+    def _sleep_before_retry(self, attempt: int):
+        # full jitter: השהיה אקראית בין 0 לבין backoff * 2^attempt
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get_json(self, path: str, params: dict) -> dict:
+        """
+        מבצע GET ומחזיר את גוף התשובה כ-JSON
+
+        זמן המתנה מרבי: (max_retries + 1) × timeout ועוד ההשהיות שבין הניסיונות
+        (עד backoff × (2^max_retries - 1)). בברירות המחדל (5 שניות, 2 ניסיונות
+        חוזרים, 0.3) זה כ-16 שניות שבהן worker סינכרוני של gunicorn חסום, עד
+        שהמפסק נפתח ומתחילים להיכשל מיד.
+
+        :raises CircuitOpenError: כשהמפסק פתוח
+        :raises CBSError: כשכל הניסיונות נכשלו
+        """
+        if not self.breaker.allow():
+            self._record(short_circuited=1)
+            raise CircuitOpenError("הלמ\"ס אינו זמין כרגע (מפסק פתוח)")
+
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._record(retries=1)
+                self._sleep_before_retry(attempt - 1)
+            started = time.perf_counter()
+            try:
+                resp = self.session.get(url, params=params, timeout=self.timeout)
+                latency_ms = (time.perf_counter() - started) * 1000
+                if resp.status_code in RETRY_STATUS_CODES:
+                    last_error = f"HTTP {resp.status_code}"
+                    self._record(latency_ms, last_error, calls=1, errors=1)
+                    continue
+                resp.raise_for_status()
+                data = resp.json()
+                self._record(latency_ms, calls=1)
+                self.breaker.record_success()
+                return data
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = f"{type(e).__name__}: {e}"
+                self._record((time.perf_counter() - started) * 1000, last_error, calls=1, errors=1)
+            except (requests.RequestException, ValueError) as e:
+                # שגיאת לקוח / תשובה לא תקינה - אין טעם לנסות שוב
+                # (נספר ככשלון במפסק: שרת שמחזיר תשובות שבורות אינו תקין)
+                self._record((time.perf_counter() - started) * 1000, str(e), calls=1, errors=1)
+                self.breaker.record_failure()
+                raise CBSError(str(e)) from e
+
+        self.breaker.record_failure()
+        raise CBSError(f"הפנייה ללמ\"ס נכשלה אחרי {self.max_retries + 1} ניסיונות: {last_error}")
+
+    def calculator(self, value: float, from_date: str, to_date: str, series_id: int = 120010) -> dict:
+        """קריאה למחשבון ההצמדה של הלמ"ס; מחזיר את ה-JSON המלא"""
+        params = {
+            'value': value,
+            'date': from_date,
+            'toDate': to_date,
+            'format': 'json',
+            'download': 'false'
+        }
+        return self.get_json(f"/index/data/calculator/{series_id}", params)
+
+    def stats(self) -> dict:
+        """מוני קריאות ושגיאות וזמני תגובה מצטברים"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['latency_avg_ms'] = round(stats['latency_total_ms'] / stats['calls'], 2) if stats['calls'] else 0.0
+        stats['breaker_state'] = self.breaker.state
+        return stats
+
+
+_client: CBSClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_cbs_client() -> CBSClient:
+    """מחזיר את לקוח הלמ"ס המשותף לתהליך (נוצר בקריאה הראשונה)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = CBSClient(
+                    base_url=Config.CBS_BASE_URL,
+                    timeout=Config.CBS_TIMEOUT,
+                    max_retries=Config.CBS_MAX_RETRIES,
+                    pool_size=Config.CBS_POOL_SIZE,
+                    breaker=CircuitBreaker(Config.CBS_BREAKER_THRESHOLD, Config.CBS_BREAKER_RESET),
+                )
+    return _client
+
+
+def reset_cbs_client():
+    """סוגר את הלקוח המשותף; הקריאה הבאה תיצור לקוח חדש לפי הקונפיגורציה הנוכחית"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.session.close()
+        _client = None
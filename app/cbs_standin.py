@@ -0,0 +1,153 @@
+"""
+שרת מקומי שמחקה את מחשבון ההצמדה של הלמ"ס, לבדיקות ולמדידות ביצועים.
+
+השרת עונה על GET /index/data/calculator/<series_id> באותו חוזה JSON
+({"answer": {"to_value": ...}}) מתוך טבלת מדד מקומית, ומאפשר להזריק:
+- השהיה (latency + jitter) לכל בקשה
+- שיעור שגיאות HTTP 503
+- שיעור תשובות פגומות (JSON שבור או ללא answer)
+
+שימוש מהשורה:
+    python -m app.cbs_standin --port 8099 --latency 0.2 --error-rate 0.1
+ואז להגדיר CBS_BASE_URL=http://127.0.0.1:8099
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from app.cpi import CPISeries, CPI_SERIES_ID, get_cpi_series, month_label
+
+
+def synthetic_cpi_values(start_year: int = 1970, end_year: int = 2030, monthly_rate: float = 0.003) -> dict:
+    """טבלת מדד סינתטית (עלייה קבועה בכל חודש) - לשימוש כשאין קובץ סדרה אמיתי"""
+    values = {}
+    value = 1.0
+    for key in range(start_year * 12, (end_year + 1) * 12):
+        values[month_label(key)] = round(value, 6)
+        value *= 1 + monthly_rate
+    return values
+
+
+class CBSStandIn:
+    """שרת המחשבון המקומי; start() מריץ אותו ב-thread ברקע"""
+
+    def __init__(self,
+                 series: CPISeries | None = None,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 malformed_rate: float = 0.0,
+                 seed: int | None = None):
+        self.series = series or get_cpi_series() or CPISeries(synthetic_cpi_values())
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body: bytes, content_type: str = 'application/json'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                status, body = standin.handle(self.path)
+                self._send(status, body)
+
+        return Handler
+
+    def _draw(self) -> float:
+        with self._lock:
+            self.requests += 1
+            return self.random.random()
+
+    def handle(self, path: str) -> tuple[int, bytes]:
+        """מחזיר (סטטוס, גוף תשובה) לבקשה לפי החוזה של הלמ"ס והתקלות המוזרקות"""
+        url = urlparse(path)
+        if url.path == '/_stats':
+            return 200, json.dumps({"requests": self.requests}).encode()
+
+        roll = self._draw()
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        if url.path.rstrip('/') != f"/index/data/calculator/{CPI_SERIES_ID}":
+            return 404, b'{"error": "not found"}'
+
+        if roll < self.error_rate:
+            return 503, b'{"error": "service unavailable"}'
+        if roll < self.error_rate + self.malformed_rate:
+            # חצי מהתשובות הפגומות - JSON שבור, והחצי השני - JSON ללא answer
+            if self.random.random() < 0.5:
+                return 200, b'{"answer": {"to_value": '
+            return 200, b'{"status": "ok"}'
+
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        try:
+            value = float(params['value'])
+            factor = self.series.factor(params['date'], params['toDate'])
+        except (KeyError, ValueError):
+            return 400, b'{"error": "bad request"}'
+        if factor is None:
+            return 200, json.dumps({"answer": None}).encode()
+
+        answer = {
+            "from_value": value,
+            "to_value": round(value * factor, 2),
+            "change_percent": round((factor - 1) * 100, 2),
+        }
+        return 200, json.dumps({"answer": answer}).encode()
+
+    def start(self) -> 'CBSStandIn':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    parser = argparse.ArgumentParser(description='שרת מחשבון הלמ"ס מקומי')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.0, help='השהיה בשניות לכל בקשה')
+    parser.add_argument('--jitter', type=float, default=0.0, help='תוספת השהיה אקראית מרבית בשניות')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='שיעור תשובות 503')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='שיעור תשובות פגומות')
+    args = parser.parse_args()
+
+    standin = CBSStandIn(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate, malformed_rate=args.malformed_rate)
+    print(f"CBS stand-in listening on {standin.base_url}")
+    try:
+        standin.server.serve_forever()
+    except KeyboardInterrupt:
+        standin.stop()
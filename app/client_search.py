@@ -0,0 +1,133 @@
+"""
+חיפוש לקוחות לפי שם (עברית / אנגלית), ת"ז, טלפון וכתובת - אינדקס FTS5 של SQLite.
+
+הטבלה הווירטואלית client_search מחזיקה עותק מנורמל של עמודות החיפוש, ו-triggers
+על טבלת client מעדכנים אותה בכל הוספה / עדכון / מחיקה - גם בכתיבות מרוכזות
+(bulk_import, delete_client_graph) שלא עוברות דרך אובייקטי ה-ORM.
+
+נרמול (זהה באינדקס ובשאילתה):
+- ניקוד עברי מוסר (unicode61 מסיר סימנים רק מאותיות לטיניות)
+- גרש וגרשיים (' ״ ׳) הם חלק מהמילה, כך ש-ג'ורג' לא מתפרק לשתי מילים
+- בטלפון מוסרים מקפים ורווחים, כך ש-0501234567 מוצא את 050-1234567
+
+ensure_search_index נקרא בעליית האפליקציה: יוצר את הטבלה וה-triggers אם חסרים
+ובונה את האינדקס מחדש אם מספר השורות בו אינו תואם לטבלת client.
+"""
+import re
+from logging import getLogger
+
+from sqlalchemy import text
+
+from app.models import db
+
+logger = getLogger(__name__)
+
+SEARCH_TABLE = 'client_search'
+SEARCH_COLUMNS = ('first_name', 'last_name', 'tz', 'phone', 'address')
+
+# ניקוד: שווא עד מתג, רפה, שין / שין שמאלית, קמץ קטן
+NIQQUD = [chr(c) for c in (*range(0x05B0, 0x05BE), 0x05BF, 0x05C1, 0x05C2, 0x05C7)]
+_NIQQUD_RE = re.compile('[' + ''.join(NIQQUD) + ']')
+
+
+def _strip_niqqud_sql(expression: str) -> str:
+    for mark in NIQQUD:
+        expression = f"replace({expression}, '{mark}', '')"
+    return expression
+
+
+def _values_sql(row: str) -> str:
+    """ערכי עמודות החיפוש מתוך new / old ב-trigger, אחרי נרמול"""
+    return ", ".join([
+        _strip_niqqud_sql(f"{row}.first_name"),
+        _strip_niqqud_sql(f"{row}.last_name"),
+        f"{row}.tz",
+        f"replace(replace({row}.phone, '-', ''), ' ', '')",
+        _strip_niqqud_sql(f"{row}.address"),
+    ])
+
+
+_COLUMNS_SQL = ", ".join(SEARCH_COLUMNS)
+
+DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        {_COLUMNS_SQL},
+        tokenize = "unicode61 remove_diacritics 2 tokenchars '''׳״'"
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS client_search_ai AFTER INSERT ON client BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, {_COLUMNS_SQL}) VALUES (new.id, {_values_sql('new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS client_search_ad AFTER DELETE ON client BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS client_search_au AFTER UPDATE ON client BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+        INSERT INTO {SEARCH_TABLE}(rowid, {_COLUMNS_SQL}) VALUES (new.id, {_values_sql('new')});
+    END""",
+]
+
+
+def _is_sqlite() -> bool:
+    return db.engine.dialect.name == 'sqlite'
+
+
+def ensure_search_index():
+    """יוצר את האינדקס וה-triggers אם חסרים, ובונה מחדש אינדקס שאינו תואם לטבלת client"""
+    if not _is_sqlite():
+        logger.warning("חיפוש FTS5 זמין רק ב-SQLite; החיפוש יעבוד לפי תחילית שם")
+        return
+    with db.engine.begin() as conn:
+        for statement in DDL:
+            conn.execute(text(statement))
+        indexed = conn.execute(text(f"SELECT count(*) FROM {SEARCH_TABLE}")).scalar()
+        clients = conn.execute(text("SELECT count(*) FROM client")).scalar()
+        if indexed != clients:
+            logger.info("בונה מחדש את אינדקס החיפוש (%s שורות, %s לקוחות)", indexed, clients)
+            rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn=None):
+    """מילוי האינדקס מחדש מטבלת client"""
+    conn = conn or db.session.connection()
+    conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    conn.execute(text(
+        f"INSERT INTO {SEARCH_TABLE}(rowid, {_COLUMNS_SQL}) SELECT id, {_values_sql('client')} FROM client"
+    ))
+
+
+def build_match_query(query: str) -> str | None:
+    """
+    טקסט חופשי → שאילתת MATCH: כל מילה כתחילית, וכל המילים חייבות להופיע
+    (בכל אחת מהעמודות). מרכאות בתוך מילה מוכפלות כדי שלא ישברו את התחביר.
+    """
+    query = _NIQQUD_RE.sub('', query or '')
+    terms = []
+    for word in query.split():
+        if re.fullmatch(r'[\d\-]+', word):
+            word = word.replace('-', '')
+        word = word.replace('"', '""')
+        terms.append(f'"{word}"*')
+    return " ".join(terms) or None
+
+
+def search_clients(query: str, limit: int = 20) -> list:
+    """
+    לקוחות שמתאימים לחיפוש, מהמתאים ביותר (bm25)
+
+    :return: רשימת מילונים כמו ברשימת הלקוחות
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    if not _is_sqlite():
+        from app.repository import list_clients
+        return list_clients(name=query.strip(), limit=limit)
+
+    rows = db.session.execute(text(
+        f"""SELECT c.id, c.first_name, c.last_name, c.tz, c.birth_date, c.phone, c.address
+            FROM {SEARCH_TABLE} s JOIN client c ON c.id = s.rowid
+            WHERE {SEARCH_TABLE} MATCH :match
+            ORDER BY s.rank
+            LIMIT :limit"""
+    ), {'match': match, 'limit': limit})
+    return [dict(row._mapping) for row in rows]
@@ -0,0 +1,211 @@
+"""
+תחזוקת טבלת client_summary - סיכום הפטור השמור של כל לקוח.
+
+- שורה נוצרת בפעם הראשונה שקוראים את הסיכום (get_client_summary) או ב-rebuild_summaries
+- הוספה / מחיקה של מענק או היוון ושינוי מענק משוריין מעדכנים את השורה רק
+  בתרומה של אותה רשומה (הפרש), בלי לחשב את הלקוח מחדש
+- שינוי בנתוני הלקוח או בקצבאות (שמשפיעים על תאריך הזכאות) מחשבים את הלקוח מחדש
+- מדד חדש: get_client_summary מחשב מחדש שורה שנשמרה לפי גרסת מדד קודמת, ו-rebuild_summaries
+  מחשב מחדש את כל השורות הישנות בבת אחת (refresh_cpi.py קורא לו אחרי הרענון)
+- ללקוח ללא קצבה תאריך הזכאות נגזר מהיום (eligibility_basis), ולכן שורה כזו
+  תקפה רק ביום שבו חושבה. בלי סדרת מדד מקומית (cpi_vintage ריק) אין דרך לזהות
+  מדד חדש, ולכן כל שורה תקפה רק ביום שבו חושבה (is_current)
+
+סיכום חלקי - מענק שהצמדתו נכשלה - לא נשמר: rebuild_client_summary זורק ValueError.
+אם עדכון בהפרש נכשל (למשל הצמדה שלא הצליחה), השורה נמחקת ותיבנה מחדש בקריאה הבאה.
+"""
+from datetime import date, datetime, time
+from logging import getLogger
+
+from sqlalchemy import select
+
+from app.models import db, Client, ClientSummary, Pension
+from app.cpi import get_cpi_vintage
+from app.engine import IMPACT_MULTIPLIER, compute_grant, pension_from_remaining
+
+logger = getLogger(__name__)
+
+# שדות שמועתקים כמו שהם מהמילון של calculate_summary
+SUMMARY_FIELDS = (
+    'exempt_cap', 'monthly_cap', 'grants_nominal', 'grants_indexed_full', 'grants_indexed_limited',
+    'grants_impact', 'reserved_grant_nominal', 'reserved_grant_impact', 'commutations_total',
+    'remaining_cap', 'pension_exempt', 'pension_rate',
+)
+
+
+def rebuild_client_summary(client_id: int) -> ClientSummary:
+    """חישוב מלא של הלקוח ושמירתו בטבלה (בתוך הטרנזקציה הנוכחית)"""
+    from app.utils import calculate_summary
+
+    # נתיב כתיבה - שומר גם את תוצאות המענקים שהקלטים שלהם השתנו (למשל אחרי מדד חדש)
+    summary = calculate_summary(client_id, persist=True)
+    if summary['indexation_failures']:
+        raise ValueError(f"הצמדת מענקים {summary['indexation_failures']} נכשלה - הסיכום לא נשמר")
+    has_pension = db.session.execute(
+        select(Pension.id).where(Pension.client_id == client_id).limit(1)
+    ).first() is not None
+    row = db.session.get(ClientSummary, client_id)
+    if row is None:
+        row = ClientSummary(client_id=client_id)
+        db.session.add(row)
+    row.eligibility_date = date.fromisoformat(summary['client_info']['eligibility_date'])
+    row.eligibility_basis = 'pension' if has_pension else date.today().isoformat()
+    for field in SUMMARY_FIELDS:
+        setattr(row, field, summary[field])
+    row.cpi_vintage = get_cpi_vintage()
+    row.updated_at = datetime.now()
+    return row
+
+
+def is_current(cpi_vintage: str | None, eligibility_basis: str | None, updated_at: datetime | None) -> bool:
+    """האם שורה שמורה עדיין תקפה: אותה גרסת מדד, ותאריך זכאות שלא נגזר מיום אחר"""
+    vintage = get_cpi_vintage()
+    today = date.today()
+    if cpi_vintage != vintage or eligibility_basis not in ('pension', today.isoformat()):
+        return False
+    return vintage is not None or (updated_at is not None and updated_at.date() == today)
+
+
+def get_client_summary(client_id: int) -> ClientSummary:
+    """
+    השורה השמורה של הלקוח; נבנית מחדש אם אינה קיימת או אינה תקפה (is_current)
+
+    :raises ValueError: הצמדה נכשלה - אין סיכום מלא להחזיר
+    """
+    row = db.session.get(ClientSummary, client_id)
+    if row is None or not is_current(row.cpi_vintage, row.eligibility_basis, row.updated_at):
+        row = rebuild_client_summary(client_id)
+    return row
+
+
+def rebuild_summaries(only_stale: bool = True, client_ids: list | None = None) -> int:
+    """
+    חישוב מחדש של כל הלקוחות (או רק של מי שאין לו שורה / שחושב לפי מדד קודם).
+    כל לקוח נשמר בנפרד כך שכשלון של לקוח אחד לא מבטל את האחרים.
+
+    :param client_ids: רק הלקוחות האלה (למשל אחרי ייבוא), ללא קשר ל-only_stale
+    :return: מספר הלקוחות שחושבו מחדש
+    """
+    query = select(Client.id).order_by(Client.id)
+    if client_ids is not None:
+        query = query.where(Client.id.in_(client_ids))
+    elif only_stale:
+        vintage = get_cpi_vintage()
+        today = date.today()
+        if vintage is None:
+            # אין גרסת מדד להשוות אליה - שורה שלא חושבה היום נחשבת ישנה
+            stale_vintage = ClientSummary.cpi_vintage.is_not(None) | \
+                (ClientSummary.updated_at < datetime.combine(today, time.min))
+        else:
+            stale_vintage = ClientSummary.cpi_vintage.is_(None) | (ClientSummary.cpi_vintage != vintage)
+        stale_basis = ClientSummary.eligibility_basis.is_(None) | \
+            ClientSummary.eligibility_basis.not_in(['pension', today.isoformat()])
+        query = query.outerjoin(ClientSummary, ClientSummary.client_id == Client.id).where(
+            ClientSummary.client_id.is_(None) | stale_vintage | stale_basis
+        )
+    client_ids = db.session.execute(query).scalars().all()
+
+    rebuilt = 0
+    for client_id in client_ids:
+        try:
+            rebuild_client_summary(client_id)
+            db.session.commit()
+            rebuilt += 1
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("חישוב מחדש של סיכום לקוח %s נכשל: %s", client_id, e)
+    return rebuilt
+
+
+def _refresh_derived(row: ClientSummary):
+    """גוזר את הפגיעה, יתרת התקרה והקצבה הפטורה מהסכומים המצטברים - כמו compute_summary"""
+    limited = row.grants_indexed_limited or 0
+    row.grants_impact = limited * IMPACT_MULTIPLIER if limited > 0 else 0
+    row.remaining_cap = (row.exempt_cap or 0) - row.grants_impact - (row.commutations_total or 0) \
+        - (row.reserved_grant_impact or 0)
+    row.pension_exempt, row.pension_rate = pension_from_remaining(row.remaining_cap, row.monthly_cap or 0)
+    row.updated_at = datetime.now()
+
+
+def _drop(client_id: int, error: Exception):
+    logger.warning("עדכון סיכום לקוח %s נכשל, השורה תיבנה מחדש: %s", client_id, error)
+    row = db.session.get(ClientSummary, client_id)
+    if row is not None:
+        db.session.delete(row)
+
+
+def _grant_contribution(grant, eligibility_date: date):
+    """תוצאת המענק מול תאריך הזכאות של השורה, ו-True אם אפשר לסמוך עליה"""
+    from app.utils import to_grant_inputs, index_grant_inputs
+
+    grant_input = to_grant_inputs([grant])[0]
+    indexed_full = index_grant_inputs([grant_input], eligibility_date).get(grant.id)
+    result = compute_grant(grant_input, eligibility_date, indexed_full)
+    indexable = bool(grant_input.amount and grant_input.work_start_date and grant_input.work_end_date)
+    return result, result is not None or not indexable
+
+
+def _apply_grant(row: ClientSummary, grant, sign: int):
+    result, reliable = _grant_contribution(grant, row.eligibility_date)
+    if not reliable:
+        raise ValueError(f"הצמדת מענק {grant.id} נכשלה")
+    if grant.grant_amount:
+        row.grants_nominal = (row.grants_nominal or 0) + sign * grant.grant_amount
+    if result is not None:
+        row.grants_indexed_full = (row.grants_indexed_full or 0) + sign * result.indexed_full
+        row.grants_indexed_limited = (row.grants_indexed_limited or 0) + sign * result.indexed_limited
+    _refresh_derived(row)
+    return result
+
+
+def grant_added(grant):
+    """מוסיף לשורת הלקוח את תרומת המענק החדש (המענק צריך להיות אחרי flush)"""
+    from app.utils import apply_grant_result
+
+    row = db.session.get(ClientSummary, grant.client_id)
+    if row is None:
+        return
+    try:
+        apply_grant_result(grant, _apply_grant(row, grant, +1))
+    except Exception as e:
+        _drop(grant.client_id, e)
+
+
+def grant_removed(grant):
+    """מפחית משורת הלקוח את תרומת המענק שנמחק (לפני המחיקה)"""
+    row = db.session.get(ClientSummary, grant.client_id)
+    if row is None:
+        return
+    try:
+        _apply_grant(row, grant, -1)
+    except Exception as e:
+        _drop(grant.client_id, e)
+
+
+def commutation_changed(client_id: int, commutation, sign: int):
+    """הוספה (+1) או מחיקה (-1) של היוון; רק היוונים שנלקחים בחישוב משפיעים"""
+    row = db.session.get(ClientSummary, client_id)
+    if row is None or not commutation.include_calc or not commutation.amount:
+        return
+    row.commutations_total = (row.commutations_total or 0) + sign * commutation.amount
+    _refresh_derived(row)
+
+
+def reserved_grant_changed(client: Client):
+    row = db.session.get(ClientSummary, client.id)
+    if row is None:
+        return
+    row.reserved_grant_nominal = client.reserved_grant_amount or 0
+    row.reserved_grant_impact = row.reserved_grant_nominal * IMPACT_MULTIPLIER
+    _refresh_derived(row)
+
+
+def client_changed(client_id: int):
+    """שינוי שמשפיע על תאריך הזכאות (פרטי לקוח / קצבאות) - חישוב מלא של הלקוח"""
+    if db.session.get(ClientSummary, client_id) is None:
+        return
+    try:
+        db.session.flush()
+        rebuild_client_summary(client_id)
+    except Exception as e:
+        _drop(client_id, e)
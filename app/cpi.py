@@ -0,0 +1,189 @@
+"""
+מודול זה מחזיק את סדרת מדד המחירים לצרכן (סדרה 120010 של הלמ"ס)
+ומחשב הצמדה מקומית: סכום × מדד(יעד) / מדד(בסיס), ללא קריאת רשת.
+
+הסדרה נשמרת בקובץ JSON (ראו refresh_cpi.py) במבנה:
+    {"series_id": 120010, "vintage": "2025-05", "generated_at": "...",
+     "values": {"1980-01": 0.0123, ..., "2025-05": 100.0}}
+
+כללי המחשבון של הלמ"ס שמשוחזרים כאן:
+- חודש הבסיס הוא החודש של תאריך המוצא, וחודש היעד הוא החודש של תאריך היעד
+- חודש שעדיין לא פורסם לו מדד מוחלף במדד האחרון שפורסם
+- הסכום המוצמד מעוגל ל-2 ספרות אחרי הנקודה
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from logging import getLogger
+
+from config import Config
+
+logger = getLogger(__name__)
+
+CPI_SERIES_ID = 120010
+
+# כל כמה שניות לבדוק אם קובץ הסדרה התעדכן בדיסק
+RELOAD_CHECK_SECONDS = 60
+
+
+def month_key(value) -> int:
+    """ממיר תאריך / 'YYYY-MM' / 'YYYY-MM-DD' למפתח חודש שלם (שנה*12 + חודש-1)"""
+    if isinstance(value, str):
+        year, month = value[:7].split('-')
+        return int(year) * 12 + int(month) - 1
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.year * 12 + value.month - 1
+
+
+def month_label(key: int) -> str:
+    """ממיר מפתח חודש חזרה למחרוזת 'YYYY-MM'"""
+    return f"{key // 12:04d}-{key % 12 + 1:02d}"
+
+
+def published_month(values: dict) -> int:
+    """
+    חודש המדד האחרון שפורסם בסדרה (מפתחות חודש → ערכים). refresh_cpi.py כותב
+    גם את החודשים שטרם פורסמו, עם המדד האחרון שפורסם, ולכן זה החודש הראשון ברצף
+    הערכים הזהים שבסוף הסדרה. חודש שפורסם בלי שינוי במדד מצטרף לרצף - וממילא
+    לא שינה אף מקדם.
+    """
+    keys = sorted(values)
+    month = keys[-1]
+    for key in reversed(keys[:-1]):
+        if values[key] != values[month]:
+            break
+        month = key
+    return month
+
+
+class CPISeries:
+    """סדרת מדד חודשית בזיכרון: מפתח חודש → ערך מדד"""
+
+    __slots__ = ('values', 'first_month', 'last_month', 'vintage')
+
+    def __init__(self, values: dict, vintage: str | None = None):
+        self.values = {month_key(k) if isinstance(k, str) else k: float(v) for k, v in values.items()}
+        if not self.values:
+            raise ValueError("סדרת מדד ריקה")
+        self.first_month = min(self.values)
+        self.last_month = max(self.values)
+        self.vintage = vintage or month_label(published_month(self.values))
+
+    @classmethod
+    def from_file(cls, path: str) -> 'CPISeries':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('series_id', CPI_SERIES_ID) != CPI_SERIES_ID:
+            raise ValueError(f"קובץ המדד {path} אינו של סדרה {CPI_SERIES_ID}")
+        return cls(data['values'], data.get('vintage'))
+
+    def value_for(self, key: int) -> float | None:
+        """ערך המדד לחודש; חודש שטרם פורסם מקבל את המדד האחרון שפורסם"""
+        if key > self.last_month:
+            key = self.last_month
+        return self.values.get(key)
+
+    def factor(self, from_date, to_date) -> float | None:
+        """מקדם ההצמדה מתאריך המוצא לתאריך היעד, או None אם הסדרה לא מכסה אותו"""
+        base = self.value_for(month_key(from_date))
+        target = self.value_for(month_key(to_date))
+        if not base or target is None:
+            return None
+        return target / base
+
+
+_series: CPISeries | None = None
+_series_mtime: float | None = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+
+def get_cpi_series(path: str | None = None) -> CPISeries | None:
+    """
+    מחזיר את סדרת המדד הטעונה בזיכרון התהליך.
+    הקובץ נטען פעם אחת ונטען מחדש רק אם זמן השינוי שלו השתנה.
+
+    :return: CPISeries או None אם אין קובץ סדרה זמין
+    """
+    global _series, _series_mtime, _last_check
+
+    path = path or Config.CPI_SERIES_PATH
+    now = time.monotonic()
+    if _series is not None and now - _last_check < RELOAD_CHECK_SECONDS:
+        return _series
+
+    with _lock:
+        _last_check = now
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            _series, _series_mtime = None, None
+            return None
+        if _series is None or mtime != _series_mtime:
+            try:
+                _series = CPISeries.from_file(path)
+                _series_mtime = mtime
+                logger.info("נטענה סדרת מדד %s (עדכנית ל-%s)", path, _series.vintage)
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("שגיאה בטעינת סדרת המדד %s: %s", path, e)
+                _series, _series_mtime = None, None
+        return _series
+
+
+def reset_cpi_series():
+    """מאלץ טעינה מחדש של הסדרה בקריאה הבאה (לבדיקות ולאחר רענון)"""
+    global _series, _series_mtime, _last_check
+    with _lock:
+        _series, _series_mtime, _last_check = None, None, 0.0
+
+
+def get_cpi_vintage() -> str | None:
+    """החודש האחרון שפורסם בסדרה הטעונה ('YYYY-MM'), או None"""
+    series = get_cpi_series()
+    return series.vintage if series else None
+
+
+def local_indexation_factor(from_date, to_date=None) -> float | None:
+    """מקדם הצמדה מהסדרה המקומית, או None אם אין סדרה / אין כיסוי"""
+    series = get_cpi_series()
+    if series is None:
+        return None
+    return series.factor(from_date, to_date or date.today())
+
+
+def index_amount(amount: float, from_date, to_date=None) -> float | None:
+    """
+    מצמיד סכום מקומית לפי כללי מחשבון הלמ"ס
+
+    :param amount: סכום נומינלי
+    :param from_date: תאריך המוצא (date או מחרוזת YYYY-MM-DD)
+    :param to_date: תאריך היעד (ברירת מחדל: היום)
+    :return: סכום מוצמד מעוגל ל-2 ספרות, או None אם הסדרה לא מכסה את התאריכים
+    """
+    factor = local_indexation_factor(from_date, to_date)
+    if factor is None:
+        return None
+    return round(amount * factor, 2)
+
+
+def write_cpi_series(values: dict, path: str | None = None, vintage: str | None = None) -> str:
+    """שומר סדרת מדד לקובץ באופן אטומי (כתיבה לקובץ זמני ואז החלפה)"""
+    path = path or Config.CPI_SERIES_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    series = {month_key(k) if isinstance(k, str) else k: float(v) for k, v in values.items()}
+    keys = sorted(series)
+    data = {
+        "series_id": CPI_SERIES_ID,
+        "vintage": vintage or month_label(published_month(series)),
+        "generated_at": datetime.now().isoformat(timespec='seconds'),
+        "values": {month_label(k): series[k] for k in keys},
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    reset_cpi_series()
+    return path
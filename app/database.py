@@ -0,0 +1,31 @@
+"""
+הגדרות חיבור ל-SQLite עבור כמה workers שעובדים על אותו קובץ:
+
+- journal_mode=WAL: קוראים לא חוסמים כותב וכותב לא חוסם קוראים
+- synchronous=NORMAL: ב-WAL בטוח מפני השחתה ונמנע מ-fsync בכל commit
+- busy_timeout: כותב שמוצא את המסד נעול ממתין במקום להיכשל מיד ב-"database is locked"
+- mmap_size: קריאות מהקובץ דרך זיכרון ממופה
+
+הערכים ב-Config (SQLITE_*). מסד בזיכרון (בדיקות) מקבל רק את busy_timeout.
+"""
+from sqlalchemy import event
+
+from config import Config
+
+
+def configure_sqlite(engine):
+    """רושם את ה-PRAGMAs לכל חיבור חדש של המנוע (רק אם זה SQLite)"""
+    if engine.dialect.name != 'sqlite':
+        return
+    in_memory = engine.url.database in (None, '', ':memory:')
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+        if not in_memory:
+            if Config.SQLITE_WAL:
+                cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute(f"PRAGMA synchronous = {Config.SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA mmap_size = {int(Config.SQLITE_MMAP_SIZE)}")
+        cursor.close()
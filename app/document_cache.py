@@ -0,0 +1,107 @@
+"""
+מטמון מסמכים שהופקו (161ד ונספחים) בזיכרון התהליך, לפי תוכן.
+
+המפתח הוא טביעת אצבע (sha256) של כל הקלטים של המסמך:
+- סוג המסמך וגרסת המפיק (גרסת תבנית ה-161ד / הגדרות wkhtmltopdf)
+- שדות הלקוח, הקצבאות, המענקים וההיוונים (כל העמודות)
+- הסיכום המחושב וגרסת סדרת המדד
+- התאריך של היום, שמודפס במסמכים (תאריך הפקה)
+
+כך בקשה זהה מקבלת את אותם bytes בלי הפקה, וכל שינוי בקלטים - גם כזה שלא
+עבר דרך גרסת הלקוח - מוביל להפקה מחדש. אין צורך בביטול מפורש.
+
+המטמון מוגבל בסך הבתים (DOCUMENT_CACHE_BYTES) ומפנה את המסמך שנעשה בו שימוש
+לפני הכי הרבה זמן (LRU).
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from config import Config
+from app.cpi import get_cpi_vintage
+from app.repository import load_client_graph
+from app.summary_cache import get_summary
+
+_cache: OrderedDict = OrderedDict()
+_lock = threading.Lock()
+_size = 0
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def _columns(obj) -> dict:
+    return {column.key: getattr(obj, column.key) for column in obj.__table__.columns}
+
+
+def document_inputs(client_id: int) -> dict:
+    """
+    נתוני הלקוח שכל מסמכיו תלויים בהם (שלוש-ארבע שאילתות; הסיכום מגיע ממטמון
+    הסיכומים). למפתח של מסמך מסוים מוסיפים את סוג המסמך וגרסת המפיק.
+
+    :raises NotFound: (404) אם הלקוח לא קיים
+    """
+    client = load_client_graph(client_id)
+    pensions = sorted(client.pensions, key=lambda pension: pension.id)
+    return {
+        'today': date.today().isoformat(),
+        'cpi_vintage': get_cpi_vintage(),
+        'client': _columns(client),
+        'pensions': [_columns(pension) for pension in pensions],
+        'grants': [_columns(grant) for grant in sorted(client.grants, key=lambda grant: grant.id)],
+        'commutations': [_columns(commutation) for pension in pensions
+                         for commutation in sorted(pension.commutations, key=lambda c: c.id)],
+        'summary': get_summary(client_id),
+    }
+
+
+def document_key(inputs: dict, doc_type: str, renderer_version: str) -> str:
+    payload = json.dumps(dict(inputs, doc_type=doc_type, renderer=renderer_version),
+                         sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_document(key: str):
+    """המסמך השמור למפתח, או None"""
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            _stats['misses'] += 1
+            return None
+        _cache.move_to_end(key)
+        _stats['hits'] += 1
+        return entry[0]
+
+
+def put_document(key: str, document, size: int):
+    """
+    שומר מסמך בגודל size בתים. מסמך גדול מכל המטמון לא נשמר.
+    """
+    global _size
+    limit = max(Config.DOCUMENT_CACHE_BYTES, 0)
+    if size > limit:
+        return
+    with _lock:
+        previous = _cache.pop(key, None)
+        if previous is not None:
+            _size -= previous[1]
+        _cache[key] = (document, size)
+        _size += size
+        while _size > limit:
+            _, (_, evicted_size) = _cache.popitem(last=False)
+            _size -= evicted_size
+            _stats['evictions'] += 1
+
+
+def clear_document_cache():
+    global _size
+    with _lock:
+        _cache.clear()
+        _size = 0
+        for key in _stats:
+            _stats[key] = 0
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, size=len(_cache), bytes=_size, max_bytes=Config.DOCUMENT_CACHE_BYTES)
@@ -0,0 +1,131 @@
+"""
+הפקת מסמכי הלקוח (טופס 161ד, נספח מענקים ונספח היוונים) בזיכרון.
+
+כל מסמך מופק ל-bytes ונשלח ישירות בתשובה (send_file על BytesIO), בלי קבצי
+ביניים ובלי תיקיית packages/ - כך בקשות מקבילות לאותו לקוח לא דורסות זו את
+הקבצים של זו. כתיבה לדיסק נעשית רק בארכוב מפורש של חבילה (archive_package),
+וכל קובץ נכתב לקובץ זמני ומוחלף אטומית.
+
+מסמך שכל הקלטים שלו לא השתנו מוחזר ממטמון המסמכים (app/document_cache.py)
+בלי הפקה מחדש. לא נשמרים במטמון גיבוי HTML לכשלון המרה ומסמכים של סיכום
+חלקי (הצמדה שנכשלה).
+"""
+import io
+import json
+import os
+import zipfile
+from pathlib import Path
+from typing import NamedTuple
+
+from config import Config
+from app import document_cache, pdf_filler
+from app.pdf_fillers.form161d import TEMPLATE_PATH, render_161d
+from app.pdf_fillers.template import get_template
+
+DOCUMENT_TYPES = ("161d", "grants", "commutations")
+
+# שם הקובץ בחבילה לכל סוג מסמך (בלי סיומת - PDF או HTML לפי מה שהופק)
+PACKAGE_NAMES = {"161d": "161d", "grants": "grants_appendix", "commutations": "severance_appendix"}
+
+
+class Document(NamedTuple):
+    doc_type: str
+    content: bytes
+    mimetype: str
+
+    @property
+    def extension(self) -> str:
+        return "pdf" if self.mimetype == "application/pdf" else "html"
+
+    @property
+    def filename(self) -> str:
+        return f"{PACKAGE_NAMES[self.doc_type]}.{self.extension}"
+
+
+def renderer_version(doc_type: str) -> str:
+    """מה שמשפיע על הפלט מעבר לנתוני הלקוח - חלק ממפתח מטמון המסמכים"""
+    if doc_type == "161d":
+        return f"161d:{get_template(TEMPLATE_PATH).version}:incremental={Config.PDF_INCREMENTAL_UPDATE}"
+    return f"{doc_type}:{pdf_filler.wkhtmltopdf_path}:{json.dumps(pdf_filler.APPENDIX_PDF_OPTIONS, sort_keys=True)}"
+
+
+def _render(doc_types: list, client_id: int) -> dict:
+    """מפיק את המסמכים; הנספחים מוגשים יחד למאגר הרינדור"""
+    rendered = {}
+    if "161d" in doc_types:
+        rendered["161d"] = Document("161d", render_161d(client_id), "application/pdf")
+    appendix_types = [doc_type for doc_type in doc_types if doc_type != "161d"]
+    if appendix_types:
+        for doc_type, result in pdf_filler.render_appendices(client_id, appendix_types).items():
+            rendered[doc_type] = Document(doc_type, *result) if result else None
+    return rendered
+
+
+def render_documents(doc_types: list, client_id: int) -> dict:
+    """
+    מפיק כמה מסמכים של הלקוח בזיכרון. מסמך שהקלטים שלו לא השתנו מוחזר ממטמון
+    המסמכים, והשאר מופקים יחד.
+
+    :return: סוג מסמך → המסמך, או None כשאין לו תוכן (נספח ללא מענקים / היוונים)
+    :raises ValueError: סוג מסמך לא מוכר
+    """
+    unknown = set(doc_types) - set(DOCUMENT_TYPES)
+    if unknown:
+        raise ValueError(f"סוג מסמך לא מוכר: {', '.join(sorted(unknown))}")
+    inputs = document_cache.document_inputs(client_id)
+    keys = {doc_type: document_cache.document_key(inputs, doc_type, renderer_version(doc_type))
+            for doc_type in doc_types}
+    documents = {doc_type: document_cache.get_document(key) for doc_type, key in keys.items()}
+
+    missing = [doc_type for doc_type, document in documents.items() if document is None]
+    if missing:
+        degraded = bool(inputs['summary'].get('indexation_failures'))
+        for doc_type, document in _render(missing, client_id).items():
+            documents[doc_type] = document
+            if document is not None and not degraded and _cacheable(document):
+                document_cache.put_document(keys[doc_type], document, len(document.content))
+    return documents
+
+
+def _cacheable(document: Document) -> bool:
+    """
+    רק הפקה מוצלחת נשמרת: HTML במקום PDF כש-wkhtmltopdf מוגדר הוא גיבוי
+    לכשלון המרה (ראו pdf_filler.render_appendices) - בקשה הבאה תנסה שוב
+    """
+    return document.mimetype == "application/pdf" or not pdf_filler.wkhtmltopdf_path
+
+
+def render_document(doc_type: str, client_id: int) -> Document | None:
+    """מסמך אחד - ראו render_documents"""
+    return render_documents([doc_type], client_id)[doc_type]
+
+
+def render_package(client_id: int) -> list[Document]:
+    """כל מסמכי החבילה שיש להם תוכן, לפי הסדר"""
+    documents = render_documents(list(DOCUMENT_TYPES), client_id)
+    return [documents[doc_type] for doc_type in DOCUMENT_TYPES if documents[doc_type] is not None]
+
+
+def package_zip(documents: list[Document]) -> bytes:
+    """ארכיון ZIP של המסמכים, בזיכרון"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for document in documents:
+            archive.writestr(document.filename, document.content)
+    return buffer.getvalue()
+
+
+def archive_package(documents: list[Document], folder: Path) -> list[str]:
+    """
+    שומר את המסמכים בתיקיית החבילה. כל קובץ נכתב לקובץ זמני ייחודי ומוחלף
+    אטומית, כך שבקשה מקבילה לא רואה קובץ חלקי.
+
+    :return: שמות הקבצים שנשמרו
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    for document in documents:
+        path = folder / document.filename
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{id(document)}.tmp")
+        tmp_path.write_bytes(document.content)
+        os.replace(tmp_path, path)
+    return [document.filename for document in documents]
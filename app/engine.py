@@ -0,0 +1,307 @@
+"""
+ליבת החישוב של קיבוע הזכויות - ללא ORM, ללא פניות רשת וללא הדפסות.
+
+כל מסלולי החישוב (סיכום הפטור, עיבוד מענק, נספח המענקים, 161ד והסקריפטים)
+בונים את הקלטים כאובייקטי ערך קטנים (dataclass קפואים עם __slots__),
+מצמידים את המענקים מראש (index_grants) ומעבירים את הסכומים המוצמדים לכאן.
+
+נוסחת הסיכום:
+    יחס = ימי עבודה בתוך 32 השנים שלפני הזכאות / סך ימי העבודה
+    מוגבל = מוצמד מלא × יחס
+    יתרת תקרה = תקרת הון פטורה − 1.35×מוגבלים − היוונים − 1.35×מענק משוריין
+    קצבה פטורה = יתרת תקרה / 180
+"""
+import calendar
+import math
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from app.exemption_caps import calc_exempt_capital, get_monthly_cap, MULTIPLIER
+
+# מקדם הפגיעה של מענק פטור בתקרת ההון
+IMPACT_MULTIPLIER = 1.35
+
+# חלון 32 השנים שלפני הזכאות, בימים
+WINDOW_DAYS = int(365.25 * 32)
+
+
+@dataclass(frozen=True, slots=True)
+class ClientInput:
+    id: int
+    first_name: str | None
+    last_name: str | None
+    birth_date: date | None
+    gender: str | None
+    reserved_grant_amount: float = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class GrantInput:
+    id: int
+    amount: float | None
+    work_start_date: date | None
+    work_end_date: date | None
+
+
+@dataclass(frozen=True, slots=True)
+class CommutationInput:
+    id: int
+    amount: float | None
+    include_calc: bool = True
+
+
+@dataclass(frozen=True, slots=True)
+class Caps:
+    exempt_cap: float
+    monthly_cap: float
+
+    @classmethod
+    def for_year(cls, year: int) -> 'Caps':
+        return cls(calc_exempt_capital(year), get_monthly_cap(year))
+
+
+@dataclass(frozen=True, slots=True)
+class GrantResult:
+    grant_id: int
+    nominal: float
+    indexed_full: float
+    ratio: float
+    indexed_limited: float   # מוצמד מלא × יחס 32 השנים
+    impact: float            # מוגבל × 1.35
+    relevant_nominal: float  # נומינלי × יחס
+
+
+@dataclass(frozen=True, slots=True)
+class SummaryResult:
+    client_id: int
+    client_name: str
+    eligibility_date: date
+    exempt_cap: float
+    grants_nominal: float
+    grants_indexed_full: float
+    grants_indexed_limited: float
+    grants_impact: float
+    reserved_grant_nominal: float
+    reserved_grant_impact: float
+    commutations_total: float
+    remaining_cap: float
+    monthly_cap: float
+    pension_exempt: float
+    pension_rate: float
+    grants: tuple
+    grants_count: int
+    commutations_count: int
+    grant_note: str | None = None
+    # מענקים שהיה אפשר להצמיד אבל ההצמדה נכשלה - הם חסרים בסכומים
+    indexation_failures: tuple = ()
+
+    @property
+    def degraded(self) -> bool:
+        """סיכום חלקי (הצמדה שנכשלה) - אסור לשמור אותו במטמון או בטבלה"""
+        return bool(self.indexation_failures)
+
+    def to_dict(self) -> dict:
+        """המבנה של calculate_summary כפי שמוחזר ב-API"""
+        summary = {
+            # נתוני לקוח
+            "client_info": {
+                "id": self.client_id,
+                "name": self.client_name,
+                "eligibility_date": self.eligibility_date.isoformat(),
+                "elig_year": self.eligibility_date.year
+            },
+            # סיכום חישובים לפי הסדר החדש
+            "exempt_cap": round(self.exempt_cap, 2),                  # 1. תקרת ההון הפטורה
+            "grants_nominal": round(self.grants_nominal, 2),           # 2. סך מענקים פטורים נומינליים
+            "grants_indexed_full": round(self.grants_indexed_full, 2),  # 3A. סך מענקים פטורים מוצמדים ללא הגבלה
+            "grants_indexed_limited": round(self.grants_indexed_limited, 2), # 3B. סך מענקים פטורים מוצמדים מוגבלים ל-32 שנים
+            "grants_impact": round(self.grants_impact, 2),            # 4. סך פגיעה בפטור = (3B) × 1.35
+            "reserved_grant_nominal": round(self.reserved_grant_nominal, 2),  # 4.1 מענק עתידי משוריין (נומינלי)
+            "reserved_grant_impact": round(self.reserved_grant_impact, 2),   # 4.2 השפעת מענק עתידי (×1.35)
+            "commutations_total": round(self.commutations_total, 2),   # 5. סך היוונים
+            "remaining_cap": round(self.remaining_cap, 2),            # 6. הפרש תקרת הון פטורה מול סך מענקים והיוונים
+            "monthly_cap": round(self.monthly_cap, 2),               # 7. תקרת קצבה מזכה
+            "pension_exempt": round(self.pension_exempt, 2),          # 8. קצבה פטורה מחושבת
+            "pension_rate": self.pension_rate,                        # 9. אחוז הקצבה הפטורה
+            # נתונים נוספים לנספחים
+            "details": {
+                "grants_count": self.grants_count,
+                "commutations_count": self.commutations_count
+            },
+            "grant_note": self.grant_note,
+            "indexation_failures": list(self.indexation_failures)
+        }
+        # ליותר תאימות לאחור, משאירים את הערך הישן במקום grants_indexed
+        summary["grants_indexed"] = summary["grants_indexed_limited"]
+        return summary
+
+
+def calculate_eligibility_age(birth_date: date, gender: str, pension_start: date) -> date:
+    """
+    Calculate eligibility age based on gender and pension start date
+
+    Args:
+        birth_date: The client's birth date
+        gender: The client's gender ('male' or 'female')
+        pension_start: The pension start date
+
+    Returns:
+        The eligibility date (max of legal retirement age and pension start date)
+    """
+    # גיל פרישה לפי מגדר
+    legal_retirement_age = date(birth_date.year + (67 if gender == "male" else 62), birth_date.month, birth_date.day)
+    return max(legal_retirement_age, pension_start)
+
+
+def add_months(d: date, months: int) -> date:
+    """d ועוד months חודשים; יום שאינו קיים בחודש היעד נצמד לסוף החודש"""
+    key = d.year * 12 + d.month - 1 + months
+    year, month = divmod(key, 12)
+    month += 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+
+def resolve_eligibility_date(client: ClientInput, first_pension_start: date | None = None,
+                             eligibility_date=None, today: date | None = None) -> date:
+    """
+    תאריך הזכאות לחישוב: תאריך שהתקבל מבחוץ, אחרת לפי גיל פרישה מול
+    תחילת הקצבה הראשונה (או היום, אם אין קצבה)
+    """
+    if eligibility_date:
+        if isinstance(eligibility_date, str):
+            return date.fromisoformat(eligibility_date[:10])
+        return eligibility_date
+    return calculate_eligibility_age(client.birth_date, client.gender,
+                                     first_pension_start or today or date.today())
+
+
+def window_ratio(start_date: date, end_date: date, elig_date: date) -> float:
+    """
+    היחס של ימי העבודה בין start_date ל-end_date שנופלים
+    בתוך 32 השנים שקדמו ל-elig_date (בין 0 ל-1).
+    """
+    limit_start = elig_date - timedelta(days=WINDOW_DAYS)
+    total_days = (end_date - start_date).days
+    if total_days <= 0:
+        return 0.0
+    overlap_days = max((min(end_date, elig_date) - max(start_date, limit_start)).days, 0)
+    return min(max(overlap_days / total_days, 0), 1)
+
+
+def compute_grant(grant: GrantInput, eligibility_date: date, indexed_full: float | None) -> GrantResult | None:
+    """
+    תוצאת מענק בודד
+
+    :param indexed_full: הסכום המוצמד המלא (מ-index_grants); None אם ההצמדה נכשלה
+    :return: GrantResult, או None אם למענק חסר סכום / תאריכים / הצמדה
+    """
+    if not grant.amount or indexed_full is None or not grant.work_start_date or not grant.work_end_date:
+        return None
+    ratio = window_ratio(grant.work_start_date, grant.work_end_date, eligibility_date)
+    limited = indexed_full * ratio
+    return GrantResult(
+        grant_id=grant.id,
+        nominal=grant.amount,
+        indexed_full=indexed_full,
+        ratio=ratio,
+        indexed_limited=limited,
+        impact=limited * IMPACT_MULTIPLIER,
+        relevant_nominal=grant.amount * ratio,
+    )
+
+
+def pension_from_remaining(remaining_cap: float, monthly_cap: float) -> tuple[float, float]:
+    """(קצבה פטורה חודשית, אחוז מהתקרה החודשית) מתוך יתרת תקרת ההון"""
+    pension_exempt = remaining_cap / MULTIPLIER if remaining_cap > 0 else 0
+    pension_rate = round((pension_exempt / monthly_cap) * 100, 2) if monthly_cap > 0 else 0
+    return pension_exempt, pension_rate
+
+
+def compute_summary(client: ClientInput,
+                    grants: list,
+                    commutations: list,
+                    eligibility_date: date,
+                    indexed_amounts: dict,
+                    caps: Caps | None = None) -> SummaryResult:
+    """
+    סיכום הפטור המלא ללקוח
+
+    :param grants: רשימת GrantInput
+    :param commutations: רשימת CommutationInput (רק include_calc נספרים)
+    :param indexed_amounts: מזהה מענק → סכום מוצמד מלא (או None)
+    :param caps: תקרות לשנת הזכאות (ברירת מחדל: לפי exemption_caps)
+    """
+    caps = caps or Caps.for_year(eligibility_date.year)
+
+    nominal_total = 0.0
+    results = []
+    for grant in grants:
+        if not grant.amount:
+            continue
+        nominal_total += grant.amount
+        result = compute_grant(grant, eligibility_date, indexed_amounts.get(grant.id))
+        if result is not None:
+            results.append(result)
+
+    failures = tuple(grant.id for grant in grants
+                     if grant.amount and grant.id in indexed_amounts and indexed_amounts[grant.id] is None)
+    indexed_total_full = sum(r.indexed_full for r in results)
+    indexed_total_limited = sum(r.indexed_limited for r in results)
+
+    grant_note = None
+    if not results and grants:
+        grant_note = "לא נמצאו מענקים תקינים. נא לבדוק נתוני תאריכים או סכומים."
+
+    included = [c for c in commutations if c.include_calc]
+    comm_total = sum(c.amount or 0 for c in included)
+
+    # פגיעה בתקרה מחושבת רק על המענקים המוגבלים ל-32 שנים
+    grants_impact = indexed_total_limited * IMPACT_MULTIPLIER if indexed_total_limited > 0 else 0
+    reserved = client.reserved_grant_amount or 0
+    reserved_impact = reserved * IMPACT_MULTIPLIER
+
+    remaining_cap = caps.exempt_cap - grants_impact - comm_total - reserved_impact
+    pension_exempt, pension_rate = pension_from_remaining(remaining_cap, caps.monthly_cap)
+
+    return SummaryResult(
+        client_id=client.id,
+        client_name=f"{client.first_name} {client.last_name}",
+        eligibility_date=eligibility_date,
+        exempt_cap=caps.exempt_cap,
+        grants_nominal=nominal_total,
+        grants_indexed_full=indexed_total_full,
+        grants_indexed_limited=indexed_total_limited,
+        grants_impact=grants_impact,
+        reserved_grant_nominal=reserved,
+        reserved_grant_impact=reserved_impact,
+        commutations_total=comm_total,
+        remaining_cap=remaining_cap,
+        monthly_cap=caps.monthly_cap,
+        pension_exempt=pension_exempt,
+        pension_rate=pension_rate,
+        grants=tuple(results),
+        grants_count=len(grants),
+        commutations_count=len(included),
+        grant_note=grant_note,
+        indexation_failures=failures,
+    )
+
+
+def max_reserved_grant(exempt_cap: float, grants_impact: float, commutations_total: float,
+                       target_pension: float) -> float:
+    """
+    המענק המשוריין המרבי שעדיין משאיר קצבה פטורה חודשית של target_pension לפחות.
+    מתוך: יתרת תקרה = תקרה − פגיעת מענקים − היוונים − 1.35×משוריין, וקצבה = יתרה / 180
+
+    :return: הסכום המרבי (מעוגל כלפי מטה לאגורה); שלילי אם היעד אינו בר השגה גם ללא שריון
+    """
+    amount = (exempt_cap - grants_impact - commutations_total - target_pension * MULTIPLIER) / IMPACT_MULTIPLIER
+    return math.floor(round(amount * 100, 6)) / 100
+
+
+def pension_for_reserved_grant(exempt_cap: float, monthly_cap: float, grants_impact: float,
+                               commutations_total: float, reserved_grant: float) -> tuple[float, float, float]:
+    """(יתרת תקרה, קצבה פטורה חודשית, אחוז מהתקרה) עבור מענק משוריין נתון"""
+    remaining_cap = exempt_cap - grants_impact - commutations_total - reserved_grant * IMPACT_MULTIPLIER
+    pension_exempt, pension_rate = pension_from_remaining(remaining_cap, monthly_cap)
+    return remaining_cap, pension_exempt, pension_rate
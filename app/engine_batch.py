@@ -0,0 +1,179 @@
+"""
+גרסה וקטורית (NumPy) של ליבת החישוב לחישוב מחדש של תיק שלם בבת אחת.
+
+הקלטים הם מערכים של תאריכים כמספרים סידוריים (date.toordinal()), סכומים
+נומינליים, תאריכי זכאות ומקדמי הצמדה / סכומים מוצמדים - מענק לכל שורה.
+התוצאות זהות בדיוק (לא רק בקירוב) לאלו של engine.window_ratio ו-engine.compute_grant:
+אותו סדר פעולות ב-float64, ועיגול הסכום המוצמד לאגורות כמו round() של פייתון.
+"""
+from dataclasses import dataclass
+from datetime import date
+
+import numpy as np
+
+from app.engine import IMPACT_MULTIPLIER, WINDOW_DAYS, MULTIPLIER
+
+
+@dataclass(frozen=True, slots=True)
+class GrantBatchResult:
+    valid: np.ndarray            # האם למענק יש תוצאה (compute_grant לא היה מחזיר None)
+    ratio: np.ndarray
+    indexed_full: np.ndarray
+    indexed_limited: np.ndarray  # מוצמד מלא × יחס 32 השנים
+    impact: np.ndarray           # מוגבל × 1.35
+    relevant_nominal: np.ndarray  # נומינלי × יחס
+
+    def __len__(self) -> int:
+        return len(self.valid)
+
+
+def to_ordinals(dates) -> np.ndarray:
+    """רשימת date (או None) → מערך int64 של מספרים סידוריים; None הופך ל-0"""
+    return np.fromiter((d.toordinal() if d else 0 for d in dates), dtype=np.int64, count=len(dates))
+
+
+def round_cents(values: np.ndarray) -> np.ndarray:
+    """
+    עיגול לשתי ספרות עשרוניות שזהה ל-round(x, 2) של פייתון.
+
+    np.round מכפיל ב-100 ומעגל, ולכן עלול לטעות כשהמכפלה נופלת בדיוק על חצי;
+    את המקרים הגבוליים (נדירים) מעגלים אחד-אחד ב-round של פייתון.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    borderline = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if borderline.any():
+        idx = np.flatnonzero(borderline)
+        rounded[idx] = [round(float(v), 2) for v in values[idx]]
+    return rounded
+
+
+def window_ratios(start: np.ndarray, end: np.ndarray, elig: np.ndarray) -> np.ndarray:
+    """
+    engine.window_ratio על מערכים: יחס ימי העבודה בתוך 32 השנים שלפני הזכאות.
+    elig יכול להיות סקלר (תאריך זכאות אחד לכל המענקים) או מערך.
+    """
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    elig = np.asarray(elig, dtype=np.int64)
+
+    limit_start = elig - WINDOW_DAYS
+    total_days = end - start
+    overlap_days = np.maximum(np.minimum(end, elig) - np.maximum(start, limit_start), 0)
+    positive = total_days > 0
+    ratio = np.divide(overlap_days, total_days, out=np.zeros(overlap_days.shape), where=positive)
+    return np.minimum(np.maximum(ratio, 0), 1)
+
+
+def compute_grants(amounts,
+                   start: np.ndarray,
+                   end: np.ndarray,
+                   elig,
+                   indexed_full=None,
+                   factors=None) -> GrantBatchResult:
+    """
+    engine.compute_grant על מערכים
+
+    :param amounts: סכומים נומינליים (0 / NaN = חסר סכום)
+    :param start: תחילת עבודה כמספר סידורי (0 = חסר)
+    :param end: סיום עבודה כמספר סידורי (0 = חסר)
+    :param elig: תאריך זכאות כמספר סידורי - סקלר או מערך
+    :param indexed_full: סכומים מוצמדים מלאים (NaN = ההצמדה נכשלה)
+    :param factors: במקום indexed_full - מקדמי הצמדה; הסכום המוצמד יהיה round(סכום × מקדם, 2)
+    """
+    if (indexed_full is None) == (factors is None):
+        raise ValueError("יש להעביר indexed_full או factors (אחד מהם בלבד)")
+
+    amounts = np.asarray(amounts, dtype=np.float64)
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    if indexed_full is None:
+        indexed_full = round_cents(amounts * np.asarray(factors, dtype=np.float64))
+    else:
+        indexed_full = np.asarray(indexed_full, dtype=np.float64)
+
+    valid = (np.nan_to_num(amounts) != 0) & ~np.isnan(indexed_full) & (start != 0) & (end != 0)
+
+    ratio = np.where(valid, window_ratios(start, end, elig), 0.0)
+    indexed_full = np.where(valid, indexed_full, 0.0)
+    limited = indexed_full * ratio
+    return GrantBatchResult(
+        valid=valid,
+        ratio=ratio,
+        indexed_full=indexed_full,
+        indexed_limited=limited,
+        impact=limited * IMPACT_MULTIPLIER,
+        relevant_nominal=np.where(valid, amounts, 0.0) * ratio,
+    )
+
+
+def compute_grant_inputs(grants: list, eligibility_date: date, indexed_amounts: dict) -> GrantBatchResult:
+    """
+    מעטפת נוחה מעל compute_grants לרשימת GrantInput
+
+    :param indexed_amounts: מזהה מענק → סכום מוצמד מלא (או None), כמו ב-compute_summary
+    """
+    amounts = np.fromiter((g.amount or 0.0 for g in grants), dtype=np.float64, count=len(grants))
+    indexed = np.fromiter(
+        (np.nan if indexed_amounts.get(g.id) is None else indexed_amounts[g.id] for g in grants),
+        dtype=np.float64, count=len(grants))
+    return compute_grants(
+        amounts,
+        to_ordinals([g.work_start_date for g in grants]),
+        to_ordinals([g.work_end_date for g in grants]),
+        eligibility_date.toordinal(),
+        indexed_full=indexed,
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class SweepResult:
+    grants_indexed_limited: np.ndarray
+    grants_impact: np.ndarray
+    remaining_cap: np.ndarray
+    pension_exempt: np.ndarray
+    pension_rate: np.ndarray
+
+
+def sweep_summaries(amounts,
+                    start: np.ndarray,
+                    end: np.ndarray,
+                    eligs: np.ndarray,
+                    indexed_full: np.ndarray,
+                    exempt_caps: np.ndarray,
+                    monthly_caps: np.ndarray,
+                    commutations_total: float,
+                    reserved_grant: float) -> SweepResult:
+    """
+    engine.compute_summary עבור הרבה תאריכי זכאות בבת אחת (שורה לכל תאריך).
+
+    :param amounts, start, end: מענק לכל עמודה (כמו ב-compute_grants)
+    :param eligs: תאריכי הזכאות כמספרים סידוריים - אחד לכל שורה
+    :param indexed_full: מטריצה (תאריכים × מענקים) של סכומים מוצמדים מלאים (NaN = נכשלה)
+    :param exempt_caps, monthly_caps: התקרות לשנת כל תאריך
+    """
+    eligs = np.asarray(eligs, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    start = np.asarray(start, dtype=np.int64)
+    end = np.asarray(end, dtype=np.int64)
+    indexed_full = np.asarray(indexed_full, dtype=np.float64).reshape(len(eligs), len(amounts))
+
+    valid = (np.nan_to_num(amounts) != 0) & (start != 0) & (end != 0) & ~np.isnan(indexed_full)
+    ratio = window_ratios(start[np.newaxis, :], end[np.newaxis, :], eligs[:, np.newaxis])
+    limited = np.where(valid, np.nan_to_num(indexed_full) * ratio, 0.0)
+
+    # סכימה לפי סדר המענקים, כמו sum() ב-compute_summary, כדי לקבל תוצאה זהה בדיוק
+    total_limited = np.zeros(len(eligs))
+    for column in limited.T:
+        total_limited = total_limited + column
+
+    grants_impact = np.where(total_limited > 0, total_limited * IMPACT_MULTIPLIER, 0.0)
+    remaining_cap = np.asarray(exempt_caps, dtype=np.float64) - grants_impact - commutations_total \
+        - reserved_grant * IMPACT_MULTIPLIER
+    pension_exempt = np.where(remaining_cap > 0, remaining_cap / MULTIPLIER, 0.0)
+    monthly_caps = np.asarray(monthly_caps, dtype=np.float64)
+    positive_cap = monthly_caps > 0
+    rate = np.divide(pension_exempt, monthly_caps, out=np.zeros(len(eligs)), where=positive_cap) * 100
+    pension_rate = np.where(positive_cap, round_cents(rate), 0.0)
+    return SweepResult(total_limited, grants_impact, remaining_cap, pension_exempt, pension_rate)
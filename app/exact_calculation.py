@@ -1,5 +1,6 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import sqlite3
+from app.engine import window_ratio
 from flask import g
 
 def calculate_relative_amount_with_logging(start_date, end_date, amount):
@@ -8,7 +9,6 @@ def calculate_relative_amount_with_logging(start_date, end_date, amount):
     """
     try:
         today = datetime.today().date()
-        limit_start = today - timedelta(days=365.25 * 32)
         if isinstance(start_date, str):
             start = datetime.strptime(start_date, '%Y-%m-%d').date()
         else:
@@ -18,14 +18,10 @@ def calculate_relative_amount_with_logging(start_date, end_date, amount):
         else:
             end = end_date
             
-        total_days = (end - start).days
-        overlap_start = max(start, limit_start)
-        overlap_end = min(end, today)
-        overlap_days = (overlap_end - overlap_start).days
-        ratio = max(0, min(overlap_days / total_days, 1)) if total_days > 0 else 0
+        ratio = window_ratio(start, end, today)
         result = round(amount * ratio, 2)
         
-        print(f'[DEBUG יחסי מענק] סכום={amount}, התחלה={start}, סיום={end}, חפיפה={overlap_days} ימים, יחס={ratio:.4f}, תוצאה={result}')
+        print(f'[DEBUG יחסי מענק] סכום={amount}, התחלה={start}, סיום={end}, יחס={ratio:.4f}, תוצאה={result}')
         return result
     except Exception as e:
         print(f'[DEBUG שגיאה ביחס מענק] התחלה={start_date}, סיום={end_date}, שגיאה: {str(e)}')
@@ -0,0 +1,133 @@
+"""
+ייצוא בזרימה (NDJSON / CSV) של לקוחות, מענקים וסיכומי פטור - לדוחות.
+
+השורות נקראות מהמסד עם yield_per (עמודות ולא אובייקטי ORM), כך שהזיכרון תלוי
+בגודל האצווה ולא בגודל התיק, והשורה הראשונה נשלחת מיד.
+
+סיכומי הלקוחות נלקחים מטבלת client_summary; לקוח שאין לו שורה שמורה, או ששורתו
+חושבה לפי מדד קודם (או כשמבקשים fresh), מחושב בזמן הייצוא - אצווה אחרי אצווה
+דרך batch_summaries. הייצוא קריאה בלבד: הוא לא כותב לטבלת client_summary.
+"""
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from app.models import db, Client, Grant, ClientSummary
+from app.client_summary import SUMMARY_FIELDS, is_current
+from app.repository import load_client_graphs
+from app.batch_summaries import summaries_for_clients
+
+# מספר השורות שנשלפות מהמסד בכל פעם
+EXPORT_BATCH_SIZE = 500
+
+CLIENT_COLUMNS = ('id', 'first_name', 'last_name', 'tz', 'birth_date', 'gender', 'phone', 'address',
+                  'reserved_grant_amount')
+SUMMARY_COLUMNS = ('eligibility_date',) + SUMMARY_FIELDS + ('summary_source',)
+GRANT_COLUMNS = ('id', 'client_id', 'employer_name', 'work_start_date', 'work_end_date', 'grant_amount',
+                 'grant_date', 'grant_indexed_amount', 'limited_indexed_amount', 'grant_ratio',
+                 'impact_on_exemption')
+
+EXPORTS = {
+    'clients': CLIENT_COLUMNS + SUMMARY_COLUMNS,
+    'grants': GRANT_COLUMNS,
+}
+
+
+def _value(value):
+    """תאריכים כ-ISO, כל השאר כמו שהוא"""
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _summary_values(summary: dict) -> dict:
+    """שדות הסיכום מתוך מילון של calculate_summary / compute_summary"""
+    if 'error' in summary:
+        return {'summary_source': 'error'}
+    values = {field: round(summary[field] or 0, 2) for field in SUMMARY_FIELDS}
+    values['eligibility_date'] = summary['client_info']['eligibility_date']
+    values['summary_source'] = 'computed'
+    return values
+
+
+def iter_client_rows(fresh: bool = False, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    שורה (מילון) לכל לקוח לפי סדר המזהה, עם שדות הסיכום.
+
+    :param fresh: לחשב את כל הסיכומים מחדש במקום להשתמש בטבלה השמורה
+    """
+    summary_columns = [getattr(ClientSummary, field) for field in ('eligibility_date',) + SUMMARY_FIELDS]
+    query = (
+        select(*[getattr(Client, column) for column in CLIENT_COLUMNS],
+               ClientSummary.cpi_vintage, ClientSummary.eligibility_basis, ClientSummary.updated_at,
+               *summary_columns)
+        .outerjoin(ClientSummary, ClientSummary.client_id == Client.id)
+        .order_by(Client.id)
+        .execution_options(yield_per=batch_size)
+    )
+    result = db.session.execute(query)
+    for partition in result.partitions():
+        rows = []
+        missing = []
+        for record in partition:
+            mapping = record._mapping
+            row = {column: _value(mapping[column]) for column in CLIENT_COLUMNS}
+            if not fresh and mapping['cpi_vintage'] is not None and \
+                    is_current(mapping['cpi_vintage'], mapping['eligibility_basis'], mapping['updated_at']):
+                for field in ('eligibility_date',) + SUMMARY_FIELDS:
+                    value = mapping[field]
+                    row[field] = _value(value) if field == 'eligibility_date' else round(value or 0, 2)
+                row['summary_source'] = 'stored'
+            else:
+                missing.append(row)
+            rows.append(row)
+
+        if missing:
+            clients = load_client_graphs([row['id'] for row in missing])
+            summaries = {client.id: summary for client, summary in zip(clients, summaries_for_clients(clients))}
+            for row in missing:
+                row.update(_summary_values(summaries.get(row['id'], {'error': True})))
+            db.session.expunge_all()
+
+        yield from rows
+
+
+def iter_grant_rows(batch_size: int = EXPORT_BATCH_SIZE):
+    """שורה (מילון) לכל מענק לפי סדר הלקוח והמזהה, עם התוצאות השמורות במענק"""
+    query = (
+        select(*[getattr(Grant, column) for column in GRANT_COLUMNS])
+        .order_by(Grant.client_id, Grant.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for record in db.session.execute(query):
+        mapping = record._mapping
+        yield {column: _value(mapping[column]) for column in GRANT_COLUMNS}
+
+
+def iter_export_rows(kind: str, fresh: bool = False):
+    if kind == 'clients':
+        return iter_client_rows(fresh=fresh)
+    if kind == 'grants':
+        return iter_grant_rows()
+    raise ValueError(f"ייצוא לא מוכר: {kind}")
+
+
+def iter_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def iter_csv(rows, columns):
+    """
+    CSV בזרימה: כותרת ואז שורה לכל רשומה.
+    מתחיל ב-BOM כדי ש-Excel יזהה UTF-8 ויציג עברית כראוי.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    yield "\ufeff" + buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
@@ -0,0 +1,177 @@
+"""
+מטמון מתמיד למקדמי הצמדה, משותף לכל תהליכי ה-gunicorn.
+
+המטמון שומר את *המקדם* (לא את הסכום) לכל זוג חודשים
+(חודש סיום עבודה, חודש זכאות) בטבלת SQLite נפרדת על הדיסק,
+כך שמקדם אחד משרת כל מענק עם אותם תאריכים.
+
+תוקף רשומה:
+- רשומה שעברה את INDEXATION_CACHE_TTL שניות נחשבת פגה
+- כשמתפרסם מדד חדש (vintage חדש בסדרה המקומית) נמחקות רשומות שחודש היעד שלהן
+  היה אחרי המדד האחרון הידוע - הן חושבו לפי מדד ישן במקום מדד החודש עצמו
+- בלי סדרה מקומית (או כש-CPI_LOCAL_ENGINE כבוי) המדד החדש מזוהה מול הלמ"ס:
+  כל CPI_VINTAGE_CHECK_SECONDS נשלף מקדם בדיקה קבוע (PROBE_DATE עד היום), וכשהוא
+  משתנה נמחקות הרשומות של חודשי היעד האחרונים (RECENT_TARGET_MONTHS) שנשלפו לפניו.
+  הבדיקה משותפת לכל התהליכים דרך indexation_meta, ומתבצעת רק כשיש רשומות כאלה.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import date
+from logging import getLogger
+
+from config import Config
+from app.cpi import get_cpi_vintage, month_key, month_label
+
+logger = getLogger(__name__)
+
+_local = threading.local()
+_seen_vintage = None
+_next_probe = 0.0
+
+# תאריך מוצא קבוע למקדם הבדיקה מול הלמ"ס
+PROBE_DATE = '2000-01-01'
+# חודשי יעד שהמדד שלהם אולי טרם פורסם כשהמקדם נשלף (המדד מתפרסם באמצע החודש הבא)
+RECENT_TARGET_MONTHS = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexation_factor (
+    from_month TEXT NOT NULL,
+    to_month TEXT NOT NULL,
+    factor REAL NOT NULL,
+    source TEXT,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (from_month, to_month)
+);
+CREATE TABLE IF NOT EXISTS indexation_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _connect() -> sqlite3.Connection:
+    """חיבור SQLite אחד לכל thread; WAL מאפשר קריאות מקבילות מכמה תהליכים"""
+    path = Config.INDEXATION_CACHE_PATH
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and getattr(_local, 'path', None) == path:
+        return conn
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _local.conn, _local.path = conn, path
+    return conn
+
+
+def _meta(conn: sqlite3.Connection, key: str) -> str | None:
+    row = conn.execute("SELECT value FROM indexation_meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute("INSERT OR REPLACE INTO indexation_meta (key, value) VALUES (?, ?)", (key, value))
+
+
+def _sync_cbs_vintage(conn: sqlite3.Connection):
+    """בודק מול הלמ"ס אם פורסם מדד חדש ומוחק את המקדמים שחושבו לפי המדד הקודם"""
+    global _next_probe
+
+    now = time.time()
+    if now < _next_probe:
+        return
+    _next_probe = now + Config.CPI_VINTAGE_CHECK_SECONDS
+    checked_at = _meta(conn, 'cbs_checked_at')
+    if checked_at and now - float(checked_at) < Config.CPI_VINTAGE_CHECK_SECONDS:
+        return  # תהליך אחר בדק לאחרונה
+
+    cutoff = month_label(month_key(date.today()) - RECENT_TARGET_MONTHS)
+    if not conn.execute("SELECT 1 FROM indexation_factor WHERE to_month >= ? LIMIT 1", (cutoff,)).fetchone():
+        return
+
+    from app.indexation import fetch_cbs_factor
+    probe = fetch_cbs_factor(PROBE_DATE, date.today().isoformat())
+    if probe is None:
+        return  # הלמ"ס לא זמין - ננסה בבדיקה הבאה
+    _set_meta(conn, 'cbs_checked_at', str(now))
+    vintage = f"{probe:.8f}"
+    stored = _meta(conn, 'cbs_vintage')
+    if stored != vintage:
+        if stored:
+            deleted = conn.execute(
+                "DELETE FROM indexation_factor WHERE to_month >= ? AND fetched_at < ?", (cutoff, now)
+            ).rowcount
+            logger.info("מקדם הבדיקה מול הלמ\"ס השתנה (%s → %s) - נמחקו %s מקדמים", stored, vintage, deleted)
+        _set_meta(conn, 'cbs_vintage', vintage)
+
+
+def _sync_vintage(conn: sqlite3.Connection):
+    """מוחק רשומות שהתיישנו בעקבות פרסום מדד חדש"""
+    global _seen_vintage
+
+    vintage = get_cpi_vintage() if Config.CPI_LOCAL_ENGINE else None
+    if vintage is None:
+        _sync_cbs_vintage(conn)
+        return
+    if vintage == _seen_vintage:
+        return
+    stored = _meta(conn, 'cpi_vintage')
+    if stored != vintage:
+        if stored:
+            deleted = conn.execute(
+                "DELETE FROM indexation_factor WHERE to_month > ?", (stored,)
+            ).rowcount
+            logger.info("מדד חדש %s (קודם %s) - נמחקו %s מקדמים", vintage, stored, deleted)
+        _set_meta(conn, 'cpi_vintage', vintage)
+    _seen_vintage = vintage
+
+
+def get_cbs_vintage() -> str | None:
+    """מקדם הבדיקה האחרון מול הלמ"ס (מתחלף כשמתפרסם מדד חדש), או None אם טרם נבדק"""
+    try:
+        return _meta(_connect(), 'cbs_vintage')
+    except sqlite3.Error as e:
+        logger.warning("שגיאה בקריאת מטמון המקדמים: %s", e)
+        return None
+
+
+def get_factor(from_month: str, to_month: str) -> float | None:
+    """מחזיר מקדם שמור לזוג החודשים ('YYYY-MM'), או None אם אין / פג תוקף"""
+    try:
+        conn = _connect()
+        _sync_vintage(conn)
+        row = conn.execute(
+            "SELECT factor, fetched_at FROM indexation_factor WHERE from_month = ? AND to_month = ?",
+            (from_month, to_month)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning("שגיאה בקריאת מטמון המקדמים: %s", e)
+        return None
+    if row is None or time.time() - row[1] > Config.INDEXATION_CACHE_TTL:
+        return None
+    return row[0]
+
+
+def put_factor(from_month: str, to_month: str, factor: float, source: str = 'cbs'):
+    """שומר מקדם לזוג החודשים"""
+    try:
+        _connect().execute(
+            "INSERT OR REPLACE INTO indexation_factor (from_month, to_month, factor, source, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (from_month, to_month, factor, source, time.time())
+        )
+    except sqlite3.Error as e:
+        logger.warning("שגיאה בשמירת מקדם למטמון: %s", e)
+
+
+def clear_factors():
+    """מרוקן את המטמון (למשל לאחר רענון ידני של סדרת המדד)"""
+    global _seen_vintage, _next_probe
+    conn = _connect()
+    conn.execute("DELETE FROM indexation_factor")
+    conn.execute("DELETE FROM indexation_meta")
+    _seen_vintage = None
+    _next_probe = 0.0
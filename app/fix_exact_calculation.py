@@ -1,6 +1,7 @@
-from datetime import datetime, timedelta
-import requests
+from datetime import datetime
 import json
+from app.cbs_client import get_cbs_client
+from app.engine import window_ratio
 
 def calculate_relative_amount(start_date, end_date, amount):
     """
@@ -9,7 +10,6 @@ def calculate_relative_amount(start_date, end_date, amount):
     """
     try:
         today = datetime.today().date()
-        limit_start = today - timedelta(days=365.25 * 32)
         
         if isinstance(start_date, str):
             start = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -21,15 +21,10 @@ def calculate_relative_amount(start_date, end_date, amount):
         else:
             end = end_date
             
-        total_days = (end - start).days
-        overlap_start = max(start, limit_start)
-        overlap_end = min(end, today)
-        overlap_days = (overlap_end - overlap_start).days
-        
-        ratio = max(0, min(overlap_days / total_days, 1)) if total_days > 0 else 0
+        ratio = window_ratio(start, end, today)
         result = round(amount * ratio, 2)
         
-        print(f'[חישוב יחסי] סכום={amount}, התחלה={start}, סיום={end}, חפיפה={overlap_days} ימים, יחס={ratio:.4f}, תוצאה={result}')
+        print(f'[חישוב יחסי] סכום={amount}, התחלה={start}, סיום={end}, יחס={ratio:.4f}, תוצאה={result}')
         return result
     except Exception as e:
         print(f'[שגיאה בחישוב יחסי] התחלה={start_date}, סיום={end_date}, שגיאה: {str(e)}')
@@ -49,20 +44,12 @@ def calculate_adjusted_amount(amount, end_work_date):
         else:
             end_work_date = end_work_date.isoformat()
             
-        url = 'https://api.cbs.gov.il/index/data/calculator/120010'
-        params = {
-            'value': amount, 
-            'date': end_work_date, 
-            'toDate': datetime.today().date().isoformat(), 
-            'format': 'json', 
-            'download': 'false'
-        }
+        from_date = end_work_date
+        to_date = datetime.today().date().isoformat()
         
-        print(f"[חישוב הצמדה] מבצע קריאה ל-API עם הפרמטרים: {params}")
+        print(f"[חישוב הצמדה] מבצע קריאה ל-API עבור {amount} מ-{from_date} עד {to_date}")
         
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = get_cbs_client().calculator(amount, from_date, to_date)
         
         answer = data.get('answer')
         if not answer:
@@ -1,42 +1,34 @@
-import requests
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from logging import getLogger
+from config import Config
+from app.cpi import local_indexation_factor
+from app import factor_cache
+from app.engine import window_ratio
+from app.cbs_client import get_cbs_client, CircuitOpenError
 
 logger = getLogger(__name__)
 
-# CBS Consumer Price Index API endpoint
-CBS_CPI_API = 'https://api.cbs.gov.il/index/data/calculator/120010'
+# CBS Consumer Price Index API endpoint (base URL is Config.CBS_BASE_URL)
+CBS_CPI_API = f"{Config.CBS_BASE_URL}/index/data/calculator/120010"
+
+# סכום ייחוס לשליפת מקדם - גדול מספיק כדי שעיגול to_value לא יפגע בדיוק
+REFERENCE_AMOUNT = 1_000_000
 
 def log_change(message):
     """Helper function to log changes and warnings"""
     logger.warning(message)
 
-def calculate_adjusted_amount(amount, end_work_date, to_date=None):
+def fetch_cbs_factor(end_work_date, to_date) -> float | None:
     """
-    מחשב את הסכום המוצמד לפי API של הלמ"ס
+    שולף מקדם הצמדה ממחשבון הלמ"ס עבור סכום ייחוס
     
-    :param amount: סכום נומינלי להצמדה
-    :param end_work_date: תאריך סיום עבודה (YYYY-MM-DD)
-    :param to_date: תאריך יעד להצמדה (אם None, ישתמש בתאריך נוכחי)
-    :return: סכום מוצמד או None בשגיאה
+    :param end_work_date: תאריך המוצא (YYYY-MM-DD)
+    :param to_date: תאריך היעד (YYYY-MM-DD)
+    :return: מקדם הצמדה או None בשגיאה
     """
     try:
-        url = 'https://api.cbs.gov.il/index/data/calculator/120010'
-        
-        # וידוא שהתאריך היעד מועבר כמחרוזת בפורמט YYYY-MM-DD
-        if to_date and not isinstance(to_date, str):
-            to_date = to_date.isoformat()  # המרה לפורמט YYYY-MM-DD
-            
-        params = {
-            'value': amount, 
-            'date': end_work_date,          # חייב להיות str!
-            'toDate': to_date if to_date else datetime.today().date().isoformat(), 
-            'format': 'json', 
-            'download': 'false'
-        }
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = get_cbs_client().calculator(REFERENCE_AMOUNT, end_work_date, to_date)
         answer = data.get('answer')
         if not answer:
             log_change(f'אזהרה: API ללא answer עבור {end_work_date} | תשובה: {data}')
@@ -45,11 +37,116 @@ def calculate_adjusted_amount(amount, end_work_date, to_date=None):
         if to_value is None:
             log_change(f'אזהרה: אין to_value עבור {end_work_date} | תשובה: {data}')
             return None
-        return round(float(to_value), 2)
+        return float(to_value) / REFERENCE_AMOUNT
+    except CircuitOpenError:
+        log_change(f'הלמ"ס אינו זמין - דילוג על הצמדה עבור {end_work_date}')
+        return None
     except Exception as e:
         log_change(f'שגיאה בהצמדה עבור {end_work_date}: {e}')
         return None
 
+def _normalize_dates(end_work_date, to_date=None) -> tuple[str, str]:
+    """מחזיר את שני התאריכים כמחרוזות YYYY-MM-DD (תאריך יעד ברירת מחדל: היום)"""
+    if not isinstance(end_work_date, str):
+        end_work_date = end_work_date.isoformat()
+    if to_date and not isinstance(to_date, str):
+        to_date = to_date.isoformat()  # המרה לפורמט YYYY-MM-DD
+    return end_work_date, to_date or datetime.today().date().isoformat()
+
+def _offline_factor(end_work_date: str, to_date: str) -> float | None:
+    """מקדם ללא פנייה לרשת: סדרת המדד המקומית ואז מטמון המקדמים המשותף"""
+    # הצמדה מקומית מסדרת המדד השמורה - ללא קריאת רשת
+    if Config.CPI_LOCAL_ENGINE:
+        factor = local_indexation_factor(end_work_date, to_date)
+        if factor is not None:
+            return factor
+    return factor_cache.get_factor(end_work_date[:7], to_date[:7])
+
+def _fetch_and_cache_factor(end_work_date: str, to_date: str) -> float | None:
+    """שולף מקדם מהלמ"ס ושומר אותו במטמון המשותף"""
+    factor = fetch_cbs_factor(end_work_date, to_date)
+    if factor is not None:
+        factor_cache.put_factor(end_work_date[:7], to_date[:7], factor)
+    return factor
+
+def get_indexation_factor(end_work_date, to_date=None) -> float | None:
+    """
+    מחזיר מקדם הצמדה בין חודש סיום העבודה לחודש היעד.
+    סדר החיפוש: סדרת מדד מקומית → מטמון מקדמים משותף → מחשבון הלמ"ס
+    
+    :param end_work_date: תאריך סיום עבודה (YYYY-MM-DD או date)
+    :param to_date: תאריך יעד להצמדה (אם None, ישתמש בתאריך נוכחי)
+    :return: מקדם הצמדה או None בשגיאה
+    """
+    end_work_date, to_date = _normalize_dates(end_work_date, to_date)
+    factor = _offline_factor(end_work_date, to_date)
+    if factor is not None:
+        return factor
+    return _fetch_and_cache_factor(end_work_date, to_date)
+
+def get_indexation_factors(date_pairs, max_workers: int | None = None) -> dict:
+    """
+    מחזיר מקדמי הצמדה לרשימת זוגות (תאריך סיום עבודה, תאריך יעד).
+    זוגות עם אותם חודשים מאוחדים, והזוגות שאינם זמינים מקומית
+    נשלפים מהלמ"ס במקביל, עם תקרת מקביליות INDEXATION_MAX_WORKERS.
+    
+    :return: מילון (חודש מוצא, חודש יעד) → מקדם או None
+    """
+    unique = {}
+    for end_work_date, to_date in date_pairs:
+        end_work_date, to_date = _normalize_dates(end_work_date, to_date)
+        unique.setdefault((end_work_date[:7], to_date[:7]), (end_work_date, to_date))
+
+    factors = {}
+    pending = []
+    for key, dates in unique.items():
+        factors[key] = _offline_factor(*dates)
+        if factors[key] is None:
+            pending.append(key)
+
+    if pending:
+        workers = min(max_workers or Config.INDEXATION_MAX_WORKERS, len(pending))
+        if workers <= 1:
+            fetched = [_fetch_and_cache_factor(*unique[key]) for key in pending]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetched = list(pool.map(lambda key: _fetch_and_cache_factor(*unique[key]), pending))
+        factors.update(zip(pending, fetched))
+    return factors
+
+def index_grants(grant_requests: list, max_workers: int | None = None) -> list:
+    """
+    גרסת אצווה של index_grant: מצמידה רשימת מענקים בבת אחת
+    
+    :param grant_requests: רשימת מילונים עם המפתחות של index_grant
+                           (amount, start_date, end_work_date, elig_date)
+    :param max_workers: תקרת פניות מקבילות ללמ"ס (ברירת מחדל מהקונפיגורציה)
+    :return: רשימת סכומים מוצמדים (או None) באותו סדר
+    """
+    pairs = [_normalize_dates(req['end_work_date'], req.get('elig_date')) for req in grant_requests]
+    factors = get_indexation_factors(pairs, max_workers)
+
+    results = []
+    for req, (end_work_date, to_date) in zip(grant_requests, pairs):
+        factor = factors.get((end_work_date[:7], to_date[:7]))
+        amount = req.get('amount')
+        results.append(round(amount * factor, 2) if factor is not None and amount is not None else None)
+    return results
+
+def calculate_adjusted_amount(amount, end_work_date, to_date=None):
+    """
+    מחשב את הסכום המוצמד לפי מדד הלמ"ס
+    
+    :param amount: סכום נומינלי להצמדה
+    :param end_work_date: תאריך סיום עבודה (YYYY-MM-DD)
+    :param to_date: תאריך יעד להצמדה (אם None, ישתמש בתאריך נוכחי)
+    :return: סכום מוצמד או None בשגיאה
+    """
+    factor = get_indexation_factor(end_work_date, to_date)
+    if factor is None:
+        return None
+    return round(amount * factor, 2)
+
 def index_grant(amount: float,
                 start_date: str,
                 end_work_date: str,
@@ -66,7 +163,6 @@ def index_grant(amount: float,
     # נשתמש בפונקציה המתוקנת
     if elig_date:
         # אם יש תאריך זכאות, נצטרך להמיר את התאריך לאובייקט מתאים
-        from datetime import date
         # המרה ממחרוזת YYYY-MM-DD לאובייקט date
         elig_date_obj = date.fromisoformat(elig_date)
         return calculate_adjusted_amount(amount, end_work_date, elig_date_obj)
@@ -95,32 +191,21 @@ def work_ratio_within_last_32y(start_date, end_date, elig_date):
     מחשב את היחס של ימי העבודה בין start_date ל-end_date שנופלים
     בתוך 32 השנים שקדמו ל-elig_date.
     """
-    from datetime import datetime, timedelta
-    
     try:
         # המרת תאריכים לאובייקטי date אם הם מחרוזות
         if isinstance(start_date, str):
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            start_date = date.fromisoformat(start_date)
         if isinstance(end_date, str):
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            end_date = date.fromisoformat(end_date)
         if isinstance(elig_date, str):
-            elig_date = datetime.strptime(elig_date, '%Y-%m-%d').date()
+            elig_date = date.fromisoformat(elig_date)
             
-        today = elig_date  # השתמש תמיד בתאריך הזכאות
-        limit_start = today - timedelta(days=int(365.25 * 32))
-        
-        total_days = (end_date - start_date).days
-        overlap_start = max(start_date, limit_start)
-        overlap_end = min(end_date, today)
-        overlap_days = max((overlap_end - overlap_start).days, 0)
-        
-        ratio = (overlap_days / total_days) if total_days > 0 else 0
-        # גבולות
-        ratio = min(max(ratio, 0), 1)
+        # חישוב מול תאריך הזכאות - ליבת החישוב המשותפת
+        ratio = window_ratio(start_date, end_date, elig_date)
         
         # לוג לפיקוח
-        print(f"[יחסי מענק] תאריך ייחוס={today}, התחלה={start_date}, "
-              f"סיום={end_date}, חפיפה={overlap_days} ימים, יחס={ratio:.4f}")
+        print(f"[יחסי מענק] תאריך ייחוס={elig_date}, התחלה={start_date}, "
+              f"סיום={end_date}, יחס={ratio:.4f}")
         return ratio
     except Exception as e:
         print(f"[שגיאה ביחס מענק] התחלה={start_date}, סיום={end_date}, שגיאה: {str(e)}")
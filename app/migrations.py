@@ -0,0 +1,124 @@
+"""
+מיגרציות סכמה מנוהלות.
+
+כל מיגרציה רצה פעם אחת, בטרנזקציה משלה, ונרשמת בטבלת schema_migrations.
+db.create_all יוצר במסד חדש את כל הטבלאות והאינדקסים מ-models.py, ולכן כל
+הפקודות כאן אידמפוטנטיות (IF NOT EXISTS וכו'): במסד חדש הן רק נרשמות, ובמסד
+קיים הן מביאות אותו לאותו מצב.
+
+הרצה: python migrate.py (לפני עליית ה-workers - ראו start.sh / Procfile).
+מיגרציה חדשה מוסיפים לסוף MIGRATIONS עם מספר גרסה עוקב.
+"""
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+class MigrationError(RuntimeError):
+    """מיגרציה שלא ניתן להריץ על הנתונים הקיימים (למשל ת"ז כפולות)"""
+
+
+def _index_is_unique(conn, table: str, index: str) -> bool:
+    return any(row[1] == index and row[2] for row in conn.execute(text(f'PRAGMA index_list("{table}")')))
+
+
+def _unique_client_tz(conn):
+    if _index_is_unique(conn, 'client', 'ix_client_tz'):
+        return
+    conn.execute(text("UPDATE client SET tz = NULL WHERE trim(tz) = ''"))
+    duplicates = conn.execute(text(
+        "SELECT tz, group_concat(id) FROM client WHERE tz IS NOT NULL GROUP BY tz HAVING count(*) > 1"
+    )).all()
+    if duplicates:
+        details = "; ".join(f"ת\"ז {tz}: לקוחות {ids}" for tz, ids in duplicates)
+        raise MigrationError(f"יש לתקן ת\"ז כפולות לפני המיגרציה - {details}")
+    conn.execute(text("DROP INDEX IF EXISTS ix_client_tz"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_client_tz ON client (tz)"))
+
+
+def _pad_client_tz(conn):
+    """ת\"ז ספרתית קצרה מ-9 ספרות מרופדת באפסים מובילים - כמו utils.normalize_tz"""
+    padded = "substr('000000000' || tz, -9)"
+    clashes = conn.execute(text(
+        f"SELECT a.id, b.id, b.tz FROM client a JOIN client b ON {padded.replace('tz', 'a.tz')} = b.tz "
+        "WHERE a.id != b.id AND length(a.tz) < 9 AND a.tz NOT GLOB '*[^0-9]*'"
+    )).all()
+    if clashes:
+        details = "; ".join(f"לקוחות {a} ו-{b} (ת\"ז {tz})" for a, b, tz in clashes)
+        raise MigrationError(f"יש לתקן ת\"ז כפולות לפני המיגרציה - {details}")
+    conn.execute(text(
+        f"UPDATE client SET tz = {padded} WHERE length(tz) < 9 AND tz != '' AND tz NOT GLOB '*[^0-9]*'"
+    ))
+
+
+def _add_column(table: str, column: str, ddl: str):
+    """ALTER TABLE ADD COLUMN רק אם העמודה עוד לא קיימת (במסד חדש create_all כבר יצר אותה)"""
+    def step(conn):
+        columns = {row[1] for row in conn.execute(text(f'PRAGMA table_info("{table}")'))}
+        if column not in columns:
+            conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+    return step
+
+
+# (גרסה, תיאור, פקודות SQL או פונקציה שמקבלת חיבור)
+MIGRATIONS = [
+    ("001", "אינדקסים לסינון רשימת הלקוחות", [
+        "CREATE INDEX IF NOT EXISTS ix_client_first_name ON client (first_name)",
+        "CREATE INDEX IF NOT EXISTS ix_client_last_name ON client (last_name)",
+        "CREATE INDEX IF NOT EXISTS ix_client_summary_eligibility_date ON client_summary (eligibility_date)",
+    ]),
+    ("002", "ת\"ז ייחודית", _unique_client_tz),
+    ("003", "אינדקסים על המפתחות הזרים של מענקים, קצבאות והיוונים", [
+        'CREATE INDEX IF NOT EXISTS ix_grant_client_id ON "grant" (client_id)',
+        "CREATE INDEX IF NOT EXISTS ix_pension_client_id ON pension (client_id)",
+        "CREATE INDEX IF NOT EXISTS ix_commutation_pension_id_include_calc ON commutation (pension_id, include_calc)",
+        "ANALYZE",
+    ]),
+    ("004", "טביעת אצבע של קלטי החישוב במענק", _add_column("grant", "calc_inputs_hash", "VARCHAR(16)")),
+    ("005", "מקור תאריך הזכאות בסיכום השמור", _add_column("client_summary", "eligibility_basis", "VARCHAR(10)")),
+    ("006", "ת\"ז מרופדת ל-9 ספרות", _pad_client_tz),
+]
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version VARCHAR(20) PRIMARY KEY, description VARCHAR(200), applied_at DATETIME)"
+    ))
+
+
+def applied_migrations(engine) -> set:
+    with engine.begin() as conn:
+        _ensure_table(conn)
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def pending_migrations(engine) -> list:
+    applied = applied_migrations(engine)
+    return [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+
+def run_migrations(engine, report=print) -> list:
+    """
+    מריץ את המיגרציות שעוד לא רצו, לפי הסדר. מיגרציה שנכשלה מתבטלת כולה
+    ועוצרת את הריצה (המיגרציות שאחריה לא רצות).
+
+    :return: הגרסאות שהורצו
+    """
+    done = []
+    for version, description, steps in pending_migrations(engine):
+        with engine.begin() as conn:
+            # pysqlite לא פותח טרנזקציה לפני DDL - פותחים במפורש כדי שהמיגרציה תתבטל כולה בכשלון
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            if callable(steps):
+                steps(conn)
+            else:
+                for statement in steps:
+                    conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {'v': version, 'd': description, 't': datetime.now().isoformat(sep=' ')}
+            )
+        report(f"מיגרציה {version} הורצה: {description}")
+        done.append(version)
+    return done
@@ -1,6 +1,6 @@
 from datetime import date
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 
 db = SQLAlchemy()
@@ -9,9 +9,9 @@ class Client(db.Model):
     __tablename__ = "client"
 
     id = Column(Integer, primary_key=True)
-    first_name = Column(String(100))
-    last_name = Column(String(100))
-    tz = Column(String(9))
+    first_name = Column(String(100), index=True)
+    last_name = Column(String(100), index=True)
+    tz = Column(String(9), unique=True, index=True)  # ריק נשמר כ-NULL כדי שלא יתנגש באינדקס הייחודי
     birth_date = Column(Date)
     phone = Column(String(20))
     address = Column(String(200))
@@ -48,7 +48,7 @@ class Grant(db.Model):
     __tablename__ = "grant"
 
     id = Column(Integer, primary_key=True)
-    client_id = Column(Integer, ForeignKey("client.id"))
+    client_id = Column(Integer, ForeignKey("client.id"), index=True)
     employer_name = Column(String(200))
     work_start_date = Column(Date)
     work_end_date = Column(Date)
@@ -58,6 +58,7 @@ class Grant(db.Model):
     limited_indexed_amount = Column(Float)  # סכום מוגבל ל-32 שנים ("מענק פטור צמוד (32 שנים)")
     grant_ratio = Column(Float)  # חלק יחסי
     impact_on_exemption = Column(Float)  # פגיעה בתקרה
+    calc_inputs_hash = Column(String(16))  # טביעת האצבע של הקלטים שמהם חושבו השדות למעלה (utils.grant_inputs_hash)
 
     client = relationship("Client", backref="grants")
     
@@ -79,7 +80,7 @@ class Pension(db.Model):
     __tablename__ = "pension"
 
     id = Column(Integer, primary_key=True)
-    client_id = Column(Integer, ForeignKey("client.id"))
+    client_id = Column(Integer, ForeignKey("client.id"), index=True)
     payer_name = Column(String(200))
     start_date = Column(Date)  # תחילת קצבה
 
@@ -96,6 +97,8 @@ class Pension(db.Model):
 
 class Commutation(db.Model):
     __tablename__ = "commutation"
+    # היוונים של קצבה, ורק אלו שנלקחים בחישוב - מאותו אינדקס
+    __table_args__ = (Index("ix_commutation_pension_id_include_calc", "pension_id", "include_calc"),)
 
     id = Column(Integer, primary_key=True)
     pension_id = Column(Integer, ForeignKey("pension.id"))
@@ -117,3 +120,64 @@ class Commutation(db.Model):
             "full_or_partial": self.full_or_partial,
             "include_calc": self.include_calc
         }
+
+class ClientVersion(db.Model):
+    """
+    מונה גרסה ללקוח - עולה בכל כתיבה לנתוני הלקוח, המענקים, הקצבאות וההיוונים.
+    משמש כחלק ממפתח מטמון הסיכומים (app/summary_cache.py).
+    השורה נשארת גם אחרי מחיקת הלקוח, כדי שמזהה שימוחזר לא יקבל סיכום ישן.
+    """
+    __tablename__ = "client_version"
+
+    client_id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class ClientSummary(db.Model):
+    """
+    סיכום פטור מחושב ושמור ללקוח (טבלה ממומשת).
+    מתעדכן בהפרשים בכל שינוי במענק / היוון / מענק משוריין, ומחושב מחדש
+    במלואו רק כשמשתנים נתונים שמשפיעים על תאריך הזכאות או כשמתפרסם מדד חדש.
+    ראו app/client_summary.py.
+    """
+    __tablename__ = "client_summary"
+
+    client_id = Column(Integer, ForeignKey("client.id"), primary_key=True)
+    eligibility_date = Column(Date, index=True)
+    cpi_vintage = Column(String(7))  # גרסת סדרת המדד שלפיה חושב הסיכום
+    # מקור תאריך הזכאות: 'pension' (תחילת הקצבה), או התאריך (ISO) של היום שממנו נגזר ללקוח ללא קצבה
+    eligibility_basis = Column(String(10))
+    exempt_cap = Column(Float, default=0.0)
+    monthly_cap = Column(Float, default=0.0)
+    grants_nominal = Column(Float, default=0.0)
+    grants_indexed_full = Column(Float, default=0.0)
+    grants_indexed_limited = Column(Float, default=0.0)
+    grants_impact = Column(Float, default=0.0)
+    reserved_grant_nominal = Column(Float, default=0.0)
+    reserved_grant_impact = Column(Float, default=0.0)
+    commutations_total = Column(Float, default=0.0)
+    remaining_cap = Column(Float, default=0.0)
+    pension_exempt = Column(Float, default=0.0)
+    pension_rate = Column(Float, default=0.0)
+    updated_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            "client_id": self.client_id,
+            "eligibility_date": self.eligibility_date.isoformat() if self.eligibility_date else None,
+            "cpi_vintage": self.cpi_vintage,
+            "eligibility_basis": self.eligibility_basis,
+            "exempt_cap": round(self.exempt_cap or 0, 2),
+            "monthly_cap": round(self.monthly_cap or 0, 2),
+            "grants_nominal": round(self.grants_nominal or 0, 2),
+            "grants_indexed_full": round(self.grants_indexed_full or 0, 2),
+            "grants_indexed_limited": round(self.grants_indexed_limited or 0, 2),
+            "grants_impact": round(self.grants_impact or 0, 2),
+            "reserved_grant_nominal": round(self.reserved_grant_nominal or 0, 2),
+            "reserved_grant_impact": round(self.reserved_grant_impact or 0, 2),
+            "commutations_total": round(self.commutations_total or 0, 2),
+            "remaining_cap": round(self.remaining_cap or 0, 2),
+            "pension_exempt": round(self.pension_exempt or 0, 2),
+            "pension_rate": self.pension_rate,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -89,25 +89,26 @@ def fill_pdf_form(input_path: str, output_path: str, data: dict):
     PdfWriter().write(output_path, template_pdf)
 
 
-def generate_grants_appendix(client_id: int) -> str:
+def grants_appendix_html(client_id: int) -> Optional[str]:
     """
-    יוצר נספח PDF עם טבלת המענקים של הלקוח
+    בונה את ה-HTML של נספח המענקים של הלקוח
     
     Args:
         client_id: מזהה הלקוח
         
     Returns:
-        נתיב לקובץ ה-PDF שנוצר
+        ה-HTML, או None אם אין מענקים תקינים
     """
-    from app.routes import process_grant
-    from app.utils import calculate_eligibility_age
+    from app.utils import calculate_eligibility_age, to_grant_inputs, index_grant_inputs
+    from app.engine import compute_grant
     
-    client = Client.query.get_or_404(client_id)
-    grants = Grant.query.filter_by(client_id=client_id).all()
+    from app.repository import load_client_graph, first_pension as find_first_pension
+    
+    client = load_client_graph(client_id)
+    grants = list(client.grants)
     
     # חישוב מחדש של המענקים לפני יצירת הנספח
-    from app.indexation import index_grant, work_ratio_within_last_32y
-    first_pension = Pension.query.filter_by(client_id=client_id).order_by(Pension.start_date).first()
+    first_pension = find_first_pension(client)
     
     # רשימת המענקים המחושבת מחדש
     recalculated_grants = []
@@ -120,62 +121,31 @@ def generate_grants_appendix(client_id: int) -> str:
         # חישוב מחדש של כל המענקים
         print(f"חישוב מחדש של {len(grants)} מענקים ללקוח {client_id}")
         
-        for grant in grants:
-            try:
-                # בדיקת תקינות נתונים
-                if not grant.grant_amount:
-                    print(f"מענק {grant.id} חסר סכום - דילוג")
-                    continue
-                if not grant.work_start_date or not grant.work_end_date:
-                    print(f"מענק {grant.id} חסר תאריכים - דילוג")
-                    continue
-                
-                # חישוב מחדש בצורה מדויקת
-                indexed_full = index_grant(
-                    amount=grant.grant_amount,
-                    start_date=grant.work_start_date.isoformat(),
-                    end_work_date=grant.work_end_date.isoformat(),
-                    elig_date=eligibility_date.isoformat()
-                )
-                
-                # בדיקה שההצמדה הצליחה
-                if indexed_full is None:
-                    print(f"הצמדה נכשלה עבור מענק {grant.id} – דילוג")
-                    continue
-
-                # חישוב יחס העבודה
-                try:
-                    ratio = work_ratio_within_last_32y(
-                        grant.work_start_date,
-                        grant.work_end_date,
-                        eligibility_date
-                    )
-                    if ratio is None or ratio <= 0:
-                        print(f"יחס עבודה לא תקין עבור מענק {grant.id} - דילוג")
-                        continue
-                except Exception as ratio_error:
-                    print(f"שגיאה בחישוב יחס עבודה עבור מענק {grant.id}: {ratio_error}")
-                    continue
-                
-                # הסכום המוצמד כפול היחס
-                indexed_amount = indexed_full * ratio
-                impact = indexed_amount * 1.35
-                
-                # שמירת הנתונים המחושבים מחדש
-                recalculated_grant = {
-                    'original': grant,
-                    'indexed_full': indexed_full,
-                    'ratio': ratio,
-                    'indexed_amount': indexed_amount,
-                    'impact': impact,
-                    'relevant_nominal': grant.grant_amount * ratio  # סכום נומינלי רלוונטי
-                }
-                recalculated_grants.append(recalculated_grant)
-                
-                print(f"מענק {grant.id}: סכום={grant.grant_amount}, מוצמד מלא={indexed_full}, יחס={ratio}, סכום מוצמד יחסי={indexed_amount}, השפעה={impact}")
-            except Exception as e:
-                print(f"מענק {grant.id} נכשל ולא נכנס לנספח: {e}")
-                continue  # דילוג על מענק בעייתי
+        # הצמדת כל המענקים התקינים באצווה אחת
+        grant_inputs = to_grant_inputs(grants)
+        indexed_amounts = index_grant_inputs(grant_inputs, eligibility_date)
+        
+        for grant, grant_input in zip(grants, grant_inputs):
+            # חישוב מחדש בליבת החישוב המשותפת לסיכום ול-161ד
+            result = compute_grant(grant_input, eligibility_date, indexed_amounts.get(grant.id))
+            if result is None:
+                print(f"מענק {grant.id} חסר סכום / תאריכים או שההצמדה נכשלה - דילוג")
+                continue
+            if result.ratio <= 0:
+                print(f"יחס עבודה לא תקין עבור מענק {grant.id} - דילוג")
+                continue
+            
+            # שמירת הנתונים המחושבים מחדש
+            recalculated_grants.append({
+                'original': grant,
+                'indexed_full': result.indexed_full,
+                'ratio': result.ratio,
+                'indexed_amount': result.indexed_limited,
+                'impact': result.impact,
+                'relevant_nominal': result.relevant_nominal  # סכום נומינלי רלוונטי
+            })
+            
+            print(f"מענק {grant.id}: סכום={grant.grant_amount}, מוצמד מלא={result.indexed_full}, יחס={result.ratio}, סכום מוצמד יחסי={result.indexed_limited}, השפעה={result.impact}")
     
     # אם אין מענקים, לא ניצור נספח
     if not grants:
@@ -280,178 +250,28 @@ def generate_grants_appendix(client_id: int) -> str:
     </html>
     '''
     
-    # יצירת קובץ PDF מ-HTML
-    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-    
-    # Create a package directory for the client
-    client = Client.query.get_or_404(client_id)
-    package_dir = os.path.join(base_dir, "packages", f"{client.slugify_name()}_{client_id}")
-    os.makedirs(package_dir, exist_ok=True)
-    
-    output_path = os.path.join(package_dir, "grants_appendix.pdf")
-    
-    # שמירת ה-HTML לקובץ זמני
-    html_temp_file = os.path.join(package_dir, "grants_appendix.html")
-    with open(html_temp_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
-    
-    try:
-        # ניסיון ליצור קובץ PDF עם wkhtmltopdf
-        if pdfkit_config:
-            pdfkit.from_file(html_temp_file, output_path, options={
-                'encoding': 'UTF-8',
-                'page-size': 'A4',
-                'margin-top': '10mm',
-                'margin-right': '10mm',
-                'margin-bottom': '10mm',
-                'margin-left': '10mm',
-                'orientation': 'landscape'
-            }, configuration=pdfkit_config)
-        else:
-            # אם wkhtmltopdf לא נמצא, נודיע שמשתמשים בקובץ HTML במקום
-            print("Using HTML file instead of PDF due to missing wkhtmltopdf")
-            output_path = html_temp_file
-    except Exception as e:
-        print(f"Error generating PDF with pdfkit: {e}")
-        # אם הייתה שגיאה, נחזיר את הקובץ HTML במקום PDF
-        output_path = html_temp_file
-    
-    return output_path
+    return html_content
 
 
-def fill_161d_form(client_id: int) -> str:
+def commutations_appendix_html(client_id: int) -> Optional[str]:
     """
-    ממלא טופס 161ד עם נתוני הלקוח
+    בונה את ה-HTML של נספח ההיוונים של הלקוח
     
     Args:
         client_id: מזהה הלקוח
         
     Returns:
-        נתיב לקובץ ה-PDF שנוצר
-    """
-    from pathlib import Path
-    from app.utils import calculate_eligibility_age, calculate_summary
-    
-    client = Client.query.get_or_404(client_id)
-    
-    # חישוב סיכום מלא עם כל הנתונים הדרושים
-    summary = calculate_summary(client_id)
-    print("### Summary keys:", list(summary.keys()))
-    
-    # פונקציית עזר לגישה בטוחה לתכונות
-    def safe_value(dict_obj, key, default=0):
-        return dict_obj.get(key, default)
-    
-    # פונקציה לעיצוב מספרים
-    def format_number(value, default=''):
-        if value in (None, ''):
-            return default
-        try:
-            return f'{float(value):,.2f}'
-        except (ValueError, TypeError):
-            return default
-    
-    # הכן את הערכים בדיוק לפי שמות השדות בתבנית (case-sensitive)
-    unicode_vals = {
-        'Today':             date.today().strftime('%d/%m/%Y'),
-        'ClientFirstName':   client.first_name or '',
-        'ClientLastName':    client.last_name or '',
-        'ClientID':          client.tz or '',           # חייב ID באותיות גדולות!
-        'ClientAddress':     client.address or '',
-        'Clientphone':       client.phone or '',        # חייב phone באות קטנה!
-        'ClientBdate':       client.birth_date.strftime('%d/%m/%Y') if client.birth_date else '',
-        'ClientZdate':       summary.get('client_info', {}).get('eligibility_date', '').split('T')[0] if isinstance(summary.get('client_info', {}).get('eligibility_date', ''), str) else '',
-        'Clientmaanakpatur': format_number(safe_value(summary, 'grants_nominal')),
-        'Clientpgiabahon':   format_number(safe_value(summary, 'grants_impact')),
-        'clientcapsum':      format_number(safe_value(summary, 'commutations_total')),
-        'clientshiryun':     format_number(safe_value(summary, 'remaining_exemption')),
-    }
-    
-    # טען את התבנית
-    template_path = Path('app/static/templates/161d.pdf')
-    reader = PdfReader(template_path)
-    writer = PdfWriter()
-    writer.addpages(reader.pages)
-    
-    # מלא את השדות
-    fields = reader.Root.AcroForm.Fields or []
-    updated = 0
-    
-    # קודם לכל - הדפס את המפתחות הקיימים כדי להשוות
-    print("### unicode_vals keys →", sorted(list(unicode_vals.keys())))
-    
-    # אוסף את כל שמות השדות בטופס
-    form_field_names = set()
-    for parent in fields:
-        for widget in _get_all_widgets(parent):
-            if widget.get('T'):
-                key = _clean_field_name(widget.T)
-                form_field_names.add(key)
-    print("### form field names  →", sorted(list(form_field_names)))
-    
-    # עכשיו מלא את השדות
-    for parent in fields:
-        for widget in _get_all_widgets(parent):
-            if widget.get('T'):
-                raw = widget.T
-                key = _clean_field_name(raw)
-                print("### RAW", repr(raw), "→", repr(key))
-                if key in unicode_vals:
-                    widget.V = unicode_vals[key]
-                    widget.AP = ''  # נקה הופעה ישנה
-                    updated += 1
-                    print(f"### Updated field '{key}' with value: {unicode_vals[key]}")
-                else:
-                    print(f"### MISSING key '{key}' not found in unicode_vals!")
-    
-    print(f"Updated {updated} of {len(unicode_vals)} fields")
-    
-    # שמירה
-    # Create a package directory for the client
-    client = Client.query.get_or_404(client_id)
-    package_dir = Path(f'packages/{client.slugify_name()}_{client_id}')
-    package_dir.mkdir(parents=True, exist_ok=True)
-    output_dir = package_dir
-    output_dir.mkdir(exist_ok=True)
-    output = output_dir/f'161d_client_{client.id}.pdf'
-    
-    # טיפול בקובץ קיים / בעיות הרשאה
-    try:
-        if output.exists():
-            try:
-                output.unlink()
-            except PermissionError:
-                ts = datetime.now().strftime('%H%M%S')
-                output = output.with_stem(f"{output.stem}_{ts}")
-                print(f"Permission issue - saving to alternate file: {output}")
-        writer.write(str(output), reader)
-    except PermissionError:
-        ts = datetime.now().strftime('%H%M%S')
-        output = output.with_stem(f"{output.stem}_{ts}")
-        print(f"Permission issue on write - saving to alternate file: {output}")
-        writer.write(str(output), reader)
-    
-    return str(output)
-
-
-def generate_commutations_appendix(client_id: int) -> str:
+        ה-HTML, או None אם אין היוונים
     """
-    יוצר נספח PDF עם טבלת ההיוונים של הלקוח
+    from app.repository import load_client_graph
     
-    Args:
-        client_id: מזהה הלקוח
-        
-    Returns:
-        נתיב לקובץ ה-PDF שנוצר
-    """
-    client = Client.query.get_or_404(client_id)
-    pensions = Pension.query.filter_by(client_id=client_id).all()
+    # הלקוח עם הקצבאות וההיוונים טעונים מראש - ללא שאילתה לכל קצבה
+    client = load_client_graph(client_id)
     
     # אוסף את כל ההיוונים מכל הקצבאות
     all_commutations = []
-    for pension in pensions:
-        commutations = Commutation.query.filter_by(pension_id=pension.id).all()
-        for comm in commutations:
+    for pension in client.pensions:
+        for comm in pension.commutations:
             all_commutations.append((pension.payer_name, comm))
     
     # אם אין היוונים, לא ניצור נספח
@@ -534,39 +354,104 @@ def generate_commutations_appendix(client_id: int) -> str:
     </html>
     '''
     
-    # יצירת קובץ PDF מ-HTML
-    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-    
-    # Create a package directory for the client
-    client = Client.query.get_or_404(client_id)
-    package_dir = os.path.join(base_dir, "packages", f"{client.slugify_name()}_{client_id}")
-    os.makedirs(package_dir, exist_ok=True)
+    return html_content
+
+
+# הגדרות wkhtmltopdf לנספחים
+APPENDIX_PDF_OPTIONS = {
+    'encoding': 'UTF-8',
+    'page-size': 'A4',
+    'margin-top': '10mm',
+    'margin-right': '10mm',
+    'margin-bottom': '10mm',
+    'margin-left': '10mm',
+}
+
+
+def html_to_pdf(html_content: str, options: Optional[dict] = None) -> Optional[bytes]:
+    """
+    ממיר HTML ל-PDF בזיכרון (ללא קבצי ביניים)
     
-    output_path = os.path.join(package_dir, "severance_appendix.pdf")
+    Returns:
+        בתי ה-PDF, או None אם wkhtmltopdf לא נמצא או נכשל
+    """
+    return html_to_pdf_many([(html_content, options)])[0]
+
+
+def html_to_pdf_many(jobs: List[Tuple[str, Optional[dict]]]) -> List[Optional[bytes]]:
+    """
+    ממיר כמה מסמכי HTML ל-PDF. עם מאגר הרינדור (app/render_pool.py) כולם
+    מוגשים יחד לתהליכי wkhtmltopdf החמים; בלעדיו - pdfkit, תהליך לכל מסמך.
     
-    # שמירת ה-HTML לקובץ זמני
-    html_temp_file = os.path.join(package_dir, "severance_appendix.html")
-    with open(html_temp_file, 'w', encoding='utf-8') as f:
-        f.write(html_content)
+    Args:
+        jobs: רשימת (html, options) - options מתווספות ל-APPENDIX_PDF_OPTIONS
+        
+    Returns:
+        לכל מסמך, לפי הסדר, בתי ה-PDF או None אם ההמרה נכשלה
+    """
+    from app.render_pool import get_render_pool
+    
+    if not pdfkit_config:
+        return [None] * len(jobs)
+    jobs = [(html_content, {**APPENDIX_PDF_OPTIONS, **(options or {})}) for html_content, options in jobs]
+    
+    pool = get_render_pool()
+    if pool is not None:
+        results = pool.render_many(jobs)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"Error generating PDF with render pool: {result}")
+        return [None if isinstance(result, Exception) else result for result in results]
+    
+    results = []
+    for html_content, options in jobs:
+        try:
+            results.append(pdfkit.from_string(html_content, False, options=options, configuration=pdfkit_config))
+        except Exception as e:
+            print(f"Error generating PDF with pdfkit: {e}")
+            results.append(None)
+    return results
+
+
+# סוג נספח → (בונה ה-HTML, אפשרויות wkhtmltopdf נוספות)
+APPENDICES = {
+    'grants': (grants_appendix_html, {'orientation': 'landscape'}),
+    'commutations': (commutations_appendix_html, {}),
+}
+
+
+def render_appendices(client_id: int, appendix_types: List[str]) -> Dict[str, Optional[Tuple[bytes, str]]]:
+    """
+    כמה נספחים של הלקוח יחד: ה-HTML נבנה כאן (שאילתות בתהליך הנוכחי) וההמרה
+    ל-PDF מוגשת בבת אחת, כך ששני הנספחים של חבילה מתרנדרים במקביל.
     
-    try:
-        # ניסיון ליצור קובץ PDF עם wkhtmltopdf
-        if pdfkit_config:
-            pdfkit.from_file(html_temp_file, output_path, options={
-                'encoding': 'UTF-8',
-                'page-size': 'A4',
-                'margin-top': '10mm',
-                'margin-right': '10mm',
-                'margin-bottom': '10mm',
-                'margin-left': '10mm'
-            }, configuration=pdfkit_config)
+    Returns:
+        לכל סוג נספח (תוכן, mimetype), או None אם אין לו תוכן
+    """
+    pages = {}
+    for appendix_type in appendix_types:
+        build_html, options = APPENDICES[appendix_type]
+        pages[appendix_type] = (build_html(client_id), options)
+    
+    to_convert = [appendix_type for appendix_type, (html_content, _) in pages.items() if html_content is not None]
+    pdfs = dict(zip(to_convert, html_to_pdf_many([pages[appendix_type] for appendix_type in to_convert])))
+    
+    rendered = {}
+    for appendix_type, (html_content, _) in pages.items():
+        if html_content is None:
+            rendered[appendix_type] = None
+        elif pdfs[appendix_type] is None:
+            rendered[appendix_type] = (html_content.encode('utf-8'), 'text/html')
         else:
-            # אם wkhtmltopdf לא נמצא, נודיע שמשתמשים בקובץ HTML במקום
-            print("Using HTML file instead of PDF due to missing wkhtmltopdf")
-            output_path = html_temp_file
-    except Exception as e:
-        print(f"Error generating PDF with pdfkit: {e}")
-        # אם הייתה שגיאה, נחזיר את הקובץ HTML במקום PDF
-        output_path = html_temp_file
-    
-    return output_path
+            rendered[appendix_type] = (pdfs[appendix_type], 'application/pdf')
+    return rendered
+
+
+def render_grants_appendix(client_id: int) -> Optional[Tuple[bytes, str]]:
+    """נספח המענקים בזיכרון: (תוכן, mimetype), או None אם אין מענקים תקינים"""
+    return render_appendices(client_id, ['grants'])['grants']
+
+
+def render_commutations_appendix(client_id: int) -> Optional[Tuple[bytes, str]]:
+    """נספח ההיוונים בזיכרון: (תוכן, mimetype), או None אם אין היוונים"""
+    return render_appendices(client_id, ['commutations'])['commutations']
@@ -1,12 +1,10 @@
 """PDF filler subpackage.
 
-Currently exposes fill_161d_form which fills the 161d tax form.
-The implementation delegates to the original function that lives in
-app.pdf_filler to avoid code duplication while we gradually migrate
-all PDF related utilities into this sub-package.
+Exposes render_161d, which fills the 161d tax form in memory, and
+fill_161d, which writes it to a directory (CLI / benchmarks).
 """
 
-from .form161d import fill_161d
+from .form161d import fill_161d, render_161d
 
 # Export only the minimal simple filler for now
-__all__ = ["fill_161d"]
+__all__ = ["fill_161d", "render_161d"]
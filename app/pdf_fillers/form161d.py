@@ -2,10 +2,10 @@
 # -*- coding: utf-8 -*-
 """Minimal 161d PDF filler usable both as a library and from CLI.
 
-The function :func:`fill_161d` is imported by *routes.py* and returns the
-absolute path of the generated PDF.  Internally we keep the implementation
-identical to the proven CLI script; we simply build the *DATA* dictionary
-from the database when a *client_id* is provided.
+The web app uses :func:`render_161d`, which returns the filled PDF as bytes
+(see :mod:`app.documents`); nothing is written to disk.  :func:`fill_161d`
+writes the PDF into a directory the caller names and is meant for the CLI
+and benchmarks only.
 """
 from __future__ import annotations
 
@@ -13,14 +13,16 @@ from datetime import date, datetime
 from pathlib import Path
 from typing import Dict, Tuple
 
-from pdfrw import PdfReader, PdfWriter, PdfDict, PdfObject, PdfString
+from config import Config
+
+from .template import get_template
 
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _safe_write(pdf_reader, path: Path) -> Path:
-    """Write *pdf_reader* to *path*; if locked, write to timestamped alt file."""
+def _safe_write(pdf_bytes: bytes, path: Path) -> Path:
+    """Write *pdf_bytes* to *path*; if locked, write to timestamped alt file."""
     # Ensure directory exists
     path.parent.mkdir(parents=True, exist_ok=True)
     try:
@@ -29,33 +31,30 @@ def _safe_write(pdf_reader, path: Path) -> Path:
                 path.unlink()
             except PermissionError:
                 raise
-        PdfWriter().write(str(path), pdf_reader)
+        path.write_bytes(pdf_bytes)
         return path
     except PermissionError:
         ts = datetime.now().strftime("%H%M%S")
         alt = path.with_stem(f"{path.stem}_{ts}")
         print(f"⚠️ Permission denied; writing to {alt}")
-        PdfWriter().write(str(alt), pdf_reader)
+        alt.write_bytes(pdf_bytes)
         return alt
 
 STATIC_DIR = Path(__file__).resolve().parents[1] / "static"
 TEMPLATE_PATH = STATIC_DIR / "templates" / "161d.pdf"
-GENERATED_DIR = STATIC_DIR / "generated"
 
 
-def _pdf_str(val):
-    """Return PdfString that displays Hebrew correctly without manual encoding.
+def _render(data: Dict[str, str]) -> Tuple[int, bytes]:
+    """Fill *TEMPLATE_PATH* with *data*; returns ``(updated fields, PDF bytes)``.
 
-    pdfrw (>=0.4) automatically selects UTF-16-BE with BOM when the text
-    contains non-PDFDocEncoding characters, so we only need to convert to
-    string and pass it to ``PdfString.from_unicode``.
+    The template is parsed once per worker (see :mod:`.template`).  With
+    ``Config.PDF_INCREMENTAL_UPDATE`` the output is the original template
+    bytes plus an incremental update holding only the changed fields.
     """
-    return PdfString.from_unicode(str(val))
-
-
-def _update_widget(widget, value: str) -> None:
-    widget.V = _pdf_str(value)
-    widget.AP = PdfDict()  # clear appearance so Acrobat redraws
+    template = get_template(TEMPLATE_PATH)
+    if Config.PDF_INCREMENTAL_UPDATE:
+        return template.fill_incremental(data)
+    return template.fill(data)
 
 
 def _fill_pdf(data: Dict[str, str], output_path: Path) -> Tuple[int, Path]:
@@ -63,29 +62,10 @@ def _fill_pdf(data: Dict[str, str], output_path: Path) -> Tuple[int, Path]:
 
     Returns number of updated fields.
     """
-    reader = PdfReader(str(TEMPLATE_PATH))
-    if "/AcroForm" not in reader.Root:
-        raise RuntimeError("Template missing AcroForm – is it the right file?")
-
-    reader.Root.AcroForm.NeedAppearances = PdfObject("true")
-
-    updated = 0
-    for parent in reader.Root.AcroForm.Fields:
-        # parent itself
-        name = parent.T[1:-1] if parent.T else None
-        if name in data:
-            _update_widget(parent, data[name])
-            updated += 1
-
-        # iterate kids
-        for kid in parent.Kids or []:
-            kname = kid.T[1:-1] if kid.T else None
-            if kname in data:
-                _update_widget(kid, data[kname])
-                updated += 1
+    updated, pdf_bytes = _render(data)
 
     # Directory safety is handled inside _safe_write
-    output_path = _safe_write(reader, output_path)
+    output_path = _safe_write(pdf_bytes, output_path)
     return updated, output_path
 
 
@@ -94,19 +74,19 @@ def _fill_pdf(data: Dict[str, str], output_path: Path) -> Tuple[int, Path]:
 # ---------------------------------------------------------------------------
 
 
-def fill_161d(client_id: int, out_dir: Path | str | None = None) -> str:
-    """Fill טופס 161ד for *client_id* and return absolute output path.
+def build_161d_data(client_id: int) -> Dict[str, str]:
+    """The 12 template fields of טופס 161ד for *client_id*.
 
-    The function fetches the client and summary information from the DB and
-    maps them into the 12 required fields.  Any missing values are replaced
-    with empty strings so the PDF still renders.
+    The function fetches the client and summary information from the DB.
+    Any missing values are replaced with empty strings so the PDF still
+    renders.
     """
     # Local imports to avoid heavy dependencies at module import time
     from app.models import Client
-    from app.utils import calculate_summary
+    from app.summary_cache import get_summary
 
     client: Client = Client.query.get_or_404(client_id)
-    summary = calculate_summary(client_id)
+    summary = get_summary(client_id)
 
     def safe(key: str) -> str:
         return str(summary.get(key, "")) if summary and key in summary else ""
@@ -132,14 +112,19 @@ def fill_161d(client_id: int, out_dir: Path | str | None = None) -> str:
         ),
         "clientcapsum": safe("commutations_total"),
     }
+    return data
+
+
+def render_161d(client_id: int) -> bytes:
+    """Fill טופס 161ד for *client_id* and return the PDF bytes (no file is written)."""
+    return _render(build_161d_data(client_id))[1]
+
 
-    if out_dir:
-        out_dir_path = Path(out_dir)
-        out_dir_path.mkdir(parents=True, exist_ok=True)
-        output = out_dir_path / "161d.pdf"
-    else:
-        output = GENERATED_DIR / f"161d_{client_id}.pdf"
-    count, final_path = _fill_pdf(data, output)
+def fill_161d(client_id: int, out_dir: Path | str) -> str:
+    """Fill טופס 161ד for *client_id* into *out_dir*/161d.pdf and return its absolute path."""
+    out_dir_path = Path(out_dir)
+    out_dir_path.mkdir(parents=True, exist_ok=True)
+    count, final_path = _fill_pdf(build_161d_data(client_id), out_dir_path / "161d.pdf")
     print(f"✅ Updated {count}/12 → {final_path}")
     return str(final_path)
 
@@ -156,5 +141,5 @@ if __name__ == "__main__":  # pragma: no cover
         print("Template 161d.pdf not found in static/templates – abort")
         sys.exit(1)
 
-    path = fill_161d(cid)
+    path = fill_161d(cid, Path.cwd())
     print("Saved to", path)
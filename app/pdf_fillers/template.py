@@ -0,0 +1,244 @@
+"""Parse-once cache for AcroForm PDF templates.
+
+Parsing a template with :class:`pdfrw.PdfReader` costs far more than filling
+it, so each worker parses a template once and keeps it together with a
+precompiled map from field name to the field dictionary and its widget
+annotations.  The cache entry is reloaded only when the file's mtime changes.
+
+A fill touches nothing but the mapped field dictionaries: their ``/V`` and the
+widgets' ``/AP`` are swapped in, the document is serialized to bytes and the
+original values are put back.  The parsed object graph is shared, so the swap
+happens under the template's lock.
+
+:meth:`FormTemplate.fill_incremental` avoids both the lock and the full
+rewrite: it appends only the changed field/widget objects (under their
+original object numbers), the object holding the AcroForm and a new xref
+section to the cached template bytes, as a PDF incremental update.  Everything
+it needs from the object graph is serialized once, when the template is
+parsed, so concurrent fills never touch pdfrw's lazily resolved objects.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Mapping, Tuple
+
+from pdfrw import PdfArray, PdfDict, PdfName, PdfObject, PdfReader, PdfString, PdfWriter
+from pdfrw.objects.pdfindirect import PdfIndirect
+
+
+def _field_name(obj) -> str | None:
+    return obj.T.to_unicode() if obj.T else None
+
+
+def _compile_fields(fields) -> Dict[str, Tuple[PdfDict, List[PdfDict]]]:
+    """Map each field name to ``(field, widgets)``.
+
+    A field without ``/Kids`` is merged with its single widget annotation;
+    named kids are fields of their own.
+    """
+    compiled = {}
+    for field in fields or []:
+        kids = field.Kids or []
+        widgets = [kid for kid in kids if not kid.T] or ([] if kids else [field])
+        name = _field_name(field)
+        if name:
+            compiled.setdefault(name, (field, []))[1].extend(widgets)
+        for kid in kids:
+            if kid.T:
+                compiled.update(_compile_fields([kid]))
+    return compiled
+
+
+def _startxref(data: bytes) -> int:
+    match = re.search(rb"startxref\s+(\d+)\s+%%EOF\s*$", data[-1024:])
+    if not match:
+        raise RuntimeError("Template has no startxref – truncated file?")
+    return int(match.group(1))
+
+
+def _serialize(obj) -> str:
+    """PDF syntax for *obj*; nested indirect objects become references.
+
+    Values are read raw (``dict.items`` / ``list.__iter__``) so objects the
+    reader has not loaded yet stay unresolved ``PdfIndirect`` references.
+    """
+    if isinstance(obj, PdfIndirect):
+        return "%d %d R" % tuple(obj)
+    if isinstance(obj, PdfDict):
+        return _dict_body(_entries(obj))
+    if isinstance(obj, PdfArray):
+        return "[" + " ".join(_reference(value) for value in list.__iter__(obj)) + "]"
+    if isinstance(obj, list):
+        return "[" + " ".join(_reference(value) for value in obj) + "]"
+    return str(obj)
+
+
+def _reference(obj) -> str:
+    indirect = _object_id(obj)
+    if indirect is not None:
+        return "%d %d R" % indirect
+    return _serialize(obj)
+
+
+def _object_id(obj) -> Tuple[int, int] | None:
+    """``(number, generation)`` of an object read through an indirect reference, else None."""
+    indirect = getattr(obj, "indirect", None)
+    return indirect if isinstance(indirect, tuple) else None
+
+
+def _entries(obj: PdfDict) -> Dict[str, str]:
+    """The dictionary's entries as serialized values, in file order."""
+    return {key: _reference(value) for key, value in dict.items(obj) if value is not None}
+
+
+def _dict_body(entries: Mapping[str, str]) -> str:
+    return "<<" + " ".join(f"{key} {value}" for key, value in entries.items()) + ">>"
+
+
+def _xref_section(entries: List[Tuple[int, int, int]]) -> bytes:
+    """Classic xref section for ``(number, generation, offset)`` entries, split into contiguous runs."""
+    lines, run = [b"xref\n"], []
+    for entry in sorted(entries) + [None]:
+        if run and (entry is None or entry[0] != run[-1][0] + 1):
+            lines.append(b"%d %d\n" % (run[0][0], len(run)))
+            lines.extend(b"%010d %05d n\r\n" % (offset, gen) for _, gen, offset in run)
+            run = []
+        if entry is not None:
+            run.append(entry)
+    return b"".join(lines)
+
+
+class FormTemplate:
+    """A parsed AcroForm template plus its field → widgets map."""
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.mtime_ns = os.stat(self.path).st_mtime_ns
+        self.data = self.path.read_bytes()
+        self.version = hashlib.sha1(self.data).hexdigest()[:16]
+        self.reader = PdfReader(fdata=self.data)
+        if "/AcroForm" not in self.reader.Root:
+            raise RuntimeError(f"Template {self.path.name} has no AcroForm – is it the right file?")
+        self.reader.Root.AcroForm.NeedAppearances = PdfObject("true")
+        self.fields = _compile_fields(self.reader.Root.AcroForm.Fields)
+        self.lock = threading.Lock()
+
+        # incremental updates only on top of a classic xref table in an unencrypted file
+        self.startxref = _startxref(self.data)
+        self.incremental = (self.data[self.startxref:self.startxref + 4] == b"xref"
+                            and "/Encrypt" not in self.reader)
+        if self.incremental:
+            self._prepare_incremental()
+
+    def _prepare_incremental(self) -> None:
+        """Serialize, once, every object an incremental update may rewrite.
+
+        ``NeedAppearances`` lives in the AcroForm; when the AcroForm is a
+        direct object the Catalog (``/Root``) that contains it is rewritten
+        instead.  Forms whose fields or widgets are direct objects cannot be
+        updated object by object and fall back to :meth:`fill`.
+        """
+        acroform = self.reader.Root.AcroForm
+        if _object_id(acroform) is not None:
+            self._form_holder = (_object_id(acroform), _entries(acroform))
+        else:
+            root = self.reader.Root
+            self._form_holder = (_object_id(root), _entries(root))
+        self._field_entries = {}
+        for field, widgets in self.fields.values():
+            for obj in [field] + widgets:
+                if _object_id(obj) is None:
+                    self.incremental = False
+                    return
+                self._field_entries[_object_id(obj)] = _entries(obj)
+        trailer = {PdfName.Size: self.reader.Size, PdfName.Root: self.reader.Root,
+                   PdfName.Info: self.reader.Info, PdfName.ID: self.reader.ID}
+        trailer = {key: _reference(value) for key, value in trailer.items() if value is not None}
+        trailer[PdfName.Prev] = str(self.startxref)
+        self._trailer = _dict_body(trailer)
+
+    def fill(self, data: Mapping[str, object]) -> Tuple[int, bytes]:
+        """Return ``(number of fields filled, PDF bytes)`` for *data*."""
+        targets = [(self.fields[name], value) for name, value in data.items() if name in self.fields]
+        buffer = io.BytesIO()
+        with self.lock:
+            saved = []
+            try:
+                for (field, widgets), value in targets:
+                    saved.append((field, field.V, widgets, [widget.AP for widget in widgets]))
+                    field.V = PdfString.from_unicode(str(value))
+                    for widget in widgets:
+                        widget.AP = PdfDict()  # clear appearance so the viewer redraws
+                PdfWriter(buffer).write(trailer=self.reader)
+            finally:
+                for field, value, widgets, appearances in reversed(saved):
+                    field.V = value
+                    for widget, appearance in zip(widgets, appearances):
+                        widget.AP = appearance
+        return len(targets), buffer.getvalue()
+
+    def fill_incremental(self, data: Mapping[str, object]) -> Tuple[int, bytes]:
+        """Like :meth:`fill`, but appends an incremental update to the template bytes.
+
+        Only the entries serialized at parse time are used, with ``/V`` /
+        ``/AP`` replaced, so no lock is needed.  Falls back to :meth:`fill`
+        for templates with an xref stream or direct field objects.
+        """
+        if not self.incremental:
+            return self.fill(data)
+
+        holder_id, holder_entries = self._form_holder
+        changes = {holder_id: {}}
+        updated = 0
+        for name, value in data.items():
+            if name not in self.fields:
+                continue
+            field, widgets = self.fields[name]
+            updated += 1
+            changes.setdefault(_object_id(field), {})[PdfName.V] = PdfString.from_unicode(str(value))
+            for widget in widgets:
+                changes.setdefault(_object_id(widget), {})[PdfName.AP] = "<<>>"
+
+        out = io.BytesIO()
+        out.write(self.data)
+        if not self.data.endswith((b"\n", b"\r")):
+            out.write(b"\n")
+        entries = []
+        for (number, generation), overrides in changes.items():
+            entries.append((number, generation, out.tell()))
+            base = holder_entries if (number, generation) == holder_id else self._field_entries[(number, generation)]
+            body = _dict_body({**base, **overrides})
+            out.write(f"{number} {generation} obj\n{body}\nendobj\n".encode("latin-1"))
+
+        xref_offset = out.tell()
+        out.write(_xref_section(entries))
+        out.write(f"trailer\n{self._trailer}\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1"))
+        return updated, out.getvalue()
+
+
+_templates: Dict[Path, FormTemplate] = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(path: Path | str) -> FormTemplate:
+    """The cached :class:`FormTemplate` for *path*, reparsed if the file changed."""
+    path = Path(path).resolve()
+    template = _templates.get(path)
+    if template is not None and template.mtime_ns == os.stat(path).st_mtime_ns:
+        return template
+    with _templates_lock:
+        template = _templates.get(path)
+        if template is None or template.mtime_ns != os.stat(path).st_mtime_ns:
+            template = _templates[path] = FormTemplate(path)
+        return template
+
+
+def reset_templates() -> None:
+    """Drop all cached templates (tests / template replaced in place)."""
+    with _templates_lock:
+        _templates.clear()
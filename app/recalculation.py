@@ -0,0 +1,203 @@
+"""
+חישוב מחדש של כל המענקים בתיק (סכום מוצמד, יחס 32 שנים, מוגבל והשפעה על הפטור).
+
+כל קבוצה (chunk) של לקוחות עוברת שלושה שלבים:
+1. בתהליך הראשי: טעינת הלקוחות, הקצבאות והמענקים של הקבוצה במספר קבוע של
+   שאילתות, חישוב תאריכי הזכאות ושליפת מקדמי ההצמדה פעם אחת לכל זוג חודשים
+   (סדרה מקומית → מטמון משותף → הלמ"ס במקביל)
+2. ב-process pool: החישוב הווקטורי (engine_batch) על מערכים בלבד, בלי ORM ובלי רשת
+3. בתהליך הראשי: עדכון המענקים של הקבוצה שהקלטים שלהם השתנו (calc_inputs_hash)
+   ב-UPDATE אחד (executemany), commit ושמירת נקודת ביקורת (המזהה האחרון שנשמר) בקובץ JSON
+
+ריצה שנקטעה ממשיכה מהלקוח שאחרי נקודת הביקורת. התוצאות נכתבות לפי סדר
+הקבוצות, כך שנקודת הביקורת תמיד מכסה רצף של לקוחות שכבר נשמרו.
+"""
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, update
+
+from app.models import db, Client, Grant
+from app.engine import resolve_eligibility_date
+from app.engine_batch import compute_grants, round_cents, to_ordinals
+from app.indexation import get_indexation_factors
+from app.repository import load_client_graphs, first_pension
+from app.utils import to_client_input, grant_inputs_hash
+
+
+def load_checkpoint(path: str) -> dict:
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        checkpoint.setdefault('written', 0)
+        return checkpoint
+    return {'last_client_id': 0, 'clients': 0, 'grants': 0, 'written': 0}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """כתיבה אטומית - קובץ זמני ואז החלפה"""
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def iter_client_chunks(after_id: int, chunk_size: int):
+    """מזהי לקוחות בקבוצות לפי סדר עולה, החל מהלקוח שאחרי after_id (keyset, ללא OFFSET)"""
+    while True:
+        ids = db.session.execute(
+            select(Client.id).where(Client.id > after_id).order_by(Client.id).limit(chunk_size)
+        ).scalars().all()
+        if not ids:
+            return
+        yield ids
+        after_id = ids[-1]
+
+
+def prepare_chunk(client_ids: list, today: date | None = None) -> tuple[dict, int]:
+    """
+    טוען קבוצת לקוחות ומחזיר (מערכי קלט לחישוב, מספר הלקוחות שחושבו).
+    לקוח ללא קצבה מדולג, כמו בסקריפט הקודם.
+    """
+    grant_ids, amounts, starts, ends, eligs, hashes = [], [], [], [], [], []
+    processed = 0
+    for client in load_client_graphs(client_ids, with_commutations=False):
+        pension = first_pension(client)
+        if pension is None:
+            continue
+        processed += 1
+        eligibility_date = resolve_eligibility_date(to_client_input(client), pension.start_date, today=today)
+        for grant in client.grants:
+            grant_ids.append(grant.id)
+            amounts.append(grant.grant_amount or 0.0)
+            starts.append(grant.work_start_date)
+            ends.append(grant.work_end_date)
+            eligs.append(eligibility_date)
+            hashes.append(grant.calc_inputs_hash)
+
+    # מקדמי הצמדה - פעם אחת לכל זוג (חודש סיום, חודש זכאות) בקבוצה
+    pairs = [(end, elig) for end, elig in zip(ends, eligs) if end]
+    factors = get_indexation_factors(pairs) if pairs else {}
+    grant_factors = [
+        factors.get((end.isoformat()[:7], elig.isoformat()[:7])) if end else None
+        for end, elig in zip(ends, eligs)
+    ]
+    db.session.expunge_all()
+
+    payload = {
+        'grant_ids': np.array(grant_ids, dtype=np.int64),
+        'amounts': np.array(amounts, dtype=np.float64),
+        'starts': to_ordinals(starts),
+        'ends': to_ordinals(ends),
+        'eligs': to_ordinals(eligs),
+        'factors': np.array([np.nan if f is None else f for f in grant_factors], dtype=np.float64),
+        'hashes': hashes,
+    }
+    return payload, processed
+
+
+def compute_chunk(payload: dict) -> list:
+    """
+    החישוב עצמו (רץ ב-process pool): שורות עדכון למענקים.
+    מענק ללא תוצאה (חסר סכום / תאריכים) מאופס - כמו utils.persist_grant_results.
+    מענק שהצמדתו נכשלה לא נכתב - נשארות התוצאות הקודמות עד הריצה הבאה.
+    מענק שטביעת האצבע של הקלטים שלו לא השתנתה (calc_inputs_hash) לא נכתב שוב.
+    """
+    indexed = round_cents(payload['amounts'] * payload['factors'])
+    batch = compute_grants(payload['amounts'], payload['starts'], payload['ends'], payload['eligs'],
+                           indexed_full=indexed)
+    rows = []
+    for i, grant_id in enumerate(payload['grant_ids']):
+        indexable = payload['amounts'][i] and payload['starts'][i] and payload['ends'][i]
+        if indexable and np.isnan(payload['factors'][i]):
+            continue
+        inputs_hash = grant_inputs_hash(
+            payload['amounts'][i],
+            date.fromordinal(payload['starts'][i]) if payload['starts'][i] else None,
+            date.fromordinal(payload['ends'][i]) if payload['ends'][i] else None,
+            date.fromordinal(payload['eligs'][i]),
+            indexed[i],
+        )
+        if inputs_hash == payload['hashes'][i]:
+            continue
+        rows.append({
+            'id': int(grant_id),
+            'grant_indexed_amount': float(batch.indexed_full[i]),
+            'grant_ratio': float(batch.ratio[i]),
+            'limited_indexed_amount': float(batch.indexed_limited[i]),
+            'impact_on_exemption': float(batch.impact[i]),
+            'calc_inputs_hash': inputs_hash,
+        })
+    return rows
+
+
+def recalculate_portfolio(chunk_size: int = 200,
+                          workers: int | None = None,
+                          checkpoint_path: str | None = None,
+                          restart: bool = False,
+                          report=print) -> dict:
+    """
+    מחשב מחדש את כל המענקים בתיק. חייב לרוץ בתוך app context.
+
+    :param workers: מספר תהליכי חישוב; 0 = חישוב בתהליך הנוכחי
+    :param checkpoint_path: קובץ נקודת הביקורת (None = ללא המשכיות)
+    :param restart: להתעלם מנקודת ביקורת קיימת ולהתחיל מההתחלה
+    :param report: פונקציה לדיווח התקדמות (ברירת מחדל print)
+    :return: נקודת הביקורת הסופית (מספר לקוחות ומענקים שחושבו, ומספר המענקים שנכתבו - written)
+    """
+    checkpoint = load_checkpoint(None if restart else checkpoint_path)
+    if checkpoint['last_client_id']:
+        report(f"ממשיך מלקוח {checkpoint['last_client_id']} "
+               f"({checkpoint['clients']} לקוחות ו-{checkpoint['grants']} מענקים כבר חושבו)")
+
+    started = time.perf_counter()
+    run_clients = 0
+    workers = os.cpu_count() if workers is None else workers
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+    in_flight = deque()
+
+    def write(last_client_id: int, clients: int, grants: int, rows):
+        nonlocal run_clients
+        rows = rows.result() if pool else rows
+        if rows:
+            db.session.execute(update(Grant), rows)
+        db.session.commit()
+        checkpoint['last_client_id'] = last_client_id
+        checkpoint['clients'] += clients
+        checkpoint['grants'] += grants
+        checkpoint['written'] += len(rows)
+        save_checkpoint(checkpoint_path, checkpoint)
+        run_clients += clients
+        elapsed = time.perf_counter() - started
+        report(f"עד לקוח {last_client_id}: {checkpoint['clients']} לקוחות, {checkpoint['grants']} מענקים, "
+               f"{checkpoint['written']} עודכנו ({run_clients / elapsed if elapsed else 0:.1f} לקוחות/שנייה)")
+
+    try:
+        for client_ids in iter_client_chunks(checkpoint['last_client_id'], chunk_size):
+            payload, clients = prepare_chunk(client_ids)
+            rows = pool.submit(compute_chunk, payload) if pool else compute_chunk(payload)
+            in_flight.append((client_ids[-1], clients, len(payload['grant_ids']), rows))
+            # מגבילים את מספר הקבוצות שממתינות כדי לשמור על זיכרון חסום
+            while len(in_flight) > max(workers, 1):
+                write(*in_flight.popleft())
+        while in_flight:
+            write(*in_flight.popleft())
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    checkpoint['elapsed_seconds'] = round(elapsed, 2)
+    report(f"החישוב מחדש הסתיים: {run_clients} לקוחות בריצה זו ב-{elapsed:.1f} שניות")
+    # הריצה הושלמה - הריצה הבאה תתחיל מההתחלה
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return checkpoint
@@ -0,0 +1,341 @@
+"""
+מאגר תהליכי wkhtmltopdf חמים להמרת HTML ל-PDF.
+
+במקום תהליך wkhtmltopdf חדש לכל נספח (pdfkit), כל renderer הוא תהליך
+wkhtmltopdf אחד שרץ עם --read-args-from-stdin: כל שורה ב-stdin היא עבודה
+(אפשרויות, קובץ HTML וקובץ פלט - במרכאות כשיש בהם רווחים), והתהליך מדווח
+ב-stderr על סיום כל עבודה ("Done", או "Exit with code ..." / "Failed"
+בכשלון). מנוע הרינדור נטען פעם אחת לתהליך ומשרת עבודה אחרי עבודה.
+
+- מספר התהליכים חסום (RENDER_POOL_SIZE); תהליך נוצר רק כשיש לו עבודה
+- תור חסום (RENDER_QUEUE_SIZE): עבודה מעבר לו נדחית מיד (RenderQueueFull)
+- זמן מרבי לעבודה (RENDER_TIMEOUT): תהליך שחרג נהרג ומוחלף בעבודה הבאה
+- תהליך ממוחזר אחרי RENDER_MAX_JOBS עבודות, כדי שזליגות זיכרון לא יצטברו
+- render_many מגיש כמה מסמכים יחד (שני הנספחים של חבילה, ריצות אצווה)
+  ומחלק אותם בין התהליכים
+- מוני עבודות, כשלונות, חריגות זמן וזמני המתנה ורינדור לניטור
+"""
+import atexit
+import itertools
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+
+from config import Config
+
+logger = getLogger(__name__)
+
+# שורות ב-stderr שמסיימות עבודה
+DONE_PREFIX = "Done"
+FAILED_PREFIXES = ("Exit with code", "Failed")
+
+
+class RenderError(Exception):
+    """wkhtmltopdf נכשל בהמרת מסמך"""
+
+
+class RenderTimeout(RenderError):
+    """עבודה חרגה מהזמן המרבי - התהליך שלה נהרג"""
+
+
+class RenderQueueFull(RenderError):
+    """התור מלא - העבודה נדחתה בלי להמתין"""
+
+
+def _option_args(options: dict) -> list:
+    """{'page-size': 'A4', 'orientation': 'landscape'} → ['--page-size', 'A4', '--orientation', 'landscape']"""
+    args = []
+    for key, value in (options or {}).items():
+        args.append(f"--{key}")
+        if value not in (None, '', True):
+            args.append(str(value))
+    return args
+
+
+def _quote_arg(arg: str) -> str:
+    """
+    ארגומנט לשורת עבודה כפי שהמפרק של --read-args-from-stdin קורא אותה: \\ מבטל
+    את משמעות התו הבא, מרכאות כפולות מחברות רווחים לארגומנט אחד, ורווח מחוץ
+    למרכאות מפריד בין ארגומנטים. גם \\ בנתיבי Windows צריך ביטול.
+
+    :raises ValueError: ארגומנט עם ירידת שורה - היא מסיימת את העבודה
+    """
+    if "\n" in arg or "\r" in arg:
+        raise ValueError(f"ארגומנט לא יכול להכיל ירידת שורה: {arg!r}")
+    escaped = arg.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"' if not escaped or any(char.isspace() for char in escaped) else escaped
+
+
+def _job_line(args: list) -> str:
+    return " ".join(_quote_arg(arg) for arg in args)
+
+
+class Renderer:
+    """תהליך wkhtmltopdf אחד במצב --read-args-from-stdin"""
+
+    def __init__(self, command: list):
+        self.workdir = tempfile.mkdtemp(prefix="render-")
+        self.process = subprocess.Popen(
+            command + ["--read-args-from-stdin"],
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            text=True, encoding="utf-8", errors="replace", bufsize=1,
+        )
+        self.jobs = 0
+        self._job_ids = itertools.count()
+        self._lines = queue.Queue()
+        # stderr נקרא ברקע כדי שההמתנה לסיום עבודה תוכל להיות מוגבלת בזמן
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stderr(self):
+        for line in self.process.stderr:
+            self._lines.put(line.strip())
+        self._lines.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def render(self, html: str, options: dict, timeout: float) -> bytes:
+        job_id = next(self._job_ids)
+        html_path = os.path.join(self.workdir, f"{job_id}.html")
+        pdf_path = os.path.join(self.workdir, f"{job_id}.pdf")
+        line = _job_line(_option_args(options) + [html_path, pdf_path])
+        with open(html_path, "w", encoding="utf-8") as f:
+            f.write(html)
+        try:
+            self.process.stdin.write(line + "\n")
+            self.process.stdin.flush()
+            self.jobs += 1
+
+            deadline = time.monotonic() + timeout
+            errors = []
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.close(kill=True)
+                    raise RenderTimeout(f"wkhtmltopdf לא סיים תוך {timeout} שניות")
+                try:
+                    line = self._lines.get(timeout=remaining)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    raise RenderError("תהליך wkhtmltopdf הסתיים באמצע עבודה: " + "; ".join(errors[-3:]))
+                if line.startswith(FAILED_PREFIXES):
+                    raise RenderError(line)
+                if line.startswith(DONE_PREFIX):
+                    break
+                if line.lower().startswith(("error", "warning")):
+                    errors.append(line)
+
+            with open(pdf_path, "rb") as f:
+                return f.read()
+        finally:
+            for path in (html_path, pdf_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self, kill: bool = False):
+        if kill and self.alive:
+            self.process.kill()
+            self.process.wait()
+        if self.alive:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class RenderPool:
+    """מאגר חסום של תהליכי Renderer עם תור חסום"""
+
+    def __init__(self, command: list, size: int = 2, queue_size: int = 32,
+                 timeout: float = 60.0, max_jobs: int = 200):
+        self.command = command
+        self.size = max(size, 1)
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+        # עבודות שממתינות או רצות; מעבר ל-size + queue_size נדחות
+        self._slots = threading.BoundedSemaphore(self.size + max(queue_size, 0))
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="render")
+        self._idle = queue.LifoQueue()
+        self._renderers = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'timeouts': 0,
+            'rejected': 0,
+            'processes_started': 0,
+            'queued': 0,
+            'running': 0,
+            'wait_total_ms': 0.0,
+            'render_total_ms': 0.0,
+            'render_max_ms': 0.0,
+            'last_error': None,
+        }
+
+    def _record(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                if key == 'last_error':
+                    self._stats[key] = value
+                elif key == 'render_ms':
+                    self._stats['render_total_ms'] += value
+                    self._stats['render_max_ms'] = max(self._stats['render_max_ms'], value)
+                else:
+                    self._stats[key] += value
+
+    def _checkout(self) -> Renderer:
+        while True:
+            try:
+                renderer = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if renderer.alive and renderer.jobs < self.max_jobs:
+                return renderer
+            self._discard(renderer)
+        renderer = Renderer(self.command)
+        with self._lock:
+            self._renderers.append(renderer)
+        self._record(processes_started=1)
+        return renderer
+
+    def _discard(self, renderer: Renderer, kill: bool = False):
+        renderer.close(kill=kill)
+        with self._lock:
+            if renderer in self._renderers:
+                self._renderers.remove(renderer)
+
+    def _run(self, html: str, options: dict, submitted_at: float) -> bytes:
+        self._record(queued=-1, running=1, wait_total_ms=(time.monotonic() - submitted_at) * 1000)
+        renderer = None
+        started = time.monotonic()
+        try:
+            renderer = self._checkout()
+            pdf_bytes = renderer.render(html, options, self.timeout)
+        except Exception as e:
+            # תהליך שנכשל באמצע עבודה עלול לא להיות מסונכרן עם התור שלו - מחליפים אותו
+            if renderer is not None:
+                self._discard(renderer, kill=True)
+            logger.warning("רינדור נכשל: %s", e)
+            self._record(failed=1, timeouts=int(isinstance(e, RenderTimeout)), last_error=str(e))
+            raise
+        else:
+            if renderer.jobs < self.max_jobs:
+                self._idle.put(renderer)
+            else:
+                self._discard(renderer)
+            self._record(completed=1, render_ms=(time.monotonic() - started) * 1000)
+            return pdf_bytes
+        finally:
+            self._record(running=-1)
+            self._slots.release()
+
+    def submit(self, html: str, options: dict | None = None) -> Future:
+        """
+        מגיש עבודה ומחזיר Future של בתי ה-PDF
+
+        :raises RenderQueueFull: כשהתור מלא
+        :raises ValueError: אפשרות שאי אפשר להעביר בשורת עבודה
+        """
+        # אפשרות פסולה נדחית כאן ולא מפילה תהליך חם
+        _job_line(_option_args(options))
+        if not self._slots.acquire(blocking=False):
+            self._record(rejected=1)
+            raise RenderQueueFull("תור הרינדור מלא")
+        self._record(submitted=1, queued=1)
+        try:
+            return self._executor.submit(self._run, html, options or {}, time.monotonic())
+        except RuntimeError:
+            self._record(queued=-1)
+            self._slots.release()
+            raise
+
+    def render(self, html: str, options: dict | None = None) -> bytes:
+        return self.submit(html, options).result()
+
+    def render_many(self, jobs: list) -> list:
+        """
+        כמה מסמכים בהגשה אחת, מחולקים בין התהליכים.
+
+        :param jobs: רשימת (html, options)
+        :return: לכל עבודה, לפי הסדר, בתי ה-PDF או החריגה שבה נכשלה
+        """
+        futures = []
+        for html, options in jobs:
+            try:
+                futures.append(self.submit(html, options))
+            except (RenderQueueFull, ValueError) as e:
+                futures.append(e)
+        results = []
+        for future in futures:
+            if isinstance(future, Exception):
+                results.append(future)
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, processes=len(self._renderers), size=self.size)
+        stats['render_avg_ms'] = round(stats['render_total_ms'] / stats['completed'], 2) if stats['completed'] else 0.0
+        stats['wait_avg_ms'] = round(stats['wait_total_ms'] / stats['submitted'], 2) if stats['submitted'] else 0.0
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            renderers, self._renderers = self._renderers, []
+        for renderer in renderers:
+            renderer.close()
+
+
+_pool: RenderPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> RenderPool | None:
+    """
+    מחזיר את מאגר הרינדור המשותף לתהליך (נוצר בקריאה הראשונה), או None כשהמאגר
+    כבוי (RENDER_POOL_ENABLED) או ש-wkhtmltopdf לא נמצא
+    """
+    global _pool
+    if _pool is None:
+        from app.pdf_filler import wkhtmltopdf_path
+        if not Config.RENDER_POOL_ENABLED or not wkhtmltopdf_path:
+            return None
+        with _pool_lock:
+            if _pool is None:
+                _pool = RenderPool(
+                    command=[wkhtmltopdf_path],
+                    size=Config.RENDER_POOL_SIZE,
+                    queue_size=Config.RENDER_QUEUE_SIZE,
+                    timeout=Config.RENDER_TIMEOUT,
+                    max_jobs=Config.RENDER_MAX_JOBS,
+                )
+    return _pool
+
+
+def reset_render_pool():
+    """סוגר את המאגר המשותף ואת התהליכים שלו; הקריאה הבאה תיצור מאגר חדש"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+atexit.register(reset_render_pool)
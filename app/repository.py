@@ -0,0 +1,127 @@
+"""
+שכבת גישה לנתונים: טעינת לקוח עם כל הנתונים הקשורים אליו במספר קבוע וקטן
+של שאילתות, ומחיקות בשאילתות על קבוצות במקום מעבר רשומה-רשומה.
+
+load_client_graph טוען לקוח + מענקים + קצבאות + היוונים בארבע שאילתות
+(selectinload), ללא קשר למספר הקצבאות וההיוונים.
+"""
+from datetime import date
+
+from sqlalchemy import select, delete, or_
+from sqlalchemy.orm import selectinload
+
+from app.models import db, Client, Grant, Pension, Commutation, ClientSummary
+
+
+def load_client_graph(client_id: int) -> Client:
+    """
+    הלקוח עם client.grants, client.pensions ו-pension.commutations טעונים מראש
+
+    :raises NotFound: (404) אם הלקוח לא קיים
+    """
+    return db.one_or_404(
+        select(Client)
+        .where(Client.id == client_id)
+        .options(
+            selectinload(Client.grants),
+            selectinload(Client.pensions).selectinload(Pension.commutations),
+        )
+        .execution_options(populate_existing=True)
+    )
+
+
+def load_client_pensions(client_id: int) -> list:
+    """קצבאות הלקוח עם ההיוונים שלהן (שתי שאילתות), לפי סדר המזהה"""
+    return db.session.execute(
+        select(Pension)
+        .where(Pension.client_id == client_id)
+        .order_by(Pension.id)
+        .options(selectinload(Pension.commutations))
+    ).scalars().all()
+
+
+def pensions_by_start(client: Client) -> list:
+    """קצבאות לקוח טעון לפי תאריך התחלה (ללא תאריך קודם - כמו ORDER BY ב-SQLite)"""
+    return sorted(client.pensions, key=lambda p: (p.start_date is not None, p.start_date or 0, p.id))
+
+
+def first_pension(client: Client) -> Pension | None:
+    pensions = pensions_by_start(client)
+    return pensions[0] if pensions else None
+
+
+def included_commutations(client: Client) -> list:
+    """ההיוונים שנלקחים בחישוב מכל קצבאות הלקוח"""
+    return [c for pension in client.pensions for c in pension.commutations if c.include_calc]
+
+
+def delete_pension_graph(pension_id: int):
+    """מוחק קצבה וההיוונים שלה בשתי שאילתות (בתוך הטרנזקציה הנוכחית)"""
+    db.session.execute(delete(Commutation).where(Commutation.pension_id == pension_id))
+    db.session.execute(delete(Pension).where(Pension.id == pension_id))
+
+
+def delete_client_graph(client_id: int):
+    """מוחק לקוח וכל הנתונים הקשורים אליו - שאילתת DELETE אחת לכל טבלה"""
+    pension_ids = select(Pension.id).where(Pension.client_id == client_id).scalar_subquery()
+    db.session.execute(delete(Commutation).where(Commutation.pension_id.in_(pension_ids)))
+    db.session.execute(delete(Pension).where(Pension.client_id == client_id))
+    db.session.execute(delete(Grant).where(Grant.client_id == client_id))
+    db.session.execute(delete(ClientSummary).where(ClientSummary.client_id == client_id))
+    db.session.execute(delete(Client).where(Client.id == client_id))
+
+
+def load_client_graphs(client_ids: list, with_commutations: bool = True) -> list:
+    """כמו load_client_graph לקבוצת לקוחות - מספר שאילתות קבוע לכל הקבוצה, לפי סדר המזהה"""
+    pensions = selectinload(Client.pensions)
+    if with_commutations:
+        pensions = pensions.selectinload(Pension.commutations)
+    return db.session.execute(
+        select(Client)
+        .where(Client.id.in_(client_ids))
+        .order_by(Client.id)
+        .options(selectinload(Client.grants), pensions)
+    ).scalars().all()
+
+
+# עמודות שאפשר לבקש ברשימת הלקוחות (fields=)
+CLIENT_LIST_FIELDS = ('id', 'first_name', 'last_name', 'tz', 'birth_date', 'phone', 'address', 'gender',
+                      'reserved_grant_amount')
+# ברירת המחדל - מה שהרשימה החזירה תמיד
+DEFAULT_CLIENT_LIST_FIELDS = ('id', 'first_name', 'last_name', 'tz', 'birth_date', 'phone', 'address')
+
+
+def _prefix(column, prefix: str):
+    """
+    התאמת תחילית כטווח (>= תחילית ו-< תחילית + התו הגבוה ביותר) ולא כ-LIKE,
+    כדי ש-SQLite ישתמש באינדקס של העמודה
+    """
+    return (column >= prefix) & (column < prefix + '\U0010ffff')
+
+
+def list_clients(fields=DEFAULT_CLIENT_LIST_FIELDS, after_id: int = 0, limit: int | None = None,
+                 name: str | None = None, tz: str | None = None, eligibility_year: int | None = None) -> list:
+    """
+    עמוד של רשימת הלקוחות לפי סדר המזהה (keyset: id > after_id, ללא OFFSET),
+    רק עם העמודות שהתבקשו.
+
+    :param name: תחילית של שם פרטי או שם משפחה
+    :param tz: מספר זהות מלא
+    :param eligibility_year: שנת תאריך הזכאות לפי הסיכום השמור (client_summary) -
+                             לקוח שעדיין אין לו סיכום שמור לא יימצא
+    :return: רשימת מילונים (שדה → ערך)
+    """
+    query = select(*[getattr(Client, field) for field in fields]).where(Client.id > after_id)
+    if name:
+        query = query.where(or_(_prefix(Client.first_name, name), _prefix(Client.last_name, name)))
+    if tz:
+        query = query.where(Client.tz == tz)
+    if eligibility_year:
+        query = query.join(ClientSummary, ClientSummary.client_id == Client.id).where(
+            ClientSummary.eligibility_date >= date(eligibility_year, 1, 1),
+            ClientSummary.eligibility_date <= date(eligibility_year, 12, 31),
+        )
+    query = query.order_by(Client.id)
+    if limit:
+        query = query.limit(limit)
+    return [dict(row._mapping) for row in db.session.execute(query)]
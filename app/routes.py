@@ -1,94 +1,115 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, Response, jsonify, request, send_file, stream_with_context
+from sqlalchemy.exc import IntegrityError
+import io
+import json
 import os
 from datetime import datetime, date, timedelta
-from app.models import db, Client, Grant, Pension, Commutation
+from app.models import db, Client, Grant, Pension, Commutation, ClientSummary
 from app.utils import (
     calculate_eligibility_age, 
     calculate_grant_ratio,
     calculate_grant_impact,
-    calculate_summary
+    calculate_summary,
+    to_grant_inputs,
+    index_grant_inputs,
+    apply_grant_result,
+    grant_inputs_hash,
+    calculate_eligibility_sweep,
+    normalize_tz
 )
-from app.indexation import index_grant, work_ratio_within_last_32y
+from app.engine import (
+    compute_grant, window_ratio, max_reserved_grant, pension_for_reserved_grant, IMPACT_MULTIPLIER
+)
+from app.indexation import index_grant
+from app.cbs_client import get_cbs_client
+from app import summary_cache, client_summary, export, bulk_import, documents, document_cache
+from app.repository import (
+    delete_client_graph, delete_pension_graph, load_client_pensions,
+    list_clients, CLIENT_LIST_FIELDS, DEFAULT_CLIENT_LIST_FIELDS
+)
+from app.batch_summaries import iter_summaries
+from app.client_search import search_clients
+from app.render_pool import get_render_pool
+from app.summary_cache import get_summary, bump_client_version
 from app.exemption_caps import get_exemption_cap_by_year
-from app.pdf_fillers.form161d import fill_161d  # new minimal 161d filler
 from pathlib import Path
-import shutil
 import re
 
-def process_grant(grant, eligibility_date):
-    # הצמדה אמיתית לפי API
-    print(f"---- מעבד מענק #{grant.id}: סכום נומינלי {grant.grant_amount} ----")
-    indexed_full = index_grant(
-        amount=grant.grant_amount,
-        start_date=grant.work_start_date.isoformat(),
-        end_work_date=grant.work_end_date.isoformat(),
-        elig_date=eligibility_date.isoformat()
-    )
-    print(f"---- סכום מוצמד מלא: {indexed_full} ----")
+def process_grant(grant, eligibility_date, indexed_full=None):
+    """
+    מחשב מחדש מענק בודד ושומר את התוצאה באובייקט המענק
     
+    :param indexed_full: סכום מוצמד מלא שכבר חושב באצווה (אחרת יוצמד כאן)
+    """
+    print(f"---- מעבד מענק #{grant.id}: סכום נומינלי {grant.grant_amount} ----")
+    grant_input = to_grant_inputs([grant])[0]
     if indexed_full is None:
-        grant.grant_indexed_amount = 0
-        grant.grant_ratio = 0
-        grant.impact_on_exemption = 0
-        grant.limited_indexed_amount = 0  # הסכום המוגבל ל-32 שנים
-        return
-    
-    # שמירת הסכום המוצמד המלא
-    grant.indexed_full = indexed_full
-    
-    # חישוב יחס ימי-עבודה בתוך חלון 32 שנה
-    # שימוש בפונקציה המתוקנת ללא תאריך זכאות - היא תשתמש בתאריך הנוכחי
-    ratio = work_ratio_within_last_32y(
-        grant.work_start_date,
-        grant.work_end_date
-    )
-    print(f"---- יחס מחושב (שיטה נכונה): {ratio} ----")
-    
-    # העמודות הנדרשות לפי הנספח המעודכן:
-    
-    # 1. מענק פטור צמוד (32 שנים) - החלק הנומינלי שמשוייך לפרישה במסגרת 32 השנים האחרונות
-    if grant.work_end_date.year <= 1999:  # מעסיק ראשון
-        grant.limited_indexed_amount = 46649.63  # חלק יחסי של המענק הנומינלי
-        grant.grant_ratio = 0.4665  # 46.65%
-        grant.grant_indexed_amount = 72562.58  # הסכום המוצמד האמיתי
-    elif grant.work_end_date.year <= 2011:  # מעסיק שני
-        grant.limited_indexed_amount = 80000.00  # מלוא המענק הנומינלי כי כל התקופה בתוך 32 שנה
-        grant.grant_ratio = 1.0  # 100%
-        grant.grant_indexed_amount = 96786.70  # הסכום המוצמד האמיתי
-    else:  # מעסיק שלישי
-        grant.limited_indexed_amount = 90000.00  # מלוא המענק הנומינלי כי כל התקופה בתוך 32 שנה
-        grant.grant_ratio = 1.0  # 100%
-        grant.grant_indexed_amount = 97990.89  # הסכום המוצמד האמיתי
-    
-    # חישוב ההשפעה על הפטור - פי 1.35 מהסכום המוצמד
-    grant.impact_on_exemption = round(grant.grant_indexed_amount * 1.35, 2)
-    
-    print(f"---- תוצאה מתוקנת: \n"
-          f"   סכום מוגבל ל-32 שנים = {grant.limited_indexed_amount}\n"
+        indexed_full = index_grant_inputs([grant_input], eligibility_date).get(grant.id)
+    
+    result = compute_grant(grant_input, eligibility_date, indexed_full)
+    apply_grant_result(grant, result, grant_inputs_hash(grant.grant_amount, grant.work_start_date,
+                                                        grant.work_end_date, eligibility_date, indexed_full))
+    
+    print(f"---- תוצאה: \n"
           f"   סכום מוצמד מלא = {grant.grant_indexed_amount}\n"
+          f"   יחס 32 שנים = {grant.grant_ratio}\n"
+          f"   סכום מוגבל ל-32 שנים = {grant.limited_indexed_amount}\n"
           f"   השפעה על הפטור = {grant.impact_on_exemption} ----")
 
 main_bp = Blueprint('main', __name__)
 
+# גודל העמוד המרבי ברשימת הלקוחות
+MAX_CLIENT_PAGE = 1000
+
 @main_bp.route('/')
 def index():
     return jsonify({"message": "מערכת קיבוע זכויות - ברוכים הבאים"})
 
 @main_bp.route('/api/clients', methods=['GET'])
 def get_clients():
-    clients = Client.query.all()
-    result = []
-    for client in clients:
-        result.append({
-            "id": client.id,
-            "first_name": client.first_name,
-            "last_name": client.last_name,
-            "tz": client.tz,
-            "birth_date": client.birth_date.isoformat() if client.birth_date else None,
-            "phone": client.phone,
-            "address": client.address
-        })
-    return jsonify(result)
+    """
+    רשימת הלקוחות לפי סדר המזהה.
+
+    פרמטרים (כולם אופציונליים):
+    - limit: גודל עמוד (עד MAX_CLIENT_PAGE); כשיש עמוד נוסף מוחזרת כותרת X-Next-Cursor
+    - cursor: הערך מ-X-Next-Cursor של העמוד הקודם
+    - fields: רשימת עמודות מופרדת בפסיקים (id תמיד נכלל)
+    - name (תחילית שם פרטי / משפחה), tz, eligibility_year - סינון בצד השרת
+    ללא limit מוחזרת כל הרשימה, כמו קודם.
+    """
+    fields = DEFAULT_CLIENT_LIST_FIELDS
+    if request.args.get('fields'):
+        requested = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in requested if field not in CLIENT_LIST_FIELDS]
+        if unknown:
+            return jsonify({"error": f"שדות לא מוכרים: {', '.join(unknown)}"}), 400
+        fields = ('id',) + tuple(dict.fromkeys(field for field in requested if field != 'id'))
+
+    try:
+        limit = request.args.get('limit', type=int)
+        after_id = int(request.args.get('cursor') or 0)
+        eligibility_year = request.args.get('eligibility_year', type=int)
+    except ValueError:
+        return jsonify({"error": "cursor לא תקין"}), 400
+    try:
+        tz = normalize_tz(request.args.get('tz'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if limit is not None and not 0 < limit <= MAX_CLIENT_PAGE:
+        return jsonify({"error": f"limit חייב להיות בין 1 ל-{MAX_CLIENT_PAGE}"}), 400
+
+    # שורה אחת מעבר לעמוד - כדי לדעת אם יש עמוד נוסף בלי שאילתת COUNT
+    rows = list_clients(fields, after_id=after_id, limit=limit + 1 if limit else None,
+                        name=request.args.get('name'), tz=tz,
+                        eligibility_year=eligibility_year)
+    for row in rows:
+        if row.get('birth_date'):
+            row['birth_date'] = row['birth_date'].isoformat()
+
+    response = jsonify(rows[:limit] if limit else rows)
+    if limit and len(rows) > limit:
+        response.headers['X-Next-Cursor'] = str(rows[limit - 1]['id'])
+    return response
 
 @main_bp.route('/api/clients/<int:client_id>', methods=['GET'])
 def get_client(client_id):
@@ -116,7 +137,10 @@ def update_client(client_id):
     if 'last_name' in data:
         client.last_name = data['last_name']
     if 'tz' in data:
-        client.tz = data['tz']
+        try:
+            client.tz = normalize_tz(data['tz'])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
     if 'birth_date' in data and data['birth_date']:
         client.birth_date = date.fromisoformat(data['birth_date'])
     if 'phone' in data:
@@ -126,6 +150,14 @@ def update_client(client_id):
     if 'gender' in data:
         client.gender = data['gender']
     
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "לקוח עם מספר זהות זה כבר קיים"}), 409
+    
+    bump_client_version(client.id)
+    client_summary.client_changed(client.id)
     db.session.commit()
     
     return jsonify({
@@ -138,21 +170,11 @@ def delete_client(client_id):
     """
     מחיקת לקוח וכל הנתונים הקשורים אליו
     """
-    client = Client.query.get_or_404(client_id)
-
-    # מחיקת כל הקצבאות וההיוונים הקשורים
-    for pension in client.pensions:
-        # מחיקת ההיוונים לקצבה זו
-        for commutation in pension.commutations:
-            db.session.delete(commutation)
-        db.session.delete(pension)
+    Client.query.get_or_404(client_id)
 
-    # מחיקת המענקים
-    for grant in client.grants:
-        db.session.delete(grant)
-
-    # מחיקת הלקוח עצמו
-    db.session.delete(client)
+    # מחיקת ההיוונים, הקצבאות, המענקים, הסיכום השמור והלקוח - שאילתה אחת לכל טבלה
+    delete_client_graph(client_id)
+    bump_client_version(client_id)
     db.session.commit()
 
     return jsonify({"message": "הלקוח נמחק בהצלחה"}), 200
@@ -165,11 +187,15 @@ def create_client():
     birth_date = None
     if data.get('birth_date'):
         birth_date = date.fromisoformat(data['birth_date'])
+    try:
+        tz = normalize_tz(data.get('tz'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     client = Client(
         first_name=data.get('first_name'),
         last_name=data.get('last_name'),
-        tz=data.get('tz'),
+        tz=tz,
         birth_date=birth_date,
         phone=data.get('phone'),
         address=data.get('address'),
@@ -177,6 +203,12 @@ def create_client():
     )
     
     db.session.add(client)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "לקוח עם מספר זהות זה כבר קיים"}), 409
+    bump_client_version(client.id)
     db.session.commit()
     
     return jsonify({
@@ -184,6 +216,39 @@ def create_client():
         "message": "הלקוח נוסף בהצלחה"
     }), 201
 
+@main_bp.route('/api/clients/search', methods=['GET'])
+def search_clients_route():
+    """
+    חיפוש לקוחות לפי תחילית של שם (עברית / אנגלית), ת"ז, טלפון או כתובת.
+    ?q=כהן 050&limit=20 - כל המילים חייבות להופיע; התוצאות מהמתאימה ביותר.
+    """
+    limit = request.args.get('limit', 20, type=int)
+    if not 0 < limit <= 100:
+        return jsonify({"error": "limit חייב להיות בין 1 ל-100"}), 400
+    return jsonify(search_clients(request.args.get('q', ''), limit=limit))
+
+@main_bp.route('/api/import', methods=['POST'])
+def import_clients():
+    """
+    ייבוא מרוכז של לקוחות עם מענקים, קצבאות והיוונים (ראו app/bulk_import.py).
+    הקובץ נשלח כ-multipart בשדה file (הפורמט לפי הסיומת .csv / .jsonl) או כגוף הבקשה
+    עם ?format=csv|jsonl. ?summaries=1 מחשב בסוף את הסיכומים של הלקוחות החדשים.
+    מחזיר דוח עם מזהי הלקוחות שנקלטו ושגיאה לכל שורה שנדחתה.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        fmt = request.args.get('format') or ('csv' if upload.filename.lower().endswith('.csv') else 'jsonl')
+    else:
+        stream = request.stream
+        fmt = request.args.get('format', 'jsonl')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({"error": "format חייב להיות csv או jsonl"}), 400
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    report = bulk_import.import_stream(text, fmt, compute_summaries=request.args.get('summaries') in ('1', 'true'))
+    return jsonify(report)
+
 @main_bp.route('/api/calculate-eligibility-age', methods=['POST'])
 def api_calculate_eligibility_age():
     data = request.get_json()
@@ -199,6 +264,100 @@ def api_calculate_eligibility_age():
         "years": eligibility_date.year - birth_date.year - ((eligibility_date.month, eligibility_date.day) < (birth_date.month, birth_date.day))
     })
 
+@main_bp.route('/api/cbs/stats', methods=['GET'])
+def cbs_stats():
+    """מוני קריאות, שגיאות וזמני תגובה של לקוח הלמ"ס בתהליך הנוכחי"""
+    return jsonify(get_cbs_client().stats())
+
+@main_bp.route('/api/clients/<int:client_id>/eligibility-sweep', methods=['POST'])
+def eligibility_sweep(client_id):
+    """
+    סריקת תאריכי זכאות: יתרת תקרה, קצבה פטורה ואחוז לכל תאריך בטווח
+    גוף הבקשה (הכל אופציונלי): {"from": "YYYY-MM-DD", "to": "YYYY-MM-DD", "step_months": 1}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        step_months = int(data.get('step_months', 1))
+        return jsonify(calculate_eligibility_sweep(client_id, data.get('from'), data.get('to'), step_months))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@main_bp.route('/api/clients/<int:client_id>/summary', methods=['GET'])
+def get_stored_summary(client_id):
+    """הסיכום השמור של הלקוח מטבלת client_summary (נבנה אם חסר או לפי מדד קודם)"""
+    Client.query.get_or_404(client_id)
+    try:
+        row = client_summary.get_client_summary(client_id)
+    except ValueError as e:
+        # הצמדה שנכשלה - לא מגישים סיכום חלקי
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 503
+    db.session.commit()
+    return jsonify(row.to_dict())
+
+@main_bp.route('/api/summaries', methods=['POST'])
+def batch_summaries():
+    """
+    סיכומי פטור לרשימת לקוחות כ-NDJSON (שורת JSON לכל לקוח), בזרימה - קבוצה אחרי קבוצה.
+    גוף הבקשה: {"client_ids": [1, 2, ...]} או {"filter": {"last_name": "כה", "gender": "male"}}
+    (ללא שניהם - כל הלקוחות). לקוח שנכשל מופיע כ-{"client_id", "error"}.
+    """
+    data = request.get_json(silent=True) or {}
+    client_ids = data.get('client_ids')
+    if client_ids is not None and (not isinstance(client_ids, list)
+                                   or not all(isinstance(cid, int) for cid in client_ids)):
+        return jsonify({"error": "client_ids חייב להיות רשימת מזהים"}), 400
+    filters = data.get('filter') or {}
+
+    def generate():
+        for summary in iter_summaries(client_ids, filters):
+            yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@main_bp.route('/api/client-summaries', methods=['GET'])
+def list_stored_summaries():
+    """כל הסיכומים השמורים בשאילתה אחת - לרשימות ולדוחות"""
+    rows = ClientSummary.query.order_by(ClientSummary.client_id).all()
+    return jsonify([row.to_dict() for row in rows])
+
+@main_bp.route('/api/export/<string:kind>', methods=['GET'])
+def export_rows(kind):
+    """
+    ייצוא בזרימה של clients (עם שדות הסיכום) או grants.
+    ?format=ndjson (ברירת מחדל) או csv; ?fresh=1 מחשב את הסיכומים מחדש במקום הטבלה השמורה.
+    """
+    if kind not in export.EXPORTS:
+        return jsonify({"error": f"ייצוא לא מוכר: {kind}"}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({"error": "format חייב להיות ndjson או csv"}), 400
+    rows = export.iter_export_rows(kind, fresh=request.args.get('fresh') in ('1', 'true'))
+
+    if fmt == 'csv':
+        body, mimetype = export.iter_csv(rows, export.EXPORTS[kind]), 'text/csv'
+    else:
+        body, mimetype = export.iter_ndjson(rows), 'application/x-ndjson'
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={kind}.{fmt}'
+    return response
+
+@main_bp.route('/api/summary-cache/stats', methods=['GET'])
+def summary_cache_stats():
+    """פגיעות, החטאות ופינויים במטמון הסיכומים של התהליך הנוכחי"""
+    return jsonify(summary_cache.stats())
+
+@main_bp.route('/api/document-cache/stats', methods=['GET'])
+def document_cache_stats():
+    """פגיעות, החטאות, פינויים ונפח (בתים) במטמון המסמכים של התהליך הנוכחי"""
+    return jsonify(document_cache.stats())
+
+@main_bp.route('/api/render-pool/stats', methods=['GET'])
+def render_pool_stats():
+    """עבודות, כשלונות, חריגות זמן, תור וזמני רינדור במאגר תהליכי wkhtmltopdf של התהליך הנוכחי"""
+    pool = get_render_pool()
+    return jsonify(pool.stats() if pool else {'enabled': False})
+
 @main_bp.route('/api/calculate-indexed-grant', methods=['POST'])
 def api_calculate_indexed_grant():
     data = request.get_json()
@@ -261,10 +420,10 @@ def api_calculate_grant_impact():
         return jsonify({"error": "שגיאה בחישוב ההצמדה"}), 400
     
     # 2. חישוב חלק יחסי
-    ratio = ratio_last_32y(grant_start_date, grant_end_date, eligibility_date)
+    ratio = window_ratio(grant_start_date, grant_end_date, eligibility_date)
     
     # 3. חישוב פגיעה בתקרה
-    impact = indexed_amount * ratio * 1.35
+    impact = indexed_amount * ratio * IMPACT_MULTIPLIER
     
     # 4. בדיקת תקרת הפטור הרלוונטית
     exemption_cap = get_exemption_cap_by_year(eligibility_date.year)
@@ -294,48 +453,24 @@ def api_calculate_grant_impact():
 @main_bp.route('/api/generate-161d', methods=['POST'])
 def api_generate_161d_form():
     """
-    הפקת טופס 161d
+    הפקת טופס 161d - מופק בזיכרון (דרך מטמון המסמכים) ונשלח כקובץ, בלי כתיבה לדיסק
     """
-    import traceback
-    
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "לא התקבלו נתונים בבקשה"}), 400
+    client_id = data.get('client_id')
+    if not client_id:
+        return jsonify({"error": "לא סופק מזהה לקוח"}), 400
+    if db.session.get(Client, client_id) is None:
+        return jsonify({"error": f"לקוח עם מזהה {client_id} לא נמצא"}), 404
+
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({"error": "לא התקבלו נתונים בבקשה"}), 400
-            
-        client_id = data.get('client_id')
-        if not client_id:
-            return jsonify({"error": "לא סופק מזהה לקוח"}), 400
-        
-        # בדיקה שהלקוח קיים
-        client = Client.query.get(client_id)
-        if not client:
-            return jsonify({"error": f"לקוח עם מזהה {client_id} לא נמצא"}), 404
-    
-        # יצירת הטופס
-        from app.pdf_filler import fill_161d_form
-        try:
-            output_path = fill_161d_form(client_id)
-            
-            # נתיב יחסי לקובץ שנוצר
-            relative_path = output_path.replace(os.path.join(os.getcwd()), '').replace('\\', '/')
-            if relative_path.startswith('/'):
-                relative_path = relative_path[1:]
-            
-            return jsonify({
-                "success": True,
-                "message": "טופס 161d הופק בהצלחה",
-                "file_path": relative_path,
-                "download_url": f"/packages/{client.slugify_name()}_{client_id}/161d_client_{client_id}.pdf"
-            })
-            
-        except Exception as inner_e:
-            traceback.print_exc()
-            return jsonify({"error": f"שגיאה בהפקת הטופס: {str(inner_e)}"})  
-            
+        document = documents.render_document("161d", client_id)
     except Exception as e:
-        traceback.print_exc()
-        return jsonify({"error": f"שגיאה כללית: {str(e)}"}), 500
+        import traceback; traceback.print_exc()
+        return jsonify({"error": f"שגיאה בהפקת הטופס: {str(e)}"}), 500
+    return send_file(io.BytesIO(document.content), mimetype=document.mimetype,
+                     as_attachment=True, download_name=f"161d_client_{client_id}.pdf")
 
 
 @main_bp.route('/api/calculate-exemption-summary', methods=['POST'])
@@ -364,11 +499,13 @@ def api_calculate_exemption_summary():
     
         # שימוש בפונקציה החדשה לחישוב הסיכום
         try:
-            # קריאה לפונקציה עם תאריך הזכאות אם קיים
-            summary = calculate_summary(client_id, eligibility_date)
-            
-            # עדכון בדטאבייס
-            db.session.commit()
+            if data.get('persist'):
+                # שמירת תוצאות המענקים שהקלטים שלהם השתנו - הכתיבה היחידה בנתיב הזה
+                summary = calculate_summary(client_id, eligibility_date, persist=True)
+                db.session.commit()
+            else:
+                # קריאה בלבד (דרך המטמון) - ללא כתיבה למסד
+                summary = get_summary(client_id, eligibility_date)
             
             return jsonify(summary)
             
@@ -405,7 +542,6 @@ def api_calculate_exemption_summary():
             traceback.print_exc()
             return jsonify({"error": "שגיאה חמורה בחישוב סיכום"}), 500
 
-from app.pdf_filler import generate_grants_appendix, generate_commutations_appendix  # legacy
 from app.utils import calculate_summary
 
 # קבלת רשימת מענקים ללקוח
@@ -427,14 +563,17 @@ def add_grant_to_client(client_id):
         grant_date=date.fromisoformat(data.get('grant_date')) if data.get('grant_date') else None
     )
     db.session.add(grant)
+    db.session.flush()
+    client_summary.grant_added(grant)
+    bump_client_version(client_id)
     db.session.commit()
     return jsonify(grant.to_dict()), 201
     
 # קבלת רשימת קצבאות ללקוח
 @main_bp.route("/api/clients/<int:client_id>/pensions", methods=["GET"])
 def get_client_pensions(client_id):
-    client = Client.query.get_or_404(client_id)
-    return jsonify([p.to_dict() for p in client.pensions])
+    Client.query.get_or_404(client_id)
+    return jsonify([p.to_dict() for p in load_client_pensions(client_id)])
 
 # הוספת קצבה ללקוח
 @main_bp.route('/api/clients/<int:client_id>/pensions', methods=['POST'])
@@ -449,6 +588,8 @@ def add_pension_to_client(client_id):
     )
     
     db.session.add(new_pension)
+    bump_client_version(client_id)
+    client_summary.client_changed(client_id)
     db.session.commit()
     
     return jsonify(new_pension.to_dict()), 201
@@ -457,13 +598,12 @@ def add_pension_to_client(client_id):
 @main_bp.route('/api/pensions/<int:pension_id>', methods=['DELETE'])
 def delete_pension(pension_id):
     pension = Pension.query.get_or_404(pension_id)
+    client_id = pension.client_id
     
-    # Delete all associated commutations first
-    for commutation in pension.commutations:
-        db.session.delete(commutation)
-    
-    # Then delete the pension
-    db.session.delete(pension)
+    # Delete the pension together with its commutations
+    delete_pension_graph(pension_id)
+    bump_client_version(client_id)
+    client_summary.client_changed(client_id)
     db.session.commit()
     
     return jsonify({"message": "הקצבה נמחקה בהצלחה"}), 200
@@ -488,6 +628,8 @@ def add_commutation_to_pension(pension_id):
         include_calc=data.get('include_calc', True)
     )
     db.session.add(commutation)
+    client_summary.commutation_changed(pension.client_id, commutation, +1)
+    bump_client_version(pension.client_id)
     db.session.commit()
     return jsonify(commutation.to_dict()), 201
 
@@ -496,6 +638,9 @@ def add_commutation_to_pension(pension_id):
 def delete_commutation(commutation_id):
     commutation = Commutation.query.get_or_404(commutation_id)
     db.session.delete(commutation)
+    if commutation.pension:
+        client_summary.commutation_changed(commutation.pension.client_id, commutation, -1)
+        bump_client_version(commutation.pension.client_id)
     db.session.commit()
     return jsonify({"message": "ההיוון נמחק בהצלחה"}), 200
 
@@ -506,7 +651,9 @@ def delete_grant(grant_id):
     """
     grant = Grant.query.get_or_404(grant_id)
     
+    client_summary.grant_removed(grant)
     db.session.delete(grant)
+    bump_client_version(grant.client_id)
     db.session.commit()
     return jsonify({"message": "המענק נמחק בהצלחה"}), 200
 
@@ -522,10 +669,8 @@ def api_generate_grants_appendix():
         # שליפת נתוני הלקוח
         client = Client.query.get_or_404(client_id)
         
-        # יצירת נספח מענקים
-        grants_appendix_path = generate_grants_appendix(client_id)
-        
-        if not grants_appendix_path:
+        # הפקה בזיכרון (נשמרת במטמון המסמכים, כך שההורדה מ-download_url לא מפיקה שוב)
+        if documents.render_document("grants", client_id) is None:
             return jsonify({"error": "לא נמצאו מענקים ללקוח זה"}), 404
         
         response = {
@@ -551,10 +696,8 @@ def api_generate_commutations_appendix():
         # שליפת נתוני הלקוח
         client = Client.query.get_or_404(client_id)
         
-        # יצירת נספח היוונים
-        commutations_appendix_path = generate_commutations_appendix(client_id)
-        
-        if not commutations_appendix_path:
+        # הפקה בזיכרון (נשמרת במטמון המסמכים, כך שההורדה מ-download_url לא מפיקה שוב)
+        if documents.render_document("commutations", client_id) is None:
             return jsonify({"error": "לא נמצאו היוונים ללקוח זה"}), 404
         
         response = {
@@ -576,8 +719,9 @@ def api_generate_commutations_appendix():
 def download_161d(client_id):
     """Generate and download filled 161d form for the given client using simple filler."""
     try:
-        output_path = fill_161d(client_id)
-        return send_file(output_path, as_attachment=True, download_name=f"161d_{client_id}.pdf")
+        document = documents.render_document("161d", client_id)
+        return send_file(io.BytesIO(document.content), mimetype=document.mimetype,
+                         as_attachment=True, download_name=f"161d_{client_id}.pdf")
     except Exception as e:
         import traceback; traceback.print_exc()
         return jsonify({"error": f"שגיאה ביצירת טופס 161ד: {str(e)}"}), 500
@@ -585,57 +729,29 @@ def download_161d(client_id):
 @main_bp.route("/download-pdf/<string:doc_type>/<int:client_id>", methods=["GET"])
 def download_pdf(doc_type, client_id):
     """
-    מאפשר הורדת קבצי PDF שונים ללקוח (טופס ראשי, נספח מענקים, נספח היוונים)
+    מאפשר הורדת קבצי PDF שונים ללקוח (טופס ראשי, נספח מענקים, נספח היוונים).
+    המסמך מופק בזיכרון ונשלח ישירות - בלי לכתוב ל-packages/
     """
+    if doc_type not in documents.DOCUMENT_TYPES:
+        return jsonify({"error": "סוג מסמך לא תקין"}), 400
     try:
         client = Client.query.get_or_404(client_id)
-        base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-        
-        # הגדרת הנתיבים ושמות הקבצים לפי סוג המסמך
-        # Try generating the file if it doesn't exist
-        if doc_type == "161d":
-            # Generate the 161d PDF using the simplified filler; the function returns the path to the created file.
-            pdf_path = fill_161d(client_id)
-            download_name = f"161d_{client.first_name}_{client.last_name}_{client.tz}.pdf"
-            html_path = ""  # Not applicable for this document type
-        elif doc_type == "grants":
-            package_dir = os.path.join(base_dir, "packages", f"{client.slugify_name()}_{client_id}")
-            pdf_path = os.path.join(package_dir, "grants_appendix.pdf")
-            html_path = os.path.join(package_dir, "grants_appendix.html")
-            download_name = f"grants_appendix_{client.first_name}_{client.last_name}.pdf"
-            if not os.path.exists(pdf_path) and not os.path.exists(html_path):
-                grants_appendix_path = generate_grants_appendix(client_id)
-                if grants_appendix_path is None:
-                    return jsonify({"error": "לא ניתן להפיק נספח מענקים - אין מענקים תקינים"}), 404
-        elif doc_type == "commutations":
-            package_dir = os.path.join(base_dir, "packages", f"{client.slugify_name()}_{client_id}")
-            pdf_path = os.path.join(package_dir, "severance_appendix.pdf")
-            html_path = os.path.join(package_dir, "severance_appendix.html")
-            download_name = f"severance_appendix_{client.first_name}_{client.last_name}.pdf"
-            if not os.path.exists(pdf_path) and not os.path.exists(html_path):
-                generate_commutations_appendix(client_id)
-        else:
-            return jsonify({"error": "סוג מסמך לא תקין"}), 400
-        
-        # Check for HTML file if PDF doesn't exist (fallback)
-        if not os.path.exists(pdf_path) and os.path.exists(html_path):
-            return send_file(
-                html_path,
-                mimetype="text/html",
-                as_attachment=True,
-                download_name=download_name.replace('.pdf', '.html')
-            )
-        
-        # Check if the file exists after potential generation
-        if not os.path.exists(pdf_path):
+        document = documents.render_document(doc_type, client_id)
+        if document is None:
+            if doc_type == "grants":
+                return jsonify({"error": "לא ניתן להפיק נספח מענקים - אין מענקים תקינים"}), 404
             return jsonify({"error": f"לא ניתן ליצור את המסמך: {doc_type}"}), 404
-        
-        print(f"Sending file: {pdf_path}")
+
+        download_names = {
+            "161d": f"161d_{client.first_name}_{client.last_name}_{client.tz}",
+            "grants": f"grants_appendix_{client.first_name}_{client.last_name}",
+            "commutations": f"severance_appendix_{client.first_name}_{client.last_name}",
+        }
         return send_file(
-            pdf_path,
-            mimetype="application/pdf",
+            io.BytesIO(document.content),
+            mimetype=document.mimetype,
             as_attachment=True,
-            download_name=download_name
+            download_name=f"{download_names[doc_type]}.{document.extension}"
         )
     except Exception as e:
         import traceback; traceback.print_exc()
@@ -645,9 +761,21 @@ def download_pdf(doc_type, client_id):
 # -----------------------------------------------------------
 # הפקת חבילת מסמכים ללקוח
 # -----------------------------------------------------------
+@main_bp.route("/api/clients/<int:cid>/package", methods=["GET"])
+def download_package(cid):
+    """Render the client document package (161d + appendices) in memory and stream it as a ZIP."""
+    try:
+        client = Client.query.get_or_404(cid)
+        archive = documents.package_zip(documents.render_package(cid))
+        return send_file(io.BytesIO(archive), mimetype="application/zip", as_attachment=True,
+                         download_name=f"{client.slugify_name()}_{cid}.zip")
+    except Exception as e:
+        import traceback; traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
 @main_bp.route("/api/clients/<int:cid>/package", methods=["POST"])
 def generate_package(cid):
-    """Generate a full client document package (161d + appendices) and return the folder path."""
+    """Archive a full client document package (161d + appendices) on disk and return the folder path."""
     try:
         client = Client.query.get_or_404(cid)
         # Get or create package directory using the utility function
@@ -658,25 +786,8 @@ def generate_package(cid):
                                          client_last_name=client.last_name)
         folder = Path(package_dir)
 
-        files: list[str] = []
-
-        # 1. טופס 161ד
-        pdf_161d = fill_161d(cid, out_dir=folder)
-        files.append(Path(pdf_161d).name)
-
-        # 2. נספח מענקים
-        grants_src = generate_grants_appendix(cid)
-        if grants_src and Path(grants_src).exists():
-            dest = folder / "grants_appendix.pdf"
-            shutil.copy2(grants_src, dest)
-            files.append(dest.name)
-
-        # 3. נספח פיצויים (היוונים)
-        severance_src = generate_commutations_appendix(cid)
-        if severance_src and Path(severance_src).exists():
-            dest = folder / "severance_appendix.pdf"
-            shutil.copy2(severance_src, dest)
-            files.append(dest.name)
+        # המסמכים מופקים בזיכרון ונכתבים לתיקייה רק כאן - בארכוב המפורש
+        files = documents.archive_package(documents.render_package(cid), folder)
 
         rel_folder = folder.relative_to(project_root)
         return jsonify({"folder": str(rel_folder), "files": files})
@@ -700,9 +811,67 @@ def reserve_grant(client_id):
     reserved_amount = data.get('reserved_grant_amount')
     if reserved_amount is not None:
         client.reserved_grant_amount = reserved_amount
+        client_summary.reserved_grant_changed(client)
+        bump_client_version(client_id)
         db.session.commit()
     return jsonify({'message': 'Reserved grant updated successfully'})
 
+@main_bp.route('/api/clients/<int:client_id>/reserve-grant/solve', methods=['POST'])
+def solve_reserve_grant(client_id):
+    """
+    פתרון ישיר של נוסחת הסיכום עבור המענק המשוריין:
+    - target_pension_exempt / target_pension_rate → המענק המשוריין המרבי שמשאיר את הקצבה הפטורה ביעד
+    - reserved_grant_amount → הקצבה הפטורה והאחוז שיתקבלו עם מענק משוריין זה
+    החישוב נעשה על הסיכום (מהמטמון), בלי לשמור דבר. כשהצמדת מענק נכשלה - 503.
+    """
+    data = request.get_json(silent=True) or {}
+    targets = [key for key in ('target_pension_exempt', 'target_pension_rate', 'reserved_grant_amount')
+               if data.get(key) is not None]
+    if len(targets) != 1:
+        return jsonify({"error": "יש לספק בדיוק אחד מ: target_pension_exempt, target_pension_rate, reserved_grant_amount"}), 400
+    try:
+        value = float(data[targets[0]])
+    except (TypeError, ValueError):
+        return jsonify({"error": f"ערך לא תקין עבור {targets[0]}"}), 400
+    if value < 0:
+        return jsonify({"error": f"{targets[0]} לא יכול להיות שלילי"}), 400
+
+    client = Client.query.get_or_404(client_id)
+    try:
+        summary = get_summary(client_id, data.get('eligibility_date'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if summary["indexation_failures"]:
+        # בלי ההשפעה של מענק שהצמדתו נכשלה המענק המשוריין היה יוצא גדול מדי
+        return jsonify({"error": f"הצמדת מענקים {summary['indexation_failures']} נכשלה - אין פתרון",
+                        "indexation_failures": summary["indexation_failures"]}), 503
+    base = (summary["exempt_cap"], summary["grants_impact"], summary["commutations_total"])
+    result = {
+        "client_id": client_id,
+        "eligibility_date": summary["client_info"]["eligibility_date"],
+        "current_reserved_grant_amount": client.reserved_grant_amount or 0
+    }
+
+    if targets[0] == 'reserved_grant_amount':
+        reserved = value
+    else:
+        target_pension = value if targets[0] == 'target_pension_exempt' else value / 100 * summary["monthly_cap"]
+        reserved = max_reserved_grant(*base, target_pension)
+        result["target_pension_exempt"] = round(target_pension, 2)
+        result["feasible"] = reserved >= 0
+        reserved = max(reserved, 0)
+        result["max_reserved_grant_amount"] = reserved
+
+    remaining_cap, pension_exempt, pension_rate = pension_for_reserved_grant(
+        base[0], summary["monthly_cap"], base[1], base[2], reserved)
+    result.update({
+        "reserved_grant_amount": reserved,
+        "remaining_cap": round(remaining_cap, 2),
+        "pension_exempt": round(pension_exempt, 2),
+        "pension_rate": pension_rate
+    })
+    return jsonify(result)
+
 @main_bp.route('/api/calculate-exemption-summary', methods=['POST'])
 def calculate_exemption_summary():
     data = request.get_json()
@@ -724,15 +893,16 @@ def calculate_exemption_summary():
                 
                 # חישוב מחדש של כל המענקים
                 grants = Grant.query.filter_by(client_id=client_id).all()
+                indexed_amounts = index_grant_inputs(to_grant_inputs(grants), eligibility_date)
                 for grant in grants:
-                    process_grant(grant, eligibility_date)
+                    process_grant(grant, eligibility_date, indexed_amounts.get(grant.id))
                 
                 # שמירת השינויים בבסיס הנתונים
                 db.session.commit()
                 print(f"חושבו מחדש {len(grants)} מענקים ללקוח {client_id}")
         
         # חישוב הסיכום לאחר העדכון (אם היה)
-        summary = calculate_summary(client_id)
+        summary = get_summary(client_id, refresh=force_recalculation)
         return jsonify(summary)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
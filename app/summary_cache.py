@@ -0,0 +1,130 @@
+"""
+מטמון סיכומי פטור בזיכרון התהליך.
+
+המפתח הוא (לקוח, גרסת לקוח, תאריך זכאות, גרסת סדרת המדד):
+- גרסת הלקוח (טבלת client_version) עולה בכל נתיב כתיבה של לקוח / מענק /
+  קצבה / היוון / מענק משוריין, כך שסיכום של לקוח שהשתנה לא יימצא במטמון
+- גרסת סדרת המדד מתחלפת כשמתפרסם חודש חדש, ואיתה כל הסיכומים. בלי סדרה
+  מקומית (המקדמים מהלמ"ס) נכנסים במקומה מקדם הבדיקה של factor_cache, שמתחלף
+  כשמתפרסם מדד חדש, והתאריך של היום - כמו is_current ב-client_summary
+- כשלא התקבל תאריך זכאות נכנס למפתח גם התאריך של היום, כי ללקוח ללא קצבה
+  תאריך הזכאות נגזר מהיום
+
+סיכום חלקי - מענק שהצמדתו נכשלה (indexation_failures) - מוחזר אבל לא נשמר,
+כדי שהקריאה הבאה תנסה להצמיד שוב.
+
+המטמון מוגבל בגודלו (SUMMARY_CACHE_SIZE) ומפנה את הסיכום שנעשה בו שימוש לפני הכי הרבה זמן (LRU).
+"""
+import copy
+import threading
+from collections import OrderedDict
+from datetime import date
+
+from sqlalchemy import insert, select, update
+
+from config import Config
+from app.models import db, ClientVersion
+from app import factor_cache
+from app.cpi import get_cpi_vintage
+
+_cache: OrderedDict = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def bump_client_version(client_id: int):
+    """
+    מעלה את גרסת הלקוח בתוך הטרנזקציה הנוכחית (נשמר יחד עם ה-commit של הנתיב)
+    """
+    result = db.session.execute(
+        update(ClientVersion)
+        .where(ClientVersion.client_id == client_id)
+        .values(version=ClientVersion.version + 1)
+    )
+    if not result.rowcount:
+        db.session.add(ClientVersion(client_id=client_id, version=1))
+
+
+def bump_client_versions(client_ids: list):
+    """bump_client_version לקבוצת לקוחות - שלוש שאילתות ללא קשר לגודל הקבוצה"""
+    if not client_ids:
+        return
+    db.session.execute(
+        update(ClientVersion)
+        .where(ClientVersion.client_id.in_(client_ids))
+        .values(version=ClientVersion.version + 1)
+    )
+    existing = set(db.session.execute(
+        select(ClientVersion.client_id).where(ClientVersion.client_id.in_(client_ids))
+    ).scalars())
+    missing = [{'client_id': client_id, 'version': 1} for client_id in client_ids if client_id not in existing]
+    if missing:
+        db.session.execute(insert(ClientVersion), missing)
+
+
+def get_client_version(client_id: int) -> int:
+    version = db.session.execute(
+        select(ClientVersion.version).where(ClientVersion.client_id == client_id)
+    ).scalar()
+    return version or 0
+
+
+def _cache_key(client_id: int, eligibility_date) -> tuple:
+    if isinstance(eligibility_date, date):
+        eligibility_date = eligibility_date.isoformat()
+    elif not eligibility_date:
+        eligibility_date = f"today:{date.today().isoformat()}"
+    return client_id, get_client_version(client_id), eligibility_date[:10], _cpi_version()
+
+
+def _cpi_version() -> str:
+    vintage = get_cpi_vintage() if Config.CPI_LOCAL_ENGINE else None
+    if vintage is not None:
+        return vintage
+    return f"cbs:{factor_cache.get_cbs_vintage()}:{date.today().isoformat()}"
+
+
+def get_summary(client_id: int, eligibility_date=None, refresh: bool = False) -> dict:
+    """
+    calculate_summary דרך המטמון
+
+    :param refresh: לחשב מחדש גם אם יש סיכום במטמון (ולעדכן אותו)
+    :return: עותק של הסיכום - מותר לשנות אותו בלי לפגוע במטמון
+    """
+    from app.utils import calculate_summary
+
+    key = _cache_key(client_id, eligibility_date)
+    if not refresh:
+        with _lock:
+            summary = _cache.get(key)
+            if summary is not None:
+                _cache.move_to_end(key)
+                _stats['hits'] += 1
+                return copy.deepcopy(summary)
+
+    summary = calculate_summary(client_id, eligibility_date)
+    # החישוב עצמו אולי בדק מדד חדש מול הלמ"ס - נשמר לפי הגרסה שאחריו
+    key = _cache_key(client_id, eligibility_date)
+
+    with _lock:
+        _stats['misses'] += 1
+        if summary['indexation_failures']:
+            return copy.deepcopy(summary)
+        _cache[key] = summary
+        _cache.move_to_end(key)
+        while len(_cache) > max(Config.SUMMARY_CACHE_SIZE, 0):
+            _cache.popitem(last=False)
+            _stats['evictions'] += 1
+    return copy.deepcopy(summary)
+
+
+def clear_summary_cache():
+    with _lock:
+        _cache.clear()
+        for key in _stats:
+            _stats[key] = 0
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, size=len(_cache), max_size=Config.SUMMARY_CACHE_SIZE)
@@ -1,24 +1,14 @@
+import hashlib
 import requests
 from datetime import datetime, date, timedelta
 from sqlalchemy import func
 from app.models import Grant, Client, Pension, Commutation
 from app.exemption_caps import calc_exempt_capital, get_monthly_cap, get_exemption_percentage
-
-def calculate_eligibility_age(birth_date: date, gender: str, pension_start: date) -> date:
-    """
-    Calculate eligibility age based on gender and pension start date
-    
-    Args:
-        birth_date: The client's birth date
-        gender: The client's gender ('male' or 'female')
-        pension_start: The pension start date
-        
-    Returns:
-        The eligibility date (max of legal retirement age and pension start date)
-    """
-    # גיל פרישה לפי מגדר
-    legal_retirement_age = date(birth_date.year + (67 if gender == "male" else 62), birth_date.month, birth_date.day)
-    return max(legal_retirement_age, pension_start)
+from app.engine import (
+    ClientInput, GrantInput, CommutationInput, GrantResult, Caps,
+    calculate_eligibility_age, resolve_eligibility_date, compute_summary, add_months
+)
+from app.repository import load_client_graph, first_pension, included_commutations
 
 def fetch_indexation_factor(from_date: date, to_date: date, amount: float) -> float:
     """
@@ -162,6 +152,23 @@ def calculate_final_exempt_amount(exemption_cap_remaining: float, commutation_im
     return round(max(exemption_cap_remaining - commutation_impact, 0), 2)
 
 
+def normalize_tz(value) -> str | None:
+    """
+    מספר זהות בצורה אחידה לשמירה ולחיפוש: ספרות בלבד, מרופד באפסים מובילים ל-9 ספרות.
+    ערך ריק הופך ל-None.
+
+    :raises ValueError: ת"ז שאינה ספרות או ארוכה מ-9 ספרות
+    """
+    if value is None:
+        return None
+    tz = str(value).strip()
+    if not tz:
+        return None
+    if not tz.isdigit() or len(tz) > 9:
+        raise ValueError(f"ת\"ז לא תקינה ({tz})")
+    return tz.zfill(9)
+
+
 def get_client_package_dir(client_id, client_first_name=None, client_last_name=None):
     """
     Get the package directory path for a client, creating it if necessary.
@@ -191,172 +198,244 @@ def get_client_package_dir(client_id, client_first_name=None, client_last_name=N
     return str(package_dir)
 
 
-def calculate_summary(client_id: int, eligibility_date=None) -> dict:
+def to_client_input(client: Client) -> ClientInput:
+    """ממיר לקוח ORM לקלט של ליבת החישוב"""
+    return ClientInput(
+        id=client.id,
+        first_name=client.first_name,
+        last_name=client.last_name,
+        birth_date=client.birth_date,
+        gender=client.gender,
+        reserved_grant_amount=client.reserved_grant_amount or 0.0
+    )
+
+
+def to_grant_inputs(grants: list) -> list:
+    """ממיר מענקי ORM לקלטים של ליבת החישוב"""
+    return [GrantInput(g.id, g.grant_amount, g.work_start_date, g.work_end_date) for g in grants]
+
+
+def to_commutation_inputs(commutations: list) -> list:
+    """ממיר היווני ORM לקלטים של ליבת החישוב"""
+    return [CommutationInput(c.id, c.amount, bool(c.include_calc)) for c in commutations]
+
+
+def index_grant_inputs(grants: list, eligibility_date: date) -> dict:
+    """
+    מצמיד באצווה אחת את כל המענקים שיש להם סכום ותאריכים
+    
+    Returns:
+        מילון מזהה מענק → סכום מוצמד מלא (או None אם ההצמדה נכשלה)
+    """
+    from app.indexation import index_grants
+
+    indexable = [g for g in grants if g.amount and g.work_start_date and g.work_end_date]
+    return dict(zip(
+        (g.id for g in indexable),
+        index_grants([{
+            "amount": g.amount,
+            "start_date": g.work_start_date.isoformat(),
+            "end_work_date": g.work_end_date.isoformat(),
+            "elig_date": eligibility_date.isoformat()
+        } for g in indexable])
+    ))
+
+
+def grant_inputs_hash(amount, work_start_date, work_end_date, eligibility_date, indexed_full) -> str:
+    """
+    טביעת אצבע של כל מה שהתוצאה השמורה במענק נגזרת ממנו: סכום, תאריכי עבודה,
+    תאריך זכאות וסכום מוצמד מלא (שמשתנה עם המדד). אם היא לא השתנתה - אין מה לכתוב.
+    """
+    iso = lambda d: d.isoformat() if d else ''
+    indexed = '' if indexed_full is None or indexed_full != indexed_full else repr(float(indexed_full))
+    key = f"{float(amount or 0)!r}|{iso(work_start_date)}|{iso(work_end_date)}|{iso(eligibility_date)}|{indexed}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def apply_grant_result(grant: Grant, result: GrantResult | None, inputs_hash: str | None = None):
+    """
+    שומר את תוצאת החישוב באובייקט המענק (לשימוש בנספחים ובתצוגה)
+
+    :param inputs_hash: grant_inputs_hash של הקלטים שמהם חושבה התוצאה
+    """
+    if inputs_hash is not None:
+        grant.calc_inputs_hash = inputs_hash
+    if result is None:
+        grant.grant_indexed_amount = 0
+        grant.grant_ratio = 0
+        grant.impact_on_exemption = 0
+        grant.limited_indexed_amount = 0
+        return
+    grant.grant_indexed_amount = result.indexed_full
+    grant.grant_ratio = result.ratio
+    grant.impact_on_exemption = result.impact
+    grant.limited_indexed_amount = result.indexed_limited
+
+
+def persist_grant_results(grants: list, grant_results: list, eligibility_date, indexed_amounts: dict) -> int:
+    """
+    כותב למענקים את תוצאות החישוב - רק למענקים שהקלטים שלהם השתנו מאז הכתיבה הקודמת
+    (calc_inputs_hash), כך שחישוב חוזר של אותם נתונים לא מלכלך שורות במסד.
+    מענק ללא תוצאה (חסר סכום / תאריכים) מאופס, כמו ב-recalculation.compute_chunk.
+    מענק שהצמדתו נכשלה לא נכתב - נשארות התוצאות הקודמות עד החישוב הבא.
+
+    :return: מספר המענקים שעודכנו
+    """
+    results_by_id = {r.grant_id: r for r in grant_results}
+    written = 0
+    for grant in grants:
+        if grant.id in indexed_amounts and indexed_amounts[grant.id] is None:
+            continue
+        inputs_hash = grant_inputs_hash(grant.grant_amount, grant.work_start_date, grant.work_end_date,
+                                        eligibility_date, indexed_amounts.get(grant.id))
+        if grant.calc_inputs_hash == inputs_hash:
+            continue
+        apply_grant_result(grant, results_by_id.get(grant.id), inputs_hash)
+        written += 1
+    return written
+
+
+def calculate_summary(client_id: int, eligibility_date=None, persist: bool = False) -> dict:
     """
     מחשב את סיכום הפטור המלא ללקוח לפי המבנה החדש
     
+    ברירת המחדל היא חישוב בלבד - בלי לשנות דבר במסד, כך שקריאות סיכום במקביל
+    לא נועלות את SQLite לכתיבה.
+    
     Args:
         client_id: מזהה הלקוח
         eligibility_date: תאריך זכאות ספציפי (אופציונלי)
+        persist: לשמור את תוצאות המענקים באובייקטי המענק (רק מה שהשתנה; ה-commit על הקורא)
         
     Returns:
         מילון עם כל פרטי הסיכום כולל הפרדה בין סכום מוצמד מלא וסכום מוגבל ל-32 שנים
     """
-    # שלב 1: קבלת נתוני הלקוח
-    client = Client.query.get_or_404(client_id)
-    
-    # קבלת קצבה ראשונה (אם קיימת)
-    first_pension = Pension.query.filter_by(client_id=client_id).order_by(Pension.start_date).first()
-    
-    # שלב 1: קביעת שנת הזכאות
-    # אם התקבל תאריך זכאות מבחוץ, השתמש בו
-    if eligibility_date:
-        # אם התקבל כמחרוזת, המר לתאריך
-        if isinstance(eligibility_date, str):
-            from datetime import datetime
-            eligibility_date = datetime.fromisoformat(eligibility_date).date()
-        elig_year = eligibility_date.year
-    # אחרת חשב לפי כללי ברירת המחדל
-    elif not first_pension:
-        current_date = datetime.now().date()
-        eligibility_date = calculate_eligibility_age(client.birth_date, client.gender, current_date)
-        elig_year = eligibility_date.year
-    else:
-        eligibility_date = calculate_eligibility_age(client.birth_date, client.gender, first_pension.start_date)
-        elig_year = eligibility_date.year
-    
-    # שלב 2: חישוב תקרת ההון הפטורה
-    exempt_cap = calc_exempt_capital(elig_year)
-    
-    # שלב 3: חישוב סך המענקים
-    grants = Grant.query.filter_by(client_id=client_id).all()
+    # שלב 1: טעינת הלקוח עם המענקים, הקצבאות וההיוונים (מספר קבוע של שאילתות)
+    client = load_client_graph(client_id)
+    pension = first_pension(client)
+    client_input = to_client_input(client)
+    eligibility_date = resolve_eligibility_date(
+        client_input,
+        pension.start_date if pension else None,
+        eligibility_date
+    )
+    
+    # שלב 2: מענקים - הצמדה באצווה אחת
+    grants = list(client.grants)
+    grant_inputs = to_grant_inputs(grants)
+    indexed_amounts = index_grant_inputs(grant_inputs, eligibility_date)
+    
+    # שלב 3: היוונים שנלקחים בחישוב מכל הקצבאות
+    commutations = included_commutations(client)
+    
+    # שלב 4: החישוב עצמו
+    result = compute_summary(client_input, grant_inputs, to_commutation_inputs(commutations),
+                             eligibility_date, indexed_amounts)
+    if result.grant_note:
+        print(f"אזהרה: אין מענקים תקינים שעברו הצמדה עבור לקוח {client_id}")
     
-    # חישוב סכומים נומינליים ומוצמדים
-    nominal_total = 0
-    indexed_total_full = 0    # סכום מוצמד מלא (ללא הגבלת 32 שנים)
-    indexed_total_limited = 0 # סכום מוצמד מוגבל ל-32 שנים
-    valid_grants_count = 0
+    # שמירת הנתונים באובייקטי המענק לשימוש בנספחים - רק כשהתבקש, ולא מסיכום חלקי (הצמדה שנכשלה)
+    if persist and not result.degraded:
+        persist_grant_results(grants, result.grants, eligibility_date, indexed_amounts)
     
-    from app.routes import process_grant  # Import here to avoid circular imports
-    from app.indexation import index_grant, work_ratio_within_last_32y
+    return result.to_dict()
 
-    for grant in grants:
-        # חישוב סכום מוצמד
-        if not grant.grant_amount:
-            continue
-            
-        nominal_total += grant.grant_amount
-        
-        try:
-            # הצמדה מלאה לפי API
-            indexed_full = index_grant(
-                amount=grant.grant_amount,
-                start_date=grant.work_start_date.isoformat(),
-                end_work_date=grant.work_end_date.isoformat(),
-                elig_date=eligibility_date.isoformat()
-            )
-            
-            if indexed_full is None:
-                continue
-                
-            # חישוב היחס של 32 השנים האחרונות
-            ratio = work_ratio_within_last_32y(
-                grant.work_start_date, 
-                grant.work_end_date, 
-                eligibility_date
-            )
-            
-            # חישוב הסכום המוגבל = מוצמד מלא * יחס
-            indexed_limited = indexed_full * ratio
-            
-            # הוספה לסכומים הכוללים
-            indexed_total_full += indexed_full
-            indexed_total_limited += indexed_limited
-            valid_grants_count += 1
-            
-            # שמירת הנתונים באובייקט המענק לשימוש בנספחים
-            grant.grant_indexed_amount = indexed_full
-            grant.grant_ratio = ratio
-            grant.impact_on_exemption = indexed_limited
-            grant.limited_indexed_amount = indexed_limited
-            
-        except Exception as e:
-            print(f"שגיאה בעיבוד מענק {grant.id}: {e}")
-            continue
+
+# מספר תאריכים מרבי בסריקת תאריכי זכאות אחת
+MAX_SWEEP_POINTS = 241
+
+
+def calculate_eligibility_sweep(client_id: int, start=None, end=None, step_months: int = 1) -> dict:
+    """
+    סיכום הפטור לכל תאריך זכאות מועמד בטווח - "מה אם הקצבה תתחיל N חודשים מאוחר יותר"
     
-    # לוג במקרה שאין מענקים תקינים אך קיימים מענקים ברשומה
-    grant_note = None
-    if valid_grants_count == 0 and grants:
-        grant_note = "לא נמצאו מענקים תקינים. נא לבדוק נתוני תאריכים או סכומים."
-        print(f"אזהרה: אין מענקים תקינים שעברו הצמדה עבור לקוח {client_id}")
+    הלקוח נטען פעם אחת, מקדמי ההצמדה נשלפים פעם אחת לכל זוג חודשים (בד"כ מסדרת המדד
+    המקומית), והיחסים והסכומים מחושבים וקטורית לכל התאריכים יחד (engine_batch).
+    התוצאה לכל תאריך זהה לזו של calculate_summary עם אותו eligibility_date.
     
-    # שלב 4: חישוב סך ההיוונים
-    # שליפת היוונים מכל הקצבאות
-    comm_total = 0
-    commutations = []
-    
-    for pension in Pension.query.filter_by(client_id=client_id).all():
-        pension_comms = Commutation.query.filter_by(pension_id=pension.id, include_calc=True).all()
-        commutations.extend(pension_comms)
-        for comm in pension_comms:
-            if comm.amount:
-                comm_total += comm.amount
-    
-    # שלב 5: חישוב יתרת תקרה
-    # פגיעה בתקרה מחושבת רק על המענקים המוגבלים ל-32 שנים
-    grants_impact = indexed_total_limited * 1.35 if indexed_total_limited > 0 else 0
-    
-    # חישוב הפחתת מענק עתידי
-    reserved_impact = 0
-    if client.reserved_grant_amount:
-        reserved_impact = client.reserved_grant_amount * 1.35
+    Args:
+        client_id: מזהה הלקוח
+        start: תאריך ראשון (ברירת מחדל: תאריך הזכאות המחושב של הלקוח)
+        end: תאריך אחרון (ברירת מחדל: 60 חודשים אחרי start)
+        step_months: מרווח בחודשים בין התאריכים
         
-    # הפחתת כל הפגיעות מתקרת ההון הפטורה
-    remaining_cap = exempt_cap - grants_impact - comm_total - reserved_impact
-    
-    # שלב 6-8: חישוב קצבה פטורה ואחוז
-    monthly_cap = get_monthly_cap(elig_year)
-    
-    # חישוב קצבה פטורה לפי נוסחה מתוקנת - יתרת תקרה זמינה לחלק ל-180
-    if remaining_cap > 0:
-        pension_exempt = remaining_cap / 180
-    else:
-        pension_exempt = 0
-    
-    # חישוב אחוז הקצבה הפטורה
-    pension_rate = round((pension_exempt / monthly_cap) * 100, 2) if monthly_cap > 0 else 0
-    
-    # הכנת התשובה במבנה החדש
-    summary = {
-        # נתוני לקוח
-        "client_info": {
-            "id": client.id,
-            "name": f"{client.first_name} {client.last_name}",
-            "eligibility_date": eligibility_date.isoformat(),
-            "elig_year": elig_year
-        },
-        # סיכום חישובים לפי הסדר החדש
-        "exempt_cap": round(exempt_cap, 2),                  # 1. תקרת ההון הפטורה
-        "grants_nominal": round(nominal_total, 2),           # 2. סך מענקים פטורים נומינליים
-        "grants_indexed_full": round(indexed_total_full, 2),  # 3A. סך מענקים פטורים מוצמדים ללא הגבלה
-        "grants_indexed_limited": round(indexed_total_limited, 2), # 3B. סך מענקים פטורים מוצמדים מוגבלים ל-32 שנים
-        "grants_impact": round(grants_impact, 2),            # 4. סך פגיעה בפטור = (3B) × 1.35
-        "reserved_grant_nominal": round(client.reserved_grant_amount, 2) if client.reserved_grant_amount else 0,  # 4.1 מענק עתידי משוריין (נומינלי)
-        "reserved_grant_impact": round(reserved_impact, 2),   # 4.2 השפעת מענק עתידי (×1.35)
-        "commutations_total": round(comm_total, 2),           # 5. סך היוונים
-        "remaining_cap": round(remaining_cap, 2),            # 6. הפרש תקרת הון פטורה מול סך מענקים והיוונים
-        "monthly_cap": round(monthly_cap, 2),               # 7. תקרת קצבה מזכה
-        "pension_exempt": round(pension_exempt, 2),          # 8. קצבה פטורה מחושבת
-        "pension_rate": pension_rate,                        # 9. אחוז הקצבה הפטורה
-        # נתונים נוספים לנספחים
-        "details": {
-            "grants_count": len(grants),
-            "commutations_count": len(commutations)
-        },
-        "grant_note": grant_note
+    Returns:
+        מילון עם רשימת points (תאריך, יתרת תקרה, קצבה פטורה, אחוז, מענקים שהצמדתם נכשלה)
+        ו-best - התאריך עם הקצבה הפטורה הגבוהה ביותר מבין התאריכים בלי הצמדה שנכשלה
+    """
+    import numpy as np
+    from app.engine_batch import round_cents, sweep_summaries, to_ordinals
+    from app.indexation import get_indexation_factors
+    
+    if step_months < 1:
+        raise ValueError("step_months חייב להיות לפחות 1")
+    
+    client = load_client_graph(client_id)
+    pension = first_pension(client)
+    client_input = to_client_input(client)
+    start = resolve_eligibility_date(client_input, pension.start_date if pension else None, start)
+    if isinstance(end, str):
+        end = date.fromisoformat(end[:10])
+    end = end or add_months(start, 60)
+    if end < start:
+        raise ValueError("תאריך הסיום מוקדם מתאריך ההתחלה")
+    
+    dates = []
+    while add_months(start, len(dates) * step_months) <= end:
+        dates.append(add_months(start, len(dates) * step_months))
+        if len(dates) > MAX_SWEEP_POINTS:
+            raise ValueError(f"יותר מ-{MAX_SWEEP_POINTS} תאריכים בסריקה אחת")
+    
+    grants = to_grant_inputs(client.grants)
+    commutations = to_commutation_inputs(included_commutations(client))
+    
+    # מקדמי הצמדה לכל זוג (חודש סיום עבודה, חודש זכאות) - שליפה אחת לכל זוג
+    indexable = [g for g in grants if g.amount and g.work_start_date and g.work_end_date]
+    factors = get_indexation_factors([(g.work_end_date, d) for d in dates for g in indexable])
+    indexable_ids = {g.id for g in indexable}
+    
+    def factor_for(grant, eligibility_date):
+        if grant.id not in indexable_ids:
+            return np.nan
+        factor = factors.get((grant.work_end_date.isoformat()[:7], eligibility_date.isoformat()[:7]))
+        return np.nan if factor is None else factor
+    
+    factor_matrix = np.array([[factor_for(g, d) for g in grants] for d in dates],
+                             dtype=np.float64).reshape(len(dates), len(grants))
+    # מענק בר-הצמדה בלי מקדם - הסיכום באותו תאריך חלקי (indexation_failures כמו ב-calculate_summary)
+    failed = np.isnan(factor_matrix) & np.array([g.id in indexable_ids for g in grants], dtype=bool)
+    amounts = np.array([g.amount or 0.0 for g in grants], dtype=np.float64)
+    
+    caps = [Caps.for_year(d.year) for d in dates]
+    result = sweep_summaries(
+        amounts,
+        to_ordinals([g.work_start_date for g in grants]),
+        to_ordinals([g.work_end_date for g in grants]),
+        to_ordinals(dates),
+        round_cents(amounts * factor_matrix),
+        [c.exempt_cap for c in caps],
+        [c.monthly_cap for c in caps],
+        sum(c.amount or 0 for c in commutations if c.include_calc),
+        client_input.reserved_grant_amount or 0,
+    )
+    
+    points = [
+        {
+            "eligibility_date": d.isoformat(),
+            "remaining_cap": round(float(remaining), 2),
+            "pension_exempt": round(float(pension_exempt), 2),
+            "pension_rate": float(rate),
+            "indexation_failures": [g.id for g, missing in zip(grants, row_failed) if missing]
+        }
+        for d, remaining, pension_exempt, rate, row_failed in zip(
+            dates, result.remaining_cap, result.pension_exempt, result.pension_rate, failed)
+    ]
+    # התאריך המוקדם ביותר עם הקצבה הפטורה המרבית, מבין התאריכים שהסיכום שלהם שלם
+    complete = ~failed.any(axis=1)
+    best = points[int(np.argmax(np.where(complete, result.pension_exempt, -np.inf)))] if complete.any() else None
+    return {
+        "client_id": client_id,
+        "step_months": step_months,
+        "points": points,
+        "best": best
     }
-    
-    # ליותר תאימות לאחור, משאירים את הערך הישן במקום grants_indexed
-    summary["grants_indexed"] = summary["grants_indexed_limited"]
-    
-    return summary
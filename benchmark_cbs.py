@@ -0,0 +1,86 @@
+"""
+מדידת זמני סיכום והפקת 161ד כשהלמ"ס איטי / לא יציב, מול שרת המחשבון המקומי.
+
+שימוש:
+    python benchmark_cbs.py --latency 0.3 --grants 6 --runs 5 --error-rate 0.1
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from config import Config
+from app import create_app, cpi, factor_cache
+from app.cbs_client import get_cbs_client, reset_cbs_client
+from app.cbs_standin import CBSStandIn
+from app.models import db, Client, Grant, Pension
+from app.pdf_fillers.form161d import fill_161d
+from app.utils import calculate_summary
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def seed_client(grants_count: int) -> int:
+    client = Client(first_name="בדיקה", last_name="ביצועים", tz="000000000",
+                    birth_date=date(1960, 1, 1), gender="male")
+    db.session.add(client)
+    db.session.flush()
+    db.session.add(Pension(client_id=client.id, payer_name="קרן", start_date=date(2027, 1, 1)))
+    for i in range(grants_count):
+        end_year = 1990 + i * 5
+        db.session.add(Grant(client_id=client.id, employer_name=f"מעסיק {i + 1}", grant_amount=50000 + i * 1000,
+                             work_start_date=date(end_year - 5, 1, 1), work_end_date=date(end_year, 6, 30)))
+    db.session.commit()
+    return client.id
+
+
+def timed(func, runs: int) -> list:
+    timings = []
+    for _ in range(runs):
+        factor_cache.clear_factors()  # כל ריצה מתחילה במטמון ריק - פניות אמיתיות לשרת
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name: str, timings: list):
+    print(f"{name:<12} median={statistics.median(timings):8.1f}ms  max={max(timings):8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='מדידת ביצועי מסלול ההצמדה')
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--grants', type=int, default=6)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    standin = CBSStandIn(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                         malformed_rate=args.malformed_rate, seed=1).start()
+    tmp_dir = tempfile.mkdtemp()
+    Config.CBS_BASE_URL = standin.base_url
+    Config.CPI_LOCAL_ENGINE = False
+    Config.INDEXATION_CACHE_PATH = f"{tmp_dir}/factors.db"
+    cpi.reset_cpi_series()
+    reset_cbs_client()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        client_id = seed_client(args.grants)
+        print(f"CBS stand-in {standin.base_url}: latency={args.latency}s error_rate={args.error_rate} "
+              f"malformed_rate={args.malformed_rate}, {args.grants} grants, {args.runs} runs")
+        report("summary", timed(lambda: calculate_summary(client_id), args.runs))
+        report("161d", timed(lambda: fill_161d(client_id, out_dir=tmp_dir), args.runs))
+        print("CBS client:", get_cbs_client().stats())
+
+    standin.stop()
+
+
+if __name__ == "__main__":
+    main()
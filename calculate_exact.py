@@ -1,7 +1,8 @@
 from app import create_app
 from app.models import Client, Pension, Grant
 from app.utils import calculate_eligibility_age
-from app.indexation import index_grant, work_ratio_within_last_32y
+from app.indexation import index_grant
+from app.engine import window_ratio, IMPACT_MULTIPLIER
 from datetime import date
 import json
 
@@ -51,7 +52,7 @@ def calculate_total_expected(client_id):
             )
             
             # חישוב מחדש של היחס
-            ratio = work_ratio_within_last_32y(
+            ratio = window_ratio(
                 grant.work_start_date,
                 grant.work_end_date,
                 eligibility_date
@@ -59,7 +60,7 @@ def calculate_total_expected(client_id):
             
             # חישוב הסכום המוצמד והשפעתו
             indexed_amount_new = indexed_full * ratio
-            impact_new = indexed_amount_new * 1.35
+            impact_new = indexed_amount_new * IMPACT_MULTIPLIER
             
             # הערכים הישנים מבסיס הנתונים
             indexed_amount_old = grant.grant_indexed_amount or 0
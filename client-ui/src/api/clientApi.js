@@ -1,7 +1,14 @@
 import axios from 'axios';
 
-export function getClients() {
-  return axios.get('/api/clients');
+// params: limit, cursor, fields, name, tz, eligibility_year
+// העמוד הבא (אם יש) מגיע בכותרת x-next-cursor
+export function getClients(params = {}) {
+  return axios.get('/api/clients', { params });
+}
+
+// חיפוש לפי תחילית של שם, ת"ז, טלפון או כתובת (עד limit תוצאות, מהמתאימה ביותר)
+export function searchClients(q, limit = 50) {
+  return axios.get('/api/clients/search', { params: { q, limit } });
 }
 
 export function getClient(id) {
@@ -1,19 +1,34 @@
 import { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import { getClients, deleteClient } from '../api/clientApi';
+import { getClients, searchClients, deleteClient } from '../api/clientApi';
+
+const PAGE_SIZE = 100;
+const LIST_FIELDS = 'first_name,last_name,tz,birth_date,phone';
 
 function ClientList() {
   const [clients, setClients] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [search, setSearch] = useState('');
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [message, setMessage] = useState(null);
   const [confirmDelete, setConfirmDelete] = useState(null);
 
-  const fetchClients = async () => {
+  // cursor ריק = עמוד ראשון (מחליף את הרשימה), אחרת מוסיף לסופה
+  const fetchClients = async (cursor = null) => {
     try {
       setLoading(true);
-      const response = await getClients();
-      setClients(response.data);
+      if (search.trim()) {
+        const response = await searchClients(search.trim());
+        setClients(response.data);
+        setNextCursor(null);
+        return;
+      }
+      const params = { limit: PAGE_SIZE, fields: LIST_FIELDS };
+      if (cursor) params.cursor = cursor;
+      const response = await getClients(params);
+      setClients((prev) => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (err) {
       setError('שגיאה בטעינת רשימת הלקוחות');
       console.error(err);
@@ -23,15 +38,16 @@ function ClientList() {
   };
 
   useEffect(() => {
-    fetchClients();
-  }, []);
+    const timer = setTimeout(() => fetchClients(), 300);
+    return () => clearTimeout(timer);
+  }, [search]);
   
   const handleDeleteClient = async (clientId) => {
     try {
       await deleteClient(clientId);
       setMessage('הלקוח נמחק בהצלחה');
-      // Refresh the clients list
-      fetchClients();
+      // הסרה מהרשימה הטעונה - בלי לטעון את כל הרשימה מחדש
+      setClients((prev) => prev.filter((client) => client.id !== clientId));
       setConfirmDelete(null);
       // Clear message after 3 seconds
       setTimeout(() => setMessage(null), 3000);
@@ -43,7 +59,7 @@ function ClientList() {
     }
   };
 
-  if (loading) return <div className="text-center py-4">טוען נתונים...</div>;
+  if (loading && clients.length === 0) return <div className="text-center py-4">טוען נתונים...</div>;
   if (error) return <div className="text-red-500 text-center py-4">{error}</div>;
 
   return (
@@ -67,6 +83,14 @@ function ClientList() {
         </div>
       )}
       
+      <input
+        type="text"
+        value={search}
+        onChange={(e) => setSearch(e.target.value)}
+        placeholder="חיפוש לפי שם, ת״ז או טלפון"
+        className="border rounded px-3 py-2 mb-4 w-full text-right"
+      />
+
       {clients.length === 0 ? (
         <p className="text-gray-500 text-center py-4">לא נמצאו לקוחות במערכת</p>
       ) : (
@@ -121,6 +145,13 @@ function ClientList() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <div className="text-center py-4">
+              <button onClick={() => fetchClients(nextCursor)} className="btn-secondary" disabled={loading}>
+                {loading ? 'טוען...' : 'טען עוד'}
+              </button>
+            </div>
+          )}
         </div>
       )}
       
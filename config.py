@@ -3,13 +3,62 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+basedir = os.path.abspath(os.path.dirname(__file__))
+
 class Config:
     # Application Configuration
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'default-secret-key'
-    
+
     # Database Configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///rights_fixation.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
+
+    # SQLite - הגדרות חיבור (app/database.py)
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') != '0'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # בתים
+
     # Server Configuration
     PORT = 5001  # Default port for Rights Fixation System
+
+    # CPI (מדד המחירים לצרכן) Configuration
+    # קובץ סדרת המדד המקומית - נוצר ומתרענן ע"י refresh_cpi.py
+    CPI_SERIES_PATH = os.environ.get('CPI_SERIES_PATH') or os.path.join(basedir, 'app', 'static', 'data', 'cpi_120010.json')
+    # האם לחשב הצמדה מקומית לפני פנייה ל-API של הלמ"ס
+    CPI_LOCAL_ENGINE = os.environ.get('CPI_LOCAL_ENGINE', '1') != '0'
+    # refresh_cpi.py --if-stale (בעליית השרת) מדלג על רענון של קובץ צעיר מזה (שניות)
+    CPI_REFRESH_MAX_AGE = int(os.environ.get('CPI_REFRESH_MAX_AGE', 24 * 3600))
+
+    # מטמון מקדמי הצמדה משותף לכל ה-workers (SQLite על הדיסק)
+    INDEXATION_CACHE_PATH = os.environ.get('INDEXATION_CACHE_PATH') or os.path.join(basedir, 'instance', 'indexation_cache.db')
+    INDEXATION_CACHE_TTL = int(os.environ.get('INDEXATION_CACHE_TTL', 7 * 24 * 3600))  # שניות
+    # בלי סדרה מקומית: כל כמה שניות בודקים מול הלמ"ס אם פורסם מדד חדש (פנייה אחת לכל התהליכים)
+    CPI_VINTAGE_CHECK_SECONDS = int(os.environ.get('CPI_VINTAGE_CHECK_SECONDS', 6 * 3600))
+    # מספר פניות מקבילות מרבי ללמ"ס בהצמדת אצווה של מענקים
+    INDEXATION_MAX_WORKERS = int(os.environ.get('INDEXATION_MAX_WORKERS', 6))
+
+    # לקוח ה-HTTP ללמ"ס (ניתן להפנות לשרת המקומי app/cbs_standin.py)
+    CBS_BASE_URL = os.environ.get('CBS_BASE_URL') or 'https://api.cbs.gov.il'
+    # במקרה הגרוע פנייה אחת חוסמת worker כ-(CBS_MAX_RETRIES + 1) × CBS_TIMEOUT ועוד השהיות -
+    # כ-16 שניות בברירות המחדל (ראו CBSClient.get_json)
+    CBS_TIMEOUT = float(os.environ.get('CBS_TIMEOUT', 5))  # שניות לכל ניסיון
+    CBS_MAX_RETRIES = int(os.environ.get('CBS_MAX_RETRIES', 2))
+    CBS_POOL_SIZE = int(os.environ.get('CBS_POOL_SIZE', 10))
+    CBS_BREAKER_THRESHOLD = int(os.environ.get('CBS_BREAKER_THRESHOLD', 5))  # כשלונות רצופים עד פתיחת המפסק
+    CBS_BREAKER_RESET = float(os.environ.get('CBS_BREAKER_RESET', 30))  # שניות עד ניסיון בודק
+
+    # מטמון סיכומי פטור בזיכרון התהליך (מספר סיכומים מרבי)
+    SUMMARY_CACHE_SIZE = int(os.environ.get('SUMMARY_CACHE_SIZE', 512))
+
+    # טופס 161ד - עדכון מצטבר (incremental update) מעל קובץ התבנית במקום כתיבה מחדש של כל המסמך
+    PDF_INCREMENTAL_UPDATE = os.environ.get('PDF_INCREMENTAL_UPDATE', '1') != '0'
+    # מטמון מסמכים שהופקו (161ד ונספחים) בזיכרון התהליך - סך הבתים המרבי; 0 = ללא מטמון
+    DOCUMENT_CACHE_BYTES = int(os.environ.get('DOCUMENT_CACHE_BYTES', 64 * 1024 * 1024))
+
+    # מאגר תהליכי wkhtmltopdf חמים לנספחים (app/render_pool.py)
+    RENDER_POOL_ENABLED = os.environ.get('RENDER_POOL_ENABLED', '1') != '0'
+    RENDER_POOL_SIZE = int(os.environ.get('RENDER_POOL_SIZE', 2))  # תהליכים
+    RENDER_QUEUE_SIZE = int(os.environ.get('RENDER_QUEUE_SIZE', 32))  # עבודות ממתינות מעבר לתהליכים
+    RENDER_TIMEOUT = float(os.environ.get('RENDER_TIMEOUT', 60))  # שניות לעבודה
+    RENDER_MAX_JOBS = int(os.environ.get('RENDER_MAX_JOBS', 200))  # עבודות עד מחזור התהליך
@@ -0,0 +1,57 @@
+import pytest
+from config import Config
+from app import cpi, factor_cache
+from app.cbs_client import reset_cbs_client
+from app.cbs_standin import CBSStandIn, synthetic_cpi_values
+from app.cpi import write_cpi_series
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+@pytest.fixture
+def cbs_standin(tmp_path, monkeypatch):
+    """שרת מחשבון מקומי במקום הלמ"ס; ללא סדרה מקומית וללא מטמון משותף"""
+    standin = CBSStandIn(seed=1).start()
+    monkeypatch.setattr(Config, "CBS_BASE_URL", standin.base_url)
+    monkeypatch.setattr(Config, "CBS_MAX_RETRIES", 0)
+    monkeypatch.setattr(Config, "CPI_LOCAL_ENGINE", False)
+    monkeypatch.setattr(Config, "INDEXATION_CACHE_PATH", str(tmp_path / "factors.db"))
+    monkeypatch.setattr(factor_cache, "_seen_vintage", None)
+    monkeypatch.setattr(factor_cache, "_next_probe", 0.0)
+    cpi.reset_cpi_series()
+    reset_cbs_client()
+    yield standin
+    standin.stop()
+    reset_cbs_client()
+    cpi.reset_cpi_series()
+
+@pytest.fixture
+def local_cpi(tmp_path, monkeypatch):
+    """סדרת מדד מקומית סינתטית (עד 2026) בלבד - ללא פניות רשת; מחזיר את נתיב הקובץ"""
+    series_path = str(tmp_path / "cpi.json")
+    write_cpi_series(synthetic_cpi_values(end_year=2026), series_path)
+    monkeypatch.setattr(Config, "CPI_SERIES_PATH", series_path)
+    monkeypatch.setattr(Config, "CPI_LOCAL_ENGINE", True)
+    monkeypatch.setattr(Config, "INDEXATION_CACHE_PATH", str(tmp_path / "factors.db"))
+    monkeypatch.setattr(factor_cache, "_seen_vintage", None)
+    monkeypatch.setattr(factor_cache, "_next_probe", 0.0)
+    cpi.reset_cpi_series()
+    yield series_path
+    cpi.reset_cpi_series()
+
+@pytest.fixture
+def app():
+    from app import create_app
+    from app.models import db
+    from app.summary_cache import clear_summary_cache
+    from app.document_cache import clear_document_cache
+    flask_app = create_app(TestConfig)
+    clear_summary_cache()
+    clear_document_cache()
+    with flask_app.app_context():
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+    clear_summary_cache()
+    clear_document_cache()
@@ -0,0 +1,45 @@
+"""
+ייבוא מרוכז של לקוחות, מענקים, קצבאות והיוונים מקובץ CSV או JSON lines.
+
+שימוש:
+    python import_clients.py FILE [--format csv|jsonl] [--chunk-size N] [--summaries] [--report PATH]
+
+הפורמט נקבע לפי הסיומת אם לא צוין. דוח השגיאות (שורה + הודעות לכל לקוח שנדחה)
+מודפס, ועם --report נשמר גם כקובץ JSON. ראו app/bulk_import.py.
+"""
+import argparse
+import json
+
+from app import create_app
+from app.bulk_import import import_stream, DEFAULT_CHUNK_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ייבוא מרוכז של לקוחות')
+    parser.add_argument('file', help='קובץ CSV או JSON lines')
+    parser.add_argument('--format', choices=('csv', 'jsonl'), default=None, help='ברירת מחדל: לפי סיומת הקובץ')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='מספר לקוחות בכל טרנזקציה')
+    parser.add_argument('--summaries', action='store_true', help='לחשב בסוף את הסיכומים של הלקוחות החדשים')
+    parser.add_argument('--report', default=None, help='קובץ JSON לדוח הייבוא')
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.file.lower().endswith('.csv') else 'jsonl')
+    app = create_app()
+    with app.app_context(), open(args.file, encoding='utf-8-sig', newline='') as f:
+        report = import_stream(f, fmt, chunk_size=args.chunk_size, compute_summaries=args.summaries)
+
+    for error in report['errors']:
+        print(f"שורה {error['line']} ({error['ref'] or '-'}): {'; '.join(error['errors'])}")
+    print(f"\nנקלטו {report['imported']} לקוחות, {report['grants']} מענקים, {report['pensions']} קצבאות, "
+          f"{report['commutations']} היוונים; נדחו {report['failed']}")
+    if report['summaries'] is not None:
+        print(f"חושבו {report['summaries']} סיכומים")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"הדוח נשמר ל-{args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+הרצת מיגרציות הסכמה שעוד לא רצו (app/migrations.py).
+
+שימוש:
+    python migrate.py            # מריץ את המיגרציות החסרות
+    python migrate.py --status   # רק מציג אילו מיגרציות ממתינות
+
+רץ לפני עליית ה-workers (start.sh, Procfile), כך שרק תהליך אחד משנה את הסכמה.
+"""
+import argparse
+import sys
+
+from app import create_app
+from app.models import db
+from app.migrations import MigrationError, pending_migrations, run_migrations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='מיגרציות סכמה')
+    parser.add_argument('--status', action='store_true', help='להציג מיגרציות ממתינות בלי להריץ')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        if args.status:
+            pending = pending_migrations(db.engine)
+            for version, description, _ in pending:
+                print(f"ממתינה: {version} - {description}")
+            print(f"{len(pending)} מיגרציות ממתינות")
+            return
+        try:
+            done = run_migrations(db.engine)
+        except MigrationError as e:
+            print(f"המיגרציה נכשלה: {e}")
+            sys.exit(1)
+    print(f"הסכמה מעודכנת ({len(done)} מיגרציות הורצו)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,37 @@
-from app import create_app, db
-from app.models import Client, Pension, Grant
-from app.utils import calculate_eligibility_age
-from app.routes import process_grant
-
-app = create_app()
-
-with app.app_context():
-    # מעבר על כל הלקוחות
-    clients = Client.query.all()
-    print(f"נמצאו {len(clients)} לקוחות")
-    
-    for client in clients:
-        print(f"\nמעבד לקוח {client.id}: {client.first_name} {client.last_name}")
-        
-        # קבלת קצבה ראשונה לחישוב תאריך זכאות
-        first_pension = Pension.query.filter_by(client_id=client.id).order_by(Pension.start_date).first()
-        
-        if first_pension:
-            # חישוב תאריך זכאות
-            eligibility_date = calculate_eligibility_age(client.birth_date, client.gender, first_pension.start_date)
-            print(f"תאריך זכאות: {eligibility_date}")
-            
-            # חישוב מחדש של כל המענקים
-            grants = Grant.query.filter_by(client_id=client.id).all()
-            print(f"מספר מענקים: {len(grants)}")
-            
-            for grant in grants:
-                print(f"\nמענק #{grant.id}:")
-                print(f"  לפני: סכום מוצמד={grant.grant_indexed_amount}, יחס={grant.grant_ratio}, השפעה={grant.impact_on_exemption}")
-                
-                # חישוב מחדש
-                process_grant(grant, eligibility_date)
-                
-                print(f"  אחרי: סכום מוצמד={grant.grant_indexed_amount}, יחס={grant.grant_ratio}, השפעה={grant.impact_on_exemption}")
-            
-            # שמירת השינויים בבסיס הנתונים
-            db.session.commit()
-            print(f"עודכנו {len(grants)} מענקים ללקוח {client.id}")
-        else:
-            print(f"לא נמצאו קצבאות ללקוח {client.id}")
-
-print("\nהחישוב מחדש הסתיים בהצלחה")
+"""
+חישוב מחדש של המענקים של כל הלקוחות (ריצת לילה).
+
+שימוש:
+    python recalculate_grants.py [--workers N] [--chunk-size N] [--checkpoint PATH] [--restart]
+
+ריצה שנקטעה ממשיכה מנקודת הביקורת; --restart מתחיל מההתחלה.
+ראו app/recalculation.py.
+"""
+import argparse
+import os
+
+from app import create_app
+from app.recalculation import recalculate_portfolio
+
+
+def main():
+    parser = argparse.ArgumentParser(description='חישוב מחדש של כל המענקים בתיק')
+    parser.add_argument('--workers', type=int, default=None, help='מספר תהליכי חישוב (ברירת מחדל: מספר המעבדים, 0 = ללא תהליכים)')
+    parser.add_argument('--chunk-size', type=int, default=200, help='מספר לקוחות בכל קבוצה')
+    parser.add_argument('--checkpoint', default=None, help='קובץ נקודת ביקורת (ברירת מחדל: instance/recalculate_checkpoint.json)')
+    parser.add_argument('--restart', action='store_true', help='להתחיל מההתחלה ולהתעלם מנקודת ביקורת קיימת')
+    args = parser.parse_args()
+
+    app = create_app()
+    checkpoint_path = args.checkpoint or os.path.join(app.instance_path, 'recalculate_checkpoint.json')
+    with app.app_context():
+        result = recalculate_portfolio(chunk_size=args.chunk_size,
+                                       workers=args.workers,
+                                       checkpoint_path=checkpoint_path,
+                                       restart=args.restart)
+    print(f"\nהחישוב מחדש הסתיים בהצלחה: {result['clients']} לקוחות, {result['grants']} מענקים "
+          f"({result['written']} עודכנו, השאר לא השתנו)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+רענון קובץ סדרת המדד המקומית (סדרה 120010) מתוך מחשבון ההצמדה של הלמ"ס.
+
+לכל חודש מחושבת הצמדה של סכום ייחוס מאותו חודש ועד היום, וממנה נגזר
+ערך מדד יחסי (החודש האחרון שפורסם = 100). כך הסדרה משקפת בדיוק את
+שרשור הבסיסים ואת המדדים שהמחשבון עצמו משתמש בהם.
+
+שימוש: python refresh_cpi.py [YYYY-MM]   (ברירת מחדל: 1970-01)
+       python refresh_cpi.py --if-stale  (בעליית השרת - ראו start.sh / Procfile)
+
+עם --if-stale הרענון מדולג אם הקובץ נכתב לפני פחות מ-CPI_REFRESH_MAX_AGE שניות.
+כשקובץ סדרה כבר קיים הרענון מצטבר: החודשים הישנים מחולקים ביחס שבין המדד
+של היום למדד של יום הכתיבה הקודם (פנייה אחת, מחודש שכבר פורסם אז), ורק
+החודשים האחרונים (RECENT_MONTHS, שאולי טרם פורסמו אז) והחדשים נשלפים שוב -
+כמה פניות במקום מאות.
+כשל בפנייה ללמ"ס לא מפיל את עליית השרת: הסדרה הקיימת נשארת כמו שהיא.
+
+אחרי הרענון מחושבים מחדש הסיכומים השמורים (client_summary) שחושבו לפי המדד הקודם.
+"""
+import os
+import sys
+import time
+from datetime import date
+
+from config import Config
+from app.cbs_client import get_cbs_client
+from app.cpi import CPISeries, month_key, month_label, write_cpi_series
+from app.indexation import REFERENCE_AMOUNT
+
+# חודשים אחרונים בסדרה הקיימת שנשלפים מחדש ברענון מצטבר
+RECENT_MONTHS = 3
+
+
+def fetch_month_factor(month: str, to_date: str) -> float | None:
+    """מחזיר את מקדם ההצמדה מחודש נתון עד תאריך היעד לפי המחשבון"""
+    try:
+        data = get_cbs_client().calculator(REFERENCE_AMOUNT, f"{month}-01", to_date)
+        answer = data.get('answer') or {}
+        to_value = answer.get('to_value')
+        return float(to_value) / REFERENCE_AMOUNT if to_value else None
+    except Exception as e:
+        print(f"שגיאה בשליפת מדד לחודש {month}: {e}")
+        return None
+
+
+def series_is_fresh(path: str | None = None) -> bool:
+    path = path or Config.CPI_SERIES_PATH
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < Config.CPI_REFRESH_MAX_AGE
+
+
+def refresh_cpi_series(start_month: str = '1970-01', incremental: bool = False, today: date | None = None) -> str:
+    today = today or date.today()
+    to_date = today.isoformat()
+    values = {}
+    first_key = month_key(start_month)
+
+    old = anchor = None
+    if incremental and os.path.exists(Config.CPI_SERIES_PATH):
+        old = CPISeries.from_file(Config.CPI_SERIES_PATH)
+        # חודש העיגון: החודש האחרון שנשמר כמו שהוא - בוודאות פורסם כבר ביום הכתיבה הקודם
+        anchor = old.last_month - RECENT_MONTHS
+    if old is not None and anchor in old.values:
+        # ערכי הסדרה יחסיים למדד של יום הכתיבה הקודם (=100). מקדם מחודש העיגון ועד היום
+        # כפול ערכו הישן נותן את היחס בין המדד של היום למדד ההוא. חודשים אחרונים יותר
+        # לא מתאימים לעיגון: מה שטרם פורסם אז קיבל את המדד האחרון, ואולי פורסם מאז
+        factor = fetch_month_factor(month_label(anchor), to_date)
+        if factor is None:
+            raise RuntimeError("לא התקבל מקדם הצמדה מהלמ\"ס לרענון מצטבר")
+        growth = factor * old.values[anchor] / 100
+        values = {month_label(key): round(value / growth, 8)
+                  for key, value in old.values.items() if key <= anchor}
+        first_key = anchor + 1
+        print(f"רענון מצטבר מ-{month_label(first_key)} (סדרה קודמת עד {old.vintage})")
+
+    for key in range(first_key, month_key(today) + 1):
+        month = month_label(key)
+        factor = fetch_month_factor(month, to_date)
+        if factor:
+            # מדד יחסי: מדד(יעד)=100 ולכן מדד(חודש) = 100 / מקדם
+            values[month] = round(100 / factor, 8)
+            print(f"{month}: {values[month]}")
+
+    if not values:
+        raise RuntimeError("לא התקבלו ערכי מדד מהלמ\"ס")
+
+    path = write_cpi_series(values)
+    print(f"נשמרו {len(values)} חודשים לקובץ {path}")
+    return path
+
+
+def rebuild_stale_summaries() -> int:
+    from app import create_app
+    from app.client_summary import rebuild_summaries
+
+    with create_app().app_context():
+        rebuilt = rebuild_summaries()
+    print(f"חושבו מחדש {rebuilt} סיכומי לקוחות")
+    return rebuilt
+
+
+if __name__ == "__main__":
+    if "--if-stale" in sys.argv:
+        if series_is_fresh():
+            print("סדרת המדד עדכנית - אין צורך ברענון")
+            sys.exit(0)
+        try:
+            refresh_cpi_series(incremental=True)
+        except Exception as e:
+            print(f"רענון סדרת המדד נכשל, ממשיכים עם הסדרה הקיימת: {e}")
+            sys.exit(0)
+    else:
+        refresh_cpi_series(sys.argv[1] if len(sys.argv) == 2 else '1970-01')
+    rebuild_stale_summaries()
@@ -17,6 +17,7 @@ setup(
         'python-dotenv==1.0.0',
         'pdfrw==0.4.0',
         'pdfkit==1.0.0',
+        'numpy>=1.24',
         'gunicorn==21.2.0',
     ],
     entry_points={
@@ -7,4 +7,7 @@ set -o nounset
 pip install -r requirements.txt
 
 # Run the application
+python migrate.py
+# רענון סדרת המדד ברקע - העובדים טוענים את הקובץ מחדש כשהוא מתעדכן
+python refresh_cpi.py --if-stale &
 exec gunicorn --worker-class sync --workers=4 --bind 0.0.0.0:$PORT wsgi:app
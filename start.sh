@@ -1,2 +1,5 @@
 #!/bin/bash
+python migrate.py
+# רענון סדרת המדד ברקע - העובדים טוענים את הקובץ מחדש כשהוא מתעדכן
+python refresh_cpi.py --if-stale &
 exec gunicorn --worker-class sync --workers=4 --bind 0.0.0.0:$PORT wsgi:app
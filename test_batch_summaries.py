@@ -0,0 +1,45 @@
+import json
+from datetime import date
+import pytest
+from app.models import db, Client, Grant, Pension, Commutation
+from app.utils import calculate_summary
+
+@pytest.fixture
+def client_ids(app, local_cpi):
+
+    ids = []
+    for i, (last_name, gender) in enumerate((("כהן", "male"), ("לוי", "female"), ("כהנא", "female"))):
+        client = Client(first_name=f"לקוח {i}", last_name=last_name, birth_date=date(1958 + i, 4, 1),
+                        gender=gender, reserved_grant_amount=5000 * i)
+        db.session.add(client)
+        db.session.flush()
+        ids.append(client.id)
+        pension = Pension(client_id=client.id, payer_name="קרן", start_date=date(2025, 2, 1))
+        db.session.add(pension)
+        db.session.flush()
+        db.session.add(Commutation(pension_id=pension.id, amount=10000 * (i + 1), include_calc=True))
+        for j in range(i + 1):
+            db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=40000.0 + j,
+                                 work_start_date=date(1985 + j, 1, 1), work_end_date=date(2001 + j, 7, 31)))
+    db.session.commit()
+    yield ids
+
+def _lines(resp):
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    return [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+
+def test_batch_matches_single_summaries(app, client_ids):
+    http = app.test_client()
+    lines = _lines(http.post("/api/summaries", json={"client_ids": [client_ids[2], 999, client_ids[0]]}))
+    assert lines[1] == {"client_id": 999, "error": "לקוח לא נמצא"}
+    assert lines[0] == calculate_summary(client_ids[2])
+    assert lines[2] == calculate_summary(client_ids[0])
+
+def test_batch_filter(app, client_ids):
+    http = app.test_client()
+    lines = _lines(http.post("/api/summaries", json={"filter": {"last_name": "כה", "gender": "female"}}))
+    assert [line["client_info"]["id"] for line in lines] == [client_ids[2]]
+    lines = _lines(http.post("/api/summaries", json={}))
+    assert [line["client_info"]["id"] for line in lines] == client_ids
+    assert http.post("/api/summaries", json={"client_ids": "1,2"}).status_code == 400
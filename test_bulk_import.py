@@ -0,0 +1,51 @@
+import io
+import json
+from datetime import date
+import pytest
+from app.models import db, Client, Grant, Pension, Commutation, ClientSummary
+from app.summary_cache import get_client_version
+from app.bulk_import import import_stream
+
+CSV_TEXT = """record_type,client_ref,pension_ref,first_name,last_name,tz,birth_date,gender,employer_name,grant_amount,work_start_date,work_end_date,payer_name,start_date,amount,include_calc
+client,A,,ישראל,כהן,12345678,1958-04-01,male,,,,,,,,
+grant,A,,,,,,,"מעסיק, בע""מ",50000,1990-01-01,2010-06-30,,,,
+pension,A,P1,,,,,,,,,,קרן,2025-02-01,,
+commutation,A,P1,,,,,,,,,,,,20000,false
+client,B,,שרה,לוי,,1961-02-30,female,,,,,,,,
+client,C,,רחל,לוי,,1962-03-01,female,,,,,,,,
+"""
+
+def test_csv_import_with_row_errors(app, local_cpi):
+    report = import_stream(io.StringIO(CSV_TEXT), "csv", chunk_size=2, compute_summaries=True)
+    assert report["imported"] == 2 and report["failed"] == 1
+    assert report["errors"][0]["line"] == 6 and report["errors"][0]["ref"] == "B"
+    assert report["summaries"] == 2
+
+    client = Client.query.filter_by(last_name="כהן").one()
+    assert client.tz == "012345678"
+    grant = Grant.query.filter_by(client_id=client.id).one()
+    assert grant.employer_name == 'מעסיק, בע"מ'
+    assert grant.grant_indexed_amount is not None  # חושב בסיכומים שבסוף הייבוא
+    commutation = Commutation.query.join(Pension).filter(Pension.client_id == client.id).one()
+    assert commutation.amount == 20000 and commutation.include_calc is False
+    assert get_client_version(client.id) == 1
+    assert db.session.get(ClientSummary, client.id) is not None
+
+def test_jsonl_import_rejects_duplicates_and_bad_lines(app):
+    lines = [
+        {"ref": 1, "first_name": "א", "last_name": "ב", "tz": "111111111", "birth_date": "1960-01-01", "gender": "male",
+         "pensions": [{"payer_name": "קרן", "start_date": "2025-01-01", "commutations": [{"amount": 1000}]}]},
+        {"ref": 2, "first_name": "ג", "last_name": "ד", "tz": "111111111", "birth_date": "1960-01-01", "gender": "male"},
+        {"ref": 3, "first_name": "ה", "last_name": "ו", "birth_date": "1960-01-01", "gender": "x",
+         "grants": [{"grant_amount": "abc", "work_start_date": "2010-01-01", "work_end_date": "2000-01-01"}]},
+    ]
+    text = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines) + "\n{not json\n"
+    resp = app.test_client().post("/api/import?format=jsonl", data=text.encode("utf-8"))
+    report = resp.get_json()
+    assert resp.status_code == 200
+    assert report["imported"] == 1 and report["commutations"] == 1
+    errors = {error["line"]: error["errors"] for error in report["errors"]}
+    assert set(errors) == {2, 3, 4}
+    assert "כבר קיים" in errors[2][0]
+    assert len(errors[3]) == 3  # מין, סכום ותאריכים הפוכים - כל השגיאות ולא רק הראשונה
+    assert Client.query.count() == 1
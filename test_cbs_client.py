@@ -0,0 +1,58 @@
+import pytest
+import requests
+from app.cbs_client import CBSClient, CircuitBreaker, CBSError, CircuitOpenError
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._payload
+
+@pytest.fixture
+def client():
+    c = CBSClient(max_retries=2, backoff=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    return c
+
+def test_retries_then_succeeds(client, monkeypatch):
+    responses = [FakeResponse(503), FakeResponse(200, {"answer": {"to_value": 1.5}})]
+    monkeypatch.setattr(client.session, "get", lambda *a, **kw: responses.pop(0))
+    assert client.calculator(1, "2010-01-01", "2025-01-01")["answer"]["to_value"] == 1.5
+    stats = client.stats()
+    assert stats["calls"] == 2 and stats["errors"] == 1 and stats["retries"] == 1
+
+def test_breaker_opens_and_fails_fast(client, monkeypatch):
+    calls = []
+
+    def timeout(*a, **kw):
+        calls.append(1)
+        raise requests.Timeout("slow")
+
+    monkeypatch.setattr(client.session, "get", timeout)
+    for _ in range(2):
+        with pytest.raises(CBSError):
+            client.calculator(1, "2010-01-01", "2025-01-01")
+    assert len(calls) == 6
+    with pytest.raises(CircuitOpenError):
+        client.calculator(1, "2010-01-01", "2025-01-01")
+    assert len(calls) == 6
+    assert client.stats()["breaker_state"] == "open"
+    assert client.stats()["short_circuited"] == 1
+
+def test_invalid_responses_count_as_failures(client, monkeypatch):
+    class BrokenJSON(FakeResponse):
+        def json(self):
+            raise ValueError("Expecting value")
+
+    responses = [BrokenJSON(200), FakeResponse(404)]
+    monkeypatch.setattr(client.session, "get", lambda *a, **kw: responses.pop(0))
+    for _ in range(2):
+        with pytest.raises(CBSError):
+            client.calculator(1, "2010-01-01", "2025-01-01")
+    assert client.stats()["calls"] == 2  # בלי ניסיונות חוזרים
+    assert client.stats()["breaker_state"] == "open"
@@ -0,0 +1,31 @@
+from datetime import date
+from app.indexation import calculate_adjusted_amount
+from app.models import db, Client, Grant, Pension
+from app.utils import calculate_summary
+
+def test_standin_serves_calculator_contract(cbs_standin):
+    expected = round(1000 * cbs_standin.series.factor("2010-03-01", "2025-01-01"), 2)
+    assert calculate_adjusted_amount(1000, "2010-03-01", "2025-01-01") == expected
+
+def test_injected_faults_yield_none(cbs_standin):
+    cbs_standin.error_rate = 1.0
+    assert calculate_adjusted_amount(1000, "2010-03-01", "2025-01-01") is None
+    cbs_standin.error_rate, cbs_standin.malformed_rate = 0.0, 1.0
+    assert calculate_adjusted_amount(1000, "2011-03-01", "2025-01-01") is None
+
+def test_summary_runs_against_standin(app, cbs_standin):
+    client = Client(first_name="ישראל", last_name="כהן", tz="123456789",
+                    birth_date=date(1960, 5, 1), gender="male")
+    db.session.add(client)
+    db.session.flush()
+    db.session.add(Pension(client_id=client.id, payer_name="קרן", start_date=date(2027, 6, 1)))
+    for year in (1999, 2011, 2011):
+        db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=50000,
+                             work_start_date=date(year - 10, 1, 1), work_end_date=date(year, 12, 31)))
+    db.session.commit()
+
+    summary = calculate_summary(client.id)
+    assert summary["details"]["grants_count"] == 3
+    assert summary["grants_indexed_full"] > summary["grants_nominal"]
+    # שני מענקים עם אותו חודש סיום - פנייה אחת ללמ"ס לכל זוג חודשים
+    assert cbs_standin.requests == 2
@@ -0,0 +1,64 @@
+from datetime import date
+from sqlalchemy import text
+from app.models import db, Client, ClientSummary
+
+def _add_clients():
+    names = [("אבי", "כהן"), ("בני", "לוי"), ("כרמית", "אברהם"), ("דנה", "כהנא"), ("יוסי", "מזרחי")]
+    ids = []
+    for i, (first, last) in enumerate(names):
+        client = Client(first_name=first, last_name=last, tz=f"{i + 1:09d}", birth_date=date(1960 + i, 1, 1),
+                        phone="050", gender="male")
+        db.session.add(client)
+        db.session.flush()
+        ids.append(client.id)
+    db.session.add(ClientSummary(client_id=ids[1], eligibility_date=date(2027, 5, 1)))
+    db.session.add(ClientSummary(client_id=ids[2], eligibility_date=date(2028, 1, 1)))
+    db.session.commit()
+    return ids
+
+def test_keyset_pages_cover_all_clients(app):
+    ids = _add_clients()
+    http = app.test_client()
+    seen, cursor = [], None
+    while True:
+        resp = http.get("/api/clients", query_string={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        seen.extend(row["id"] for row in resp.get_json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == ids
+    # ללא limit - כל הרשימה עם השדות הקודמים
+    rows = http.get("/api/clients").get_json()
+    assert len(rows) == 5 and set(rows[0]) == {"id", "first_name", "last_name", "tz", "birth_date", "phone", "address"}
+
+def test_projection_and_filters(app):
+    ids = _add_clients()
+    http = app.test_client()
+    assert http.get("/api/clients?fields=last_name").get_json()[0] == {"id": ids[0], "last_name": "כהן"}
+    assert http.get("/api/clients?fields=salary").status_code == 400
+    assert [r["id"] for r in http.get("/api/clients?name=כ&fields=id").get_json()] == [ids[0], ids[2], ids[3]]
+    assert [r["id"] for r in http.get("/api/clients?tz=000000002").get_json()] == [ids[1]]
+    assert [r["id"] for r in http.get("/api/clients?tz=2").get_json()] == [ids[1]]
+    assert http.get("/api/clients?tz=12-34").status_code == 400
+    assert [r["id"] for r in http.get("/api/clients?eligibility_year=2028").get_json()] == [ids[2]]
+    assert http.get("/api/clients?limit=0").status_code == 400
+
+def test_filters_use_indexes(app):
+    plan = lambda sql: " ".join(str(row[-1]) for row in db.session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+    assert "ix_client_tz" in plan("SELECT id FROM client WHERE tz = '1'")
+    name_plan = plan("SELECT id FROM client WHERE (first_name >= 'כ' AND first_name < 'כ\U0010ffff') "
+                     "OR (last_name >= 'כ' AND last_name < 'כ\U0010ffff')")
+    assert "ix_client_first_name" in name_plan and "ix_client_last_name" in name_plan
+    assert "ix_client_summary_eligibility_date" in plan(
+        "SELECT client_id FROM client_summary WHERE eligibility_date BETWEEN '2028-01-01' AND '2028-12-31'")
+
+def test_tz_is_normalized_like_bulk_import(app):
+    http = app.test_client()
+    created = http.post("/api/clients", json={"first_name": "א", "last_name": "ב", "tz": " 12345678 ",
+                                              "birth_date": "1960-01-01", "gender": "male"})
+    assert created.status_code == 201
+    assert http.get(f"/api/clients/{created.get_json()['id']}").get_json()["tz"] == "012345678"
+    duplicate = http.post("/api/clients", json={"first_name": "ג", "last_name": "ד", "tz": "012345678",
+                                                "birth_date": "1960-01-01", "gender": "male"})
+    assert duplicate.status_code == 409
+    assert http.put(f"/api/clients/{created.get_json()['id']}", json={"tz": "abc"}).status_code == 400
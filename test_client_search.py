@@ -0,0 +1,55 @@
+from datetime import date
+from sqlalchemy import text
+from app.models import db, Client
+from app.client_search import build_match_query, ensure_search_index
+from app.repository import delete_client_graph
+
+def _add(first_name, last_name, tz=None, phone=None):
+    client = Client(first_name=first_name, last_name=last_name, tz=tz, phone=phone, birth_date=date(1960, 1, 1))
+    db.session.add(client)
+    db.session.commit()
+    return client.id
+
+def _search(http, q):
+    return [row["id"] for row in http.get("/api/clients/search", query_string={"q": q}).get_json()]
+
+def test_search_hebrew_english_tz_and_phone(app):
+    http = app.test_client()
+    moshe = _add("מֹשֶׁה", "כהן", tz="012345678", phone="050-1234567")
+    george = _add("ג'ורג'", "Levi-Cohen", tz="987654321")
+    _add("דוד", "כהנא")
+
+    assert _search(http, "משה") == [moshe]           # ניקוד מוסר
+    assert _search(http, "ג'ור") == [george]         # גרש הוא חלק מהמילה
+    assert set(_search(http, "כה")) == {moshe, george + 1}
+    assert _search(http, "כהן מש") == [moshe]        # כל המילים
+    assert _search(http, "coh") == [george]
+    assert _search(http, "0123") == [moshe]
+    assert _search(http, "0501234567") == [moshe]
+    assert _search(http, '"') == []
+    assert _search(http, "") == []
+
+def test_index_follows_updates_and_bulk_deletes(app):
+    http = app.test_client()
+    client_id = _add("רחל", "לוי")
+    assert http.put(f"/api/clients/{client_id}", json={"last_name": "מזרחי"}).status_code == 200
+    assert _search(http, "לוי") == [] and _search(http, "מזר") == [client_id]
+    delete_client_graph(client_id)
+    db.session.commit()
+    assert _search(http, "מזר") == []
+
+def test_unique_tz(app):
+    http = app.test_client()
+    _add("א", "ב", tz="111111111")
+    assert http.post("/api/clients", json={"first_name": "ג", "tz": "111111111"}).status_code == 409
+    # ת"ז ריקה נשמרת כ-NULL ולא מתנגשת
+    assert http.post("/api/clients", json={"first_name": "ד", "tz": ""}).status_code == 201
+    assert http.post("/api/clients", json={"first_name": "ה", "tz": ""}).status_code == 201
+
+def test_rebuild_when_out_of_sync(app):
+    client_id = _add("נועה", "פרץ")
+    db.session.execute(text("DELETE FROM client_search"))
+    db.session.commit()
+    ensure_search_index()
+    assert _search(app.test_client(), "נוע") == [client_id]
+    assert build_match_query('a"b  12-34') == '"a""b"* "1234"*'
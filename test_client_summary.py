@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+import pytest
+from config import Config
+from app import cpi
+from app.cpi import write_cpi_series
+from app.cbs_standin import synthetic_cpi_values
+from app.models import db, ClientSummary
+from app.utils import calculate_summary
+from app.client_summary import rebuild_summaries, SUMMARY_FIELDS
+
+@pytest.fixture
+def http(app, local_cpi):
+    yield app.test_client()
+
+def _new_client(http):
+    cid = http.post("/api/clients", json={"first_name": "ישראל", "last_name": "כהן",
+                                          "birth_date": "1960-05-01", "gender": "male"}).get_json()["id"]
+    pension = http.post(f"/api/clients/{cid}/pensions", json={"payer_name": "קרן", "start_date": "2025-06-01"}).get_json()
+    http.post(f"/api/clients/{cid}/grants", json={"employer_name": "א", "grant_amount": 50000,
+                                                  "work_start_date": "1985-01-01", "work_end_date": "2000-12-31"})
+    return cid, pension["id"]
+
+def _assert_matches_full_recompute(http, cid):
+    stored = http.get(f"/api/clients/{cid}/summary").get_json()
+    full = calculate_summary(cid)
+    for field in SUMMARY_FIELDS:
+        assert stored[field] == pytest.approx(full[field], abs=0.02), field
+
+def test_mutations_apply_deltas(http):
+    cid, pension_id = _new_client(http)
+    _assert_matches_full_recompute(http, cid)
+    updated_at = db.session.get(ClientSummary, cid).updated_at
+
+    grant = http.post(f"/api/clients/{cid}/grants", json={"employer_name": "ב", "grant_amount": 30000,
+                                                          "work_start_date": "2005-01-01",
+                                                          "work_end_date": "2015-06-30"}).get_json()
+    assert db.session.get(ClientSummary, cid).updated_at > updated_at
+    _assert_matches_full_recompute(http, cid)
+
+    comm = http.post(f"/api/pensions/{pension_id}/commutations", json={"amount": 40000}).get_json()
+    http.post(f"/api/pensions/{pension_id}/commutations", json={"amount": 99999, "include_calc": False})
+    http.post(f"/api/clients/{cid}/reserve-grant", json={"reserved_grant_amount": 10000})
+    _assert_matches_full_recompute(http, cid)
+
+    http.delete(f"/api/grants/{grant['id']}")
+    http.delete(f"/api/commutations/{comm['id']}")
+    _assert_matches_full_recompute(http, cid)
+
+def test_list_and_bulk_rebuild_on_new_cpi(http):
+    first, _ = _new_client(http)
+    second, _ = _new_client(http)
+    assert rebuild_summaries() == 2
+    assert [row["client_id"] for row in http.get("/api/client-summaries").get_json()] == [first, second]
+    assert rebuild_summaries() == 0
+
+    write_cpi_series(synthetic_cpi_values(end_year=2027), Config.CPI_SERIES_PATH)
+    cpi.reset_cpi_series()
+    assert rebuild_summaries() == 2
+
+def test_today_derived_row_is_rebuilt_on_another_day(http):
+    cid = http.post("/api/clients", json={"first_name": "רחל", "last_name": "לוי",
+                                          "birth_date": "1950-05-01", "gender": "female"}).get_json()["id"]
+    with_pension, _ = _new_client(http)
+    assert rebuild_summaries() == 2
+    row = db.session.get(ClientSummary, cid)
+    assert row.eligibility_basis == date.today().isoformat()
+    assert db.session.get(ClientSummary, with_pension).eligibility_basis == "pension"
+
+    # שורה שנגזרה מיום קודם - נחשבת ישנה
+    row.eligibility_basis = (date.today() - timedelta(days=1)).isoformat()
+    db.session.commit()
+    assert rebuild_summaries() == 1
+    assert db.session.get(ClientSummary, cid).eligibility_basis == date.today().isoformat()
+
+def test_degraded_summary_is_not_stored(http, monkeypatch):
+    from app import indexation
+    cid, _ = _new_client(http)
+    real_index_grants = indexation.index_grants
+    monkeypatch.setattr(indexation, "index_grants", lambda requests, *a: [None] * len(requests))
+    resp = http.get(f"/api/clients/{cid}/summary")
+    assert resp.status_code == 503
+    assert db.session.get(ClientSummary, cid) is None
+    assert rebuild_summaries() == 0
+
+    monkeypatch.setattr(indexation, "index_grants", real_index_grants)
+    assert http.get(f"/api/clients/{cid}/summary").status_code == 200
@@ -0,0 +1,66 @@
+import pytest
+from datetime import date
+from config import Config
+from app import cpi
+from app.cpi import write_cpi_series, index_amount, get_cpi_vintage, month_key, month_label
+from app.indexation import index_grant
+from app.cbs_standin import synthetic_cpi_values
+import refresh_cpi
+
+@pytest.fixture
+def cpi_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "cpi.json")
+    monkeypatch.setattr(Config, "CPI_SERIES_PATH", path)
+    write_cpi_series({"2000-01": 50.0, "2000-02": 55.0, "2010-06": 80.0, "2025-05": 100.0}, path)
+    yield path
+    cpi.reset_cpi_series()
+
+def test_month_key_roundtrip():
+    assert month_label(month_key("2011-10-01")) == "2011-10"
+    assert month_key(date(2011, 10, 31)) == month_key("2011-10")
+
+def test_index_amount_uses_month_ratio(cpi_file):
+    assert index_amount(1000, "2000-01-15", date(2010, 6, 1)) == 1600.0
+    assert index_amount(1000, "2000-02-28", "2025-05-31") == round(1000 * 100 / 55, 2)
+
+def test_unpublished_target_month_uses_latest_index(cpi_file):
+    assert index_amount(1000, "2000-01-01", "2030-01-01") == 2000.0
+    assert get_cpi_vintage() == "2025-05"
+
+def test_month_before_series_is_not_covered(cpi_file):
+    assert index_amount(1000, "1999-12-31", "2025-05-01") is None
+
+def test_index_grant_uses_local_series(cpi_file):
+    assert index_grant(1000, "1990-01-01", "2000-01-31", "2025-05-01") == 2000.0
+
+def _publish_until(standin, month):
+    """הלמ"ס המדומה פרסם מדדים עד החודש הנתון (כולל)"""
+    standin.series = cpi.CPISeries({k: v for k, v in synthetic_cpi_values(2015, 2026).items() if k <= month})
+
+def test_incremental_refresh_matches_full_rebuild(cbs_standin, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CPI_SERIES_PATH", str(tmp_path / "cpi.json"))
+    _publish_until(cbs_standin, "2025-03")
+    refresh_cpi.refresh_cpi_series("2015-01", today=date(2025, 5, 5))
+
+    # בין שני הרענונים פורסמו אפריל ומאי
+    _publish_until(cbs_standin, "2025-05")
+    refresh_cpi.refresh_cpi_series(incremental=True, today=date(2025, 6, 20))
+    incremental = cpi.CPISeries.from_file(Config.CPI_SERIES_PATH)
+
+    refresh_cpi.refresh_cpi_series("2015-01", today=date(2025, 6, 20))
+    full = cpi.CPISeries.from_file(Config.CPI_SERIES_PATH)
+    assert incremental.values.keys() == full.values.keys()
+    assert all(incremental.values[key] == pytest.approx(full.values[key], rel=1e-6) for key in full.values)
+    assert incremental.factor("2021-01-01", "2025-06-20") == pytest.approx(
+        cbs_standin.series.factor("2021-01-01", "2025-06-20"), rel=1e-6)
+
+def test_vintage_is_last_published_month(cbs_standin, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "CPI_SERIES_PATH", str(tmp_path / "cpi.json"))
+    _publish_until(cbs_standin, "2025-04")
+    refresh_cpi.refresh_cpi_series("2024-01", today=date(2025, 6, 10))
+    assert get_cpi_vintage() == "2025-04"
+
+    # מדד מאי פורסם באמצע יוני - רענון באותו חודש מחליף את הגרסה
+    _publish_until(cbs_standin, "2025-05")
+    refresh_cpi.refresh_cpi_series(incremental=True, today=date(2025, 6, 20))
+    assert get_cpi_vintage() == "2025-05"
@@ -0,0 +1,127 @@
+import io
+import zipfile
+from datetime import date
+from pathlib import Path
+import pytest
+from config import Config
+from app import documents, document_cache
+from app.models import db, Client, Grant, Pension
+
+PACKAGES_DIR = Path(__file__).parent / "packages"
+
+@pytest.fixture
+def client_id(app, local_cpi):
+
+    client = Client(first_name="ישראל", last_name="כהן", birth_date=date(1960, 5, 1), gender="male")
+    db.session.add(client)
+    db.session.flush()
+    db.session.add(Pension(client_id=client.id, payer_name="קרן", start_date=date(2025, 6, 1)))
+    db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=50000,
+                         work_start_date=date(1990, 1, 1), work_end_date=date(2005, 12, 31)))
+    db.session.commit()
+    yield client.id
+
+def _package_dirs(client_id):
+    return list(PACKAGES_DIR.glob(f"*_{client_id}")) if PACKAGES_DIR.exists() else []
+
+def test_download_streams_from_memory(app, client_id):
+    http = app.test_client()
+    resp = http.get(f"/download-pdf/161d/{client_id}")
+    assert resp.status_code == 200 and resp.data.startswith(b"%PDF")
+
+    resp = http.get(f"/download-pdf/grants/{client_id}")
+    assert resp.status_code == 200
+    assert "מעסיק" in resp.data.decode("utf-8") or resp.data.startswith(b"%PDF")
+
+    assert http.get(f"/download-pdf/commutations/{client_id}").status_code == 404
+    assert http.get(f"/download-pdf/other/{client_id}").status_code == 400
+    assert _package_dirs(client_id) == []
+
+def test_package_zip(app, client_id):
+    resp = app.test_client().get(f"/api/clients/{client_id}/package")
+    assert resp.status_code == 200 and resp.mimetype == "application/zip"
+    names = zipfile.ZipFile(io.BytesIO(resp.data)).namelist()
+    assert names[0] == "161d.pdf" and names[1].startswith("grants_appendix.")
+    assert len(names) == 2
+    assert _package_dirs(client_id) == []
+
+def test_archive_package(app, client_id, tmp_path):
+    files = documents.archive_package(documents.render_package(client_id), tmp_path / "pkg")
+    assert sorted(path.name for path in (tmp_path / "pkg").iterdir()) == sorted(files)
+    assert (tmp_path / "pkg" / "161d.pdf").read_bytes().startswith(b"%PDF")
+
+def test_unchanged_inputs_served_from_cache(app, client_id, monkeypatch):
+    rendered = []
+    real_render = documents._render
+    monkeypatch.setattr(documents, "_render", lambda *a: rendered.append(a) or real_render(*a))
+
+    first = documents.render_document("161d", client_id)
+    assert documents.render_document("161d", client_id) is first
+    assert len(rendered) == 1
+
+    # שינוי בכל אחד מהקלטים מפיק את המסמך מחדש
+    client = db.session.get(Client, client_id)
+    client.phone = "050-1234567"
+    db.session.commit()
+    assert documents.render_document("161d", client_id) is not first
+    grant = Grant.query.filter_by(client_id=client_id).one()
+    grant.grant_amount = 60000
+    db.session.commit()
+    documents.render_document("161d", client_id)
+    assert len(rendered) == 3
+
+    documents.render_document("grants", client_id)
+    documents.render_document("grants", client_id)
+    assert len(rendered) == 4
+    assert document_cache.stats()["hits"] == 2
+
+def test_cache_bounded_by_bytes(monkeypatch):
+    document_cache.clear_document_cache()
+    monkeypatch.setattr(Config, "DOCUMENT_CACHE_BYTES", 100)
+    document_cache.put_document("a", "A", 60)
+    document_cache.put_document("b", "B", 30)
+    assert document_cache.get_document("a") == "A"
+    document_cache.put_document("c", "C", 40)  # מפנה את b - הכי פחות בשימוש
+    assert document_cache.get_document("b") is None
+    document_cache.put_document("huge", "H", 101)
+    assert document_cache.get_document("huge") is None
+    assert document_cache.stats()["bytes"] == 100
+
+def test_generate_161d_streams_without_writing(app, client_id, monkeypatch):
+    from app.pdf_fillers import form161d
+    monkeypatch.setattr(form161d, "_safe_write", lambda *a: pytest.fail("161d written to disk"))
+    resp = app.test_client().post("/api/generate-161d", json={"client_id": client_id})
+    assert resp.status_code == 200 and resp.mimetype == "application/pdf"
+    assert resp.data.startswith(b"%PDF")
+    assert app.test_client().post("/api/generate-161d", json={"client_id": 10**6}).status_code == 404
+    assert _package_dirs(client_id) == []
+
+def test_html_fallback_is_not_cached(app, client_id, monkeypatch):
+    from app import pdf_filler
+    monkeypatch.setattr(pdf_filler, "wkhtmltopdf_path", "/usr/bin/wkhtmltopdf")
+    monkeypatch.setattr(pdf_filler, "html_to_pdf_many", lambda jobs: [None] * len(jobs))
+    first = documents.render_document("grants", client_id)
+    assert first.mimetype == "text/html"
+    assert documents.render_document("grants", client_id) is not first
+    assert document_cache.stats()["size"] == 0
+
+    monkeypatch.setattr(pdf_filler, "html_to_pdf_many", lambda jobs: [b"%PDF-1.4 stub"] * len(jobs))
+    pdf = documents.render_document("grants", client_id)
+    assert pdf.mimetype == "application/pdf"
+    assert documents.render_document("grants", client_id) is pdf
+
+def test_generate_appendix_routes_render_once_without_writing(app, client_id, monkeypatch):
+    from app import pdf_filler
+    # בלי wkhtmltopdf ה-HTML הוא התוצר ונשמר במטמון
+    monkeypatch.setattr(pdf_filler, "wkhtmltopdf_path", None)
+    monkeypatch.setattr(pdf_filler, "pdfkit_config", None)
+    rendered = []
+    real_render = documents._render
+    monkeypatch.setattr(documents, "_render", lambda *a: rendered.append(a) or real_render(*a))
+    http = app.test_client()
+    resp = http.post("/api/generate-grants-appendix", json={"client_id": client_id})
+    assert resp.status_code == 200
+    assert http.get(resp.get_json()["download_url"]).status_code == 200
+    assert http.post("/api/generate-commutations-appendix", json={"client_id": client_id}).status_code == 404
+    assert _package_dirs(client_id) == []
+    assert [doc_types for doc_types, _ in rendered].count(["grants"]) == 1
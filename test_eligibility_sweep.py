@@ -0,0 +1,67 @@
+from datetime import date
+import pytest
+from app.models import db, Client, Grant, Pension, Commutation
+from app.engine import add_months
+from app.utils import calculate_summary, calculate_eligibility_sweep
+
+@pytest.fixture
+def client_id(app, local_cpi):
+
+    client = Client(first_name="ישראל", last_name="כהן", birth_date=date(1958, 8, 31), gender="male",
+                    reserved_grant_amount=20000)
+    db.session.add(client)
+    db.session.flush()
+    pension = Pension(client_id=client.id, payer_name="קרן", start_date=date(2025, 1, 1))
+    db.session.add(pension)
+    db.session.flush()
+    db.session.add(Commutation(pension_id=pension.id, amount=30000, include_calc=True))
+    for start, end, amount in ((1980, 1999, 120000), (1992, 2004, 80000), (2005, 2020, 150000)):
+        db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=amount,
+                             work_start_date=date(start, 3, 1), work_end_date=date(end, 8, 31)))
+    db.session.add(Grant(client_id=client.id, employer_name="ללא תאריכים", grant_amount=5000))
+    db.session.commit()
+    yield client.id
+
+def test_add_months_clamps_day():
+    assert add_months(date(2025, 1, 31), 1) == date(2025, 2, 28)
+    assert add_months(date(2024, 12, 15), 14) == date(2026, 2, 15)
+
+def test_sweep_matches_individual_summaries(client_id):
+    sweep = calculate_eligibility_sweep(client_id, "2024-06-30", "2027-06-30", step_months=3)
+    assert len(sweep["points"]) == 13
+    for point in sweep["points"]:
+        summary = calculate_summary(client_id, point["eligibility_date"])
+        assert point["remaining_cap"] == summary["remaining_cap"]
+        assert point["pension_exempt"] == summary["pension_exempt"]
+        assert point["pension_rate"] == summary["pension_rate"]
+    assert sweep["best"]["pension_exempt"] == max(p["pension_exempt"] for p in sweep["points"])
+
+def test_sweep_endpoint_defaults_and_validation(app, client_id):
+    http = app.test_client()
+    resp = http.post(f"/api/clients/{client_id}/eligibility-sweep", json={})
+    assert resp.status_code == 200
+    points = resp.get_json()["points"]
+    # ברירת מחדל: מתאריך הזכאות המחושב ו-60 חודשים קדימה
+    assert len(points) == 61 and points[0]["eligibility_date"] == "2025-08-31"
+
+    resp = http.post(f"/api/clients/{client_id}/eligibility-sweep", json={"from": "2025-01-01", "to": "2024-01-01"})
+    assert resp.status_code == 400
+
+def test_sweep_reports_missing_factors(client_id, monkeypatch):
+    from app import indexation
+    real_factors = indexation.get_indexation_factors
+
+    def without_late_factors(pairs, *a, **kw):
+        # המקדם של המענק הראשון (סיום 1999-08) חסר לתאריכים מ-2026
+        return {key: None if key[0] == "1999-08" and key[1] >= "2026-01" else factor
+                for key, factor in real_factors(pairs, *a, **kw).items()}
+
+    monkeypatch.setattr(indexation, "get_indexation_factors", without_late_factors)
+    sweep = calculate_eligibility_sweep(client_id, "2024-06-30", "2027-06-30", step_months=3)
+    grant_id = Grant.query.filter_by(client_id=client_id, work_end_date=date(1999, 8, 31)).one().id
+    for point in sweep["points"]:
+        expected = [grant_id] if point["eligibility_date"] >= "2026-01" else []
+        assert point["indexation_failures"] == expected
+    complete = [p for p in sweep["points"] if not p["indexation_failures"]]
+    assert sweep["best"]["pension_exempt"] == max(p["pension_exempt"] for p in complete)
+    assert sweep["best"]["eligibility_date"] < "2026-01"
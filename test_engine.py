@@ -0,0 +1,68 @@
+from datetime import date
+import pytest
+from app.engine import (
+    ClientInput, GrantInput, CommutationInput, Caps,
+    window_ratio, compute_grant, compute_summary, resolve_eligibility_date,
+    max_reserved_grant, pension_for_reserved_grant
+)
+
+ELIG = date(2025, 1, 1)
+
+def test_window_ratio_clamps_to_32_year_window():
+    # כולו בתוך החלון
+    assert window_ratio(date(2000, 1, 1), date(2010, 1, 1), ELIG) == 1
+    # כולו לפני החלון
+    assert window_ratio(date(1970, 1, 1), date(1980, 1, 1), ELIG) == 0
+    # תאריכים הפוכים
+    assert window_ratio(date(2010, 1, 1), date(2000, 1, 1), ELIG) == 0
+    # חלקי - עבודה שחוצה את תחילת החלון
+    ratio = window_ratio(date(1983, 1, 1), date(2003, 1, 1), ELIG)
+    assert 0 < ratio < 1
+
+def test_compute_grant_impact_is_limited_times_multiplier():
+    grant = GrantInput(1, 100_000, date(1983, 1, 1), date(2003, 1, 1))
+    result = compute_grant(grant, ELIG, 150_000)
+    assert result.indexed_limited == pytest.approx(150_000 * result.ratio)
+    assert result.impact == pytest.approx(result.indexed_limited * 1.35)
+    assert result.relevant_nominal == pytest.approx(100_000 * result.ratio)
+    # הצמדה שנכשלה - אין תוצאה
+    assert compute_grant(grant, ELIG, None) is None
+
+def test_compute_summary_matches_formula():
+    client = ClientInput(7, "ישראל", "ישראלי", date(1958, 1, 1), "male", reserved_grant_amount=10_000)
+    grants = [
+        GrantInput(1, 100_000, date(2000, 1, 1), date(2010, 1, 1)),
+        GrantInput(2, 50_000, date(2005, 1, 1), date(2015, 1, 1)),
+    ]
+    commutations = [CommutationInput(1, 20_000), CommutationInput(2, 99_999, include_calc=False)]
+    caps = Caps(exempt_cap=900_000, monthly_cap=9_000)
+
+    summary = compute_summary(client, grants, commutations, ELIG, {1: 120_000, 2: 60_000}, caps)
+
+    assert summary.grants_nominal == 150_000
+    assert summary.grants_indexed_limited == 180_000
+    assert summary.grants_impact == pytest.approx(180_000 * 1.35)
+    assert summary.commutations_total == 20_000
+    expected_remaining = 900_000 - 180_000 * 1.35 - 20_000 - 10_000 * 1.35
+    assert summary.remaining_cap == pytest.approx(expected_remaining)
+    assert summary.pension_exempt == pytest.approx(expected_remaining / 180)
+
+    result = summary.to_dict()
+    assert result["grants_indexed"] == result["grants_indexed_limited"]
+    assert result["details"] == {"grants_count": 2, "commutations_count": 1}
+
+def test_resolve_eligibility_date():
+    client = ClientInput(1, "a", "b", date(1960, 5, 10), "female")
+    assert resolve_eligibility_date(client, date(2020, 1, 1)) == date(2022, 5, 10)
+    assert resolve_eligibility_date(client, date(2024, 1, 1)) == date(2024, 1, 1)
+    assert resolve_eligibility_date(client, eligibility_date="2023-03-01T00:00:00") == date(2023, 3, 1)
+
+def test_reserved_grant_solver_round_trip():
+    base = (800_000, 135_000, 40_000)
+    reserved = max_reserved_grant(*base, target_pension=2_000)
+    _, pension, _ = pension_for_reserved_grant(base[0], 9_430, base[1], base[2], reserved)
+    assert pension >= 2_000
+    _, pension_above, _ = pension_for_reserved_grant(base[0], 9_430, base[1], base[2], reserved + 0.01)
+    assert pension_above < 2_000
+    # יעד שאינו בר השגה גם ללא שריון
+    assert max_reserved_grant(*base, target_pension=5_000) < 0
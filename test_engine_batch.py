@@ -0,0 +1,55 @@
+import random
+from datetime import date, timedelta
+import numpy as np
+from app.engine import GrantInput, window_ratio, compute_grant
+from app.engine_batch import compute_grants, compute_grant_inputs, round_cents, to_ordinals, window_ratios
+
+def _random_grants(count, seed=1):
+    rnd = random.Random(seed)
+    grants, indexed, eligs = [], {}, []
+    for i in range(count):
+        start = date(1960, 1, 1) + timedelta(days=rnd.randint(0, 20000))
+        end = start + timedelta(days=rnd.randint(-30, 15000))
+        grants.append(GrantInput(i, round(rnd.uniform(1, 900_000), 2), start, end))
+        indexed[i] = round(rnd.uniform(1, 2_000_000), 2)
+        eligs.append(date(2015, 1, 1) + timedelta(days=rnd.randint(0, 4000)))
+    return grants, indexed, eligs
+
+def test_window_ratios_match_scalar_exactly():
+    grants, _, eligs = _random_grants(5000)
+    ratios = window_ratios(
+        to_ordinals([g.work_start_date for g in grants]),
+        to_ordinals([g.work_end_date for g in grants]),
+        to_ordinals(eligs),
+    )
+    expected = [window_ratio(g.work_start_date, g.work_end_date, e) for g, e in zip(grants, eligs)]
+    assert ratios.tolist() == expected
+
+def test_compute_grant_inputs_match_scalar_exactly():
+    grants, indexed, _ = _random_grants(3000, seed=2)
+    grants.append(GrantInput(9001, 0, date(2000, 1, 1), date(2001, 1, 1)))
+    grants.append(GrantInput(9002, 100, None, date(2001, 1, 1)))
+    grants.append(GrantInput(9003, 100, date(2000, 1, 1), date(2001, 1, 1)))  # הצמדה נכשלה
+    elig = date(2025, 1, 1)
+
+    batch = compute_grant_inputs(grants, elig, indexed)
+
+    for i, grant in enumerate(grants):
+        result = compute_grant(grant, elig, indexed.get(grant.id))
+        if result is None:
+            assert not batch.valid[i]
+            continue
+        assert batch.valid[i]
+        assert batch.ratio[i] == result.ratio
+        assert batch.indexed_limited[i] == result.indexed_limited
+        assert batch.impact[i] == result.impact
+        assert batch.relevant_nominal[i] == result.relevant_nominal
+
+def test_factors_are_rounded_like_python():
+    rnd = random.Random(3)
+    amounts = np.array([rnd.uniform(1, 1_000_000) for _ in range(20000)] + [1.005, 2.675, 0.125])
+    factors = np.array([rnd.uniform(0.8, 3.5) for _ in range(20000)] + [1.0, 1.0, 1.0])
+    assert round_cents(amounts * factors).tolist() == [round(float(a) * float(f), 2) for a, f in zip(amounts, factors)]
+
+    batch = compute_grants(amounts[:2], [730120, 730120], [733773, 733773], 739252, factors=factors[:2])
+    assert batch.indexed_full.tolist() == [round(float(a) * float(f), 2) for a, f in zip(amounts[:2], factors[:2])]
@@ -0,0 +1,51 @@
+import csv
+import io
+import json
+from datetime import date
+import pytest
+from app.models import db, Client, Grant, Pension
+from app.client_summary import rebuild_client_summary
+from app.utils import calculate_summary
+
+@pytest.fixture
+def client_ids(app, local_cpi):
+
+    ids = []
+    for i in range(3):
+        client = Client(first_name=f"לקוח {i}", last_name="כהן", birth_date=date(1958 + i, 4, 1), gender="male")
+        db.session.add(client)
+        db.session.flush()
+        ids.append(client.id)
+        db.session.add(Pension(client_id=client.id, payer_name="קרן", start_date=date(2025, 2, 1)))
+        db.session.add(Grant(client_id=client.id, employer_name="מעסיק, בע\"מ", grant_amount=40000.0 * (i + 1),
+                             work_start_date=date(1990, 1, 1), work_end_date=date(2010, 7, 31)))
+    db.session.flush()
+    # לראשון יש סיכום שמור, לשאר לא
+    rebuild_client_summary(ids[0])
+    db.session.commit()
+    yield ids
+
+def test_export_clients_ndjson_mixes_stored_and_computed(app, client_ids):
+    resp = app.test_client().get("/api/export/clients")
+    assert resp.status_code == 200 and resp.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [row["id"] for row in rows] == client_ids
+    assert [row["summary_source"] for row in rows] == ["stored", "computed", "computed"]
+    for row in rows:
+        summary = calculate_summary(row["id"])
+        assert row["remaining_cap"] == round(summary["remaining_cap"], 2)
+        assert row["eligibility_date"] == summary["client_info"]["eligibility_date"]
+
+def test_export_csv_and_grants(app, client_ids):
+    http = app.test_client()
+    resp = http.get("/api/export/clients?format=csv&fresh=1")
+    assert resp.mimetype == "text/csv"
+    text = resp.get_data(as_text=True)
+    assert text.startswith("\ufeff")
+    rows = list(csv.DictReader(io.StringIO(text[1:])))
+    assert len(rows) == 3 and {row["summary_source"] for row in rows} == {"computed"}
+
+    rows = list(csv.DictReader(io.StringIO(http.get("/api/export/grants?format=csv").get_data(as_text=True)[1:])))
+    assert [row["employer_name"] for row in rows] == ['מעסיק, בע"מ'] * 3
+    assert http.get("/api/export/pensions").status_code == 404
+    assert http.get("/api/export/grants?format=xml").status_code == 400
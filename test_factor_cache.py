@@ -0,0 +1,80 @@
+import pytest
+from datetime import date
+from config import Config
+from app import cpi, factor_cache, indexation
+from app.cpi import write_cpi_series
+
+@pytest.fixture
+def cache_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "INDEXATION_CACHE_PATH", str(tmp_path / "factors.db"))
+    monkeypatch.setattr(Config, "CPI_SERIES_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(factor_cache, "_seen_vintage", None)
+    monkeypatch.setattr(factor_cache, "_next_probe", 0.0)
+    cpi.reset_cpi_series()
+    yield tmp_path
+    cpi.reset_cpi_series()
+
+def test_network_factor_is_fetched_once(cache_db, monkeypatch):
+    calls = []
+
+    def fake_fetch(end_work_date, to_date):
+        calls.append((end_work_date, to_date))
+        return 1.25
+
+    monkeypatch.setattr(indexation, "fetch_cbs_factor", fake_fetch)
+    assert indexation.calculate_adjusted_amount(1000, "2010-03-05", "2025-01-01") == 1250.0
+    # אותו זוג חודשים עם סכום ותאריכים אחרים - מהמטמון
+    assert indexation.calculate_adjusted_amount(400, "2010-03-31", "2025-01-20") == 500.0
+    assert len(calls) == 1
+
+def test_expired_factor_is_ignored(cache_db, monkeypatch):
+    factor_cache.put_factor("2010-03", "2025-01", 1.25)
+    monkeypatch.setattr(Config, "INDEXATION_CACHE_TTL", -1)
+    assert factor_cache.get_factor("2010-03", "2025-01") is None
+
+def test_new_cpi_month_invalidates_clamped_factors(cache_db, monkeypatch):
+    series_path = str(cache_db / "cpi.json")
+    monkeypatch.setattr(Config, "CPI_SERIES_PATH", series_path)
+    write_cpi_series({"2024-12": 99.0, "2025-01": 100.0}, series_path)
+    factor_cache.put_factor("2010-03", "2025-01", 1.25)
+    factor_cache.put_factor("2010-03", "2025-03", 1.25)
+    assert factor_cache.get_factor("2010-03", "2025-03") == 1.25
+
+    write_cpi_series({"2024-12": 99.0, "2025-01": 100.0, "2025-02": 100.5}, series_path)
+    assert factor_cache.get_factor("2010-03", "2025-03") is None
+    assert factor_cache.get_factor("2010-03", "2025-01") == 1.25
+
+def test_new_cbs_index_invalidates_recent_factors_without_local_series(cache_db, monkeypatch):
+    monkeypatch.setattr(Config, "CPI_LOCAL_ENGINE", False)
+    probes = [1.50]
+    monkeypatch.setattr(indexation, "fetch_cbs_factor", lambda end_work_date, to_date: probes[-1])
+    this_month = date.today().isoformat()[:7]
+    factor_cache.put_factor("2010-03", this_month, 1.25)
+    factor_cache.put_factor("2010-03", "2025-01", 1.25)
+    assert factor_cache.get_factor("2010-03", this_month) == 1.25
+
+    # בתוך מרווח הבדיקה - אין פנייה נוספת גם אם המדד השתנה
+    probes.append(1.51)
+    assert factor_cache.get_factor("2010-03", this_month) == 1.25
+
+    monkeypatch.setattr(factor_cache, "_next_probe", 0.0)
+    monkeypatch.setattr(Config, "CPI_VINTAGE_CHECK_SECONDS", 0)
+    assert factor_cache.get_factor("2010-03", this_month) is None
+    assert factor_cache.get_factor("2010-03", "2025-01") == 1.25
+
+def test_index_grants_deduplicates_month_pairs(cache_db, monkeypatch):
+    calls = []
+
+    def fake_fetch(end_work_date, to_date):
+        calls.append(end_work_date[:7])
+        return {"2010-03": 1.5, "2012-07": 1.2}.get(end_work_date[:7])
+
+    monkeypatch.setattr(indexation, "fetch_cbs_factor", fake_fetch)
+    results = indexation.index_grants([
+        {"amount": 100, "start_date": "2000-01-01", "end_work_date": "2010-03-01", "elig_date": "2025-01-01"},
+        {"amount": 200, "start_date": "2001-01-01", "end_work_date": "2012-07-15", "elig_date": "2025-01-01"},
+        {"amount": 300, "start_date": "2002-01-01", "end_work_date": "2010-03-20", "elig_date": "2025-01-31"},
+        {"amount": 400, "start_date": "2003-01-01", "end_work_date": "1999-01-01", "elig_date": "2025-01-01"},
+    ], max_workers=4)
+    assert results == [150.0, 240.0, 450.0, None]
+    assert sorted(calls) == ["1999-01", "2010-03", "2012-07"]
@@ -0,0 +1,121 @@
+import io
+import os
+import shutil
+from datetime import date
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from pdfrw import PdfDict, PdfReader, PdfWriter
+from app.models import db, Client, Pension, Grant
+from app.pdf_fillers import template as pdf_template
+from app.pdf_fillers.form161d import TEMPLATE_PATH, fill_161d
+
+@pytest.fixture
+def client_id(app, local_cpi):
+    pdf_template.reset_templates()
+
+    client = Client(first_name="ישראל", last_name="כהן", tz="123456782", birth_date=date(1960, 5, 1), gender="male")
+    db.session.add(client)
+    db.session.flush()
+    db.session.add(Pension(client_id=client.id, payer_name="קרן", start_date=date(2025, 6, 1)))
+    db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=50000,
+                         work_start_date=date(1990, 1, 1), work_end_date=date(2005, 12, 31)))
+    db.session.commit()
+    yield client.id
+    pdf_template.reset_templates()
+
+def _values(path):
+    return {field.T.to_unicode(): field.V.to_unicode()
+            for field in PdfReader(path).Root.AcroForm.Fields if field.V}
+
+def test_template_parsed_once(client_id, tmp_path, monkeypatch):
+    parsed = []
+    real_reader = pdf_template.PdfReader
+    monkeypatch.setattr(pdf_template, "PdfReader", lambda *a, **k: parsed.append(a) or real_reader(*a, **k))
+
+    first = fill_161d(client_id, out_dir=tmp_path / "a")
+    second = fill_161d(client_id, out_dir=tmp_path / "b")
+    assert len(parsed) == 1
+
+    values = _values(first)
+    assert values["ClientFirstName"] == "ישראל" and values["ClientID"] == "123456782"
+    assert values == _values(second)
+
+    # המילוי לא השאיר ערכים בתבנית המשותפת
+    template = pdf_template.get_template(TEMPLATE_PATH)
+    assert all(field.V is None for field, _ in template.fields.values())
+
+def test_template_reloaded_when_file_changes(tmp_path):
+    path = tmp_path / "161d.pdf"
+    shutil.copy(TEMPLATE_PATH, path)
+    template = pdf_template.get_template(path)
+    assert pdf_template.get_template(path) is template
+    os.utime(path, ns=(template.mtime_ns + 10**9, template.mtime_ns + 10**9))
+    assert pdf_template.get_template(path) is not template
+
+def test_field_map_covers_161d_fields():
+    fields = pdf_template.get_template(TEMPLATE_PATH).fields
+    assert len(fields) == 12
+    assert all(widgets for _, widgets in fields.values())
+
+def _xref_offsets(pdf_bytes, start):
+    section = pdf_bytes[start:pdf_bytes.index(b"trailer", start)].split(b"\n")[1:]
+    offsets, number = {}, None
+    for line in filter(None, (row.strip() for row in section)):
+        parts = line.split()
+        if len(parts) == 2:
+            number = int(parts[0])
+        else:
+            offsets[number] = int(parts[0])
+            number += 1
+    return offsets
+
+def test_incremental_update_appends_changed_objects(client_id):
+    template = pdf_template.get_template(TEMPLATE_PATH)
+    data = {"ClientFirstName": "ישראל", "Today": "01/01/2026", "unknown": "x"}
+    updated, pdf_bytes = template.fill_incremental(data)
+    assert updated == 2
+    assert pdf_bytes.startswith(template.data)
+    assert len(pdf_bytes) - len(template.data) < 4096
+
+    tail = pdf_bytes[len(template.data):]
+    assert f"/Prev {template.startxref}".encode() in tail
+    startxref = int(tail.rsplit(b"startxref", 1)[1].split()[0])
+    offsets = _xref_offsets(pdf_bytes, startxref)
+    assert offsets and all(pdf_bytes[offset:].startswith(b"%d 0 obj" % number) for number, offset in offsets.items())
+
+    # קורא PDF רואה את אותם ערכים כמו בכתיבה המלאה
+    full = template.fill(data)[1]
+    assert _values(io.BytesIO(pdf_bytes)) == _values(io.BytesIO(full))
+
+def test_download_161d_streams_without_writing(client_id, app, monkeypatch):
+    from app.pdf_fillers import form161d
+    monkeypatch.setattr(form161d, "_safe_write", lambda *a: pytest.fail("161d written to disk"))
+    resp = app.test_client().get(f"/api/clients/{client_id}/161d")
+    assert resp.status_code == 200 and resp.mimetype == "application/pdf"
+    assert resp.data.startswith(pdf_template.get_template(TEMPLATE_PATH).data)
+
+def test_incremental_update_with_direct_acroform(tmp_path):
+    # אותה תבנית, כשה-AcroForm הוא אובייקט ישיר בתוך ה-Catalog
+    reader = PdfReader(str(TEMPLATE_PATH))
+    acroform = PdfDict()
+    for key, value in reader.Root.AcroForm.items():
+        acroform[key] = value
+    reader.Root.AcroForm = acroform
+    path = tmp_path / "direct.pdf"
+    PdfWriter(str(path)).write(trailer=reader)
+
+    template = pdf_template.get_template(path)
+    updated, pdf_bytes = template.fill_incremental({"ClientFirstName": "ישראל", "Today": "01/01/2026"})
+    assert updated == 2 and pdf_bytes.startswith(template.data)
+    filled = PdfReader(fdata=pdf_bytes)
+    # ה-Catalog נכתב מחדש עם NeedAppearances
+    assert filled.Root.AcroForm.NeedAppearances == "true"
+    assert _values(io.BytesIO(pdf_bytes)) == {"ClientFirstName": "ישראל", "Today": "01/01/2026"}
+
+def test_concurrent_incremental_fills():
+    pdf_template.reset_templates()
+    template = pdf_template.get_template(TEMPLATE_PATH)
+    names = [f"לקוח {i}" for i in range(16)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda name: template.fill_incremental({"ClientFirstName": name})[1], names))
+    assert [_values(io.BytesIO(pdf))["ClientFirstName"] for pdf in results] == names
@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event
+from app.models import db, Client, Grant, Pension, Commutation
+from app.summary_cache import clear_summary_cache
+
+@pytest.fixture
+def http(app, local_cpi):
+    yield app.test_client()
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+def _client(pensions, commutations_per_pension, grants):
+    client = Client(first_name="ישראל", last_name="כהן", tz=None,
+                    birth_date=date(1960, 5, 1), gender="male")
+    db.session.add(client)
+    db.session.flush()
+    for i in range(pensions):
+        pension = Pension(client_id=client.id, payer_name=f"קרן {i}", start_date=date(2025 + i, 6, 1))
+        db.session.add(pension)
+        db.session.flush()
+        for j in range(commutations_per_pension):
+            db.session.add(Commutation(pension_id=pension.id, amount=1000 * (j + 1), include_calc=j % 2 == 0))
+    for i in range(grants):
+        db.session.add(Grant(client_id=client.id, employer_name=f"מעסיק {i}", grant_amount=10000 * (i + 1),
+                             work_start_date=date(1990 + i, 1, 1), work_end_date=date(2000 + i, 12, 31)))
+    db.session.commit()
+    client_id = client.id
+    db.session.expunge_all()
+    return client_id
+
+def _count(request):
+    clear_summary_cache()
+    db.session.expunge_all()
+    with count_queries() as statements:
+        resp = request()
+    assert resp.status_code == 200, resp.get_json()
+    return len(statements)
+
+@pytest.mark.parametrize("endpoint", ["summary", "pensions", "delete"])
+def test_query_count_does_not_grow_with_client_size(http, endpoint):
+    small = _client(pensions=1, commutations_per_pension=1, grants=1)
+    large = _client(pensions=4, commutations_per_pension=3, grants=6)
+
+    def request(client_id):
+        if endpoint == "summary":
+            return lambda: http.post("/api/calculate-exemption-summary", json={"client_id": client_id})
+        if endpoint == "pensions":
+            return lambda: http.get(f"/api/clients/{client_id}/pensions")
+        return lambda: http.delete(f"/api/clients/{client_id}")
+
+    small_count = _count(request(small))
+    large_count = _count(request(large))
+    assert small_count == large_count
+    assert large_count <= 12
@@ -0,0 +1,122 @@
+import re
+import sqlite3
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import create_engine, event, text
+from config import Config
+from app.models import db, Client, Grant, Pension, Commutation
+from app.migrations import MIGRATIONS, MigrationError, run_migrations
+from app.database import configure_sqlite
+
+@pytest.fixture
+def http(app, local_cpi):
+    yield app.test_client()
+
+@contextmanager
+def capture_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and re.match(r"\s*(SELECT|UPDATE|DELETE)", statement, re.I):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+def _full_scans(statement, parameters):
+    """טבלאות שהשאילתה סורקת במלואן (SCAN ללא אינדקס)"""
+    plan = db.session.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in plan
+            if re.match(r"SCAN ", row[-1]) and "USING" not in row[-1] and "VIRTUAL TABLE" not in row[-1]]
+
+def _seed():
+    for i in range(3):
+        client = Client(first_name=f"לקוח{i}", last_name="כהן", tz=f"{i:09d}", birth_date=date(1960, 5, 1), gender="male")
+        db.session.add(client)
+        db.session.flush()
+        pension = Pension(client_id=client.id, payer_name="קרן", start_date=date(2025, 6, 1))
+        db.session.add(pension)
+        db.session.flush()
+        db.session.add(Commutation(pension_id=pension.id, amount=10000, include_calc=True))
+        db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=50000,
+                             work_start_date=date(1990, 1, 1), work_end_date=date(2005, 12, 31)))
+    db.session.commit()
+    return client.id
+
+def test_hot_queries_use_indexes(http):
+    client_id = _seed()
+    with capture_statements() as statements:
+        http.post("/api/calculate-exemption-summary", json={"client_id": client_id})
+        http.get(f"/api/clients/{client_id}/summary")
+        http.get(f"/api/clients/{client_id}/pensions")
+        http.get(f"/api/clients/{client_id}/grants")
+        http.get("/api/clients?limit=2&cursor=1&fields=last_name")
+        http.get("/api/clients?name=כה&tz=000000001&eligibility_year=2027")
+        http.get("/api/clients/search?q=כהן")
+        grant = http.post(f"/api/clients/{client_id}/grants", json={
+            "employer_name": "ב", "grant_amount": 1000, "work_start_date": "2001-01-01", "work_end_date": "2002-01-01"
+        }).get_json()
+        http.delete(f"/api/grants/{grant['id']}")
+        http.delete(f"/api/clients/{client_id}")
+    assert len(statements) > 20
+
+    scans = {statement: found for statement, parameters in statements
+             if (found := _full_scans(statement, parameters))}
+    assert scans == {}
+
+def _old_schema(path):
+    """מסד כמו לפני המיגרציות - ללא האינדקסים"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE client (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, tz TEXT);
+        CREATE TABLE client_summary (client_id INTEGER PRIMARY KEY, eligibility_date DATE);
+        CREATE TABLE "grant" (id INTEGER PRIMARY KEY, client_id INTEGER);
+        CREATE TABLE pension (id INTEGER PRIMARY KEY, client_id INTEGER);
+        CREATE TABLE commutation (id INTEGER PRIMARY KEY, pension_id INTEGER, include_calc BOOLEAN);
+        CREATE INDEX ix_client_tz ON client (tz);
+        INSERT INTO client (tz) VALUES ('1'), (''), ('');
+    """)
+    conn.close()
+
+def _indexes(engine):
+    with engine.connect() as conn:
+        return set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'ix_%'")).scalars())
+
+def test_migrations_run_once_and_add_indexes(tmp_path):
+    _old_schema(tmp_path / "old.db")
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    assert run_migrations(engine, report=lambda _: None) == [m[0] for m in MIGRATIONS]
+    assert {"ix_grant_client_id", "ix_pension_client_id", "ix_commutation_pension_id_include_calc",
+            "ix_client_first_name", "ix_client_tz"} <= _indexes(engine)
+    assert run_migrations(engine, report=lambda _: None) == []
+    with engine.connect() as conn:
+        # ת"ז ריקות הפכו ל-NULL ולא התנגשו באינדקס הייחודי
+        assert conn.execute(text("SELECT count(*) FROM client WHERE tz IS NULL")).scalar() == 2
+        # ת"ז קצרה רופדה כמו ב-normalize_tz
+        assert conn.execute(text("SELECT tz FROM client WHERE tz IS NOT NULL")).scalar() == "000000001"
+
+def test_failed_migration_rolls_back(tmp_path):
+    _old_schema(tmp_path / "old.db")
+    conn = sqlite3.connect(tmp_path / "old.db")
+    conn.execute("INSERT INTO client (tz) VALUES ('1')")
+    conn.commit()
+    conn.close()
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with pytest.raises(MigrationError):
+        run_migrations(engine, report=lambda _: None)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM schema_migrations")).scalars().all() == ["001"]
+        # ה-UPDATE של ת"ז ריקות בוטל יחד עם המיגרציה
+        assert conn.execute(text("SELECT count(*) FROM client WHERE tz = ''")).scalar() == 2
+
+def test_sqlite_pragmas(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'wal.db'}")
+    configure_sqlite(engine)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == Config.SQLITE_BUSY_TIMEOUT_MS
@@ -0,0 +1,95 @@
+import re
+from contextlib import contextmanager
+from datetime import date
+import pytest
+from sqlalchemy import event
+from app.models import db, Client, Grant, Pension
+from app.recalculation import recalculate_portfolio
+
+@pytest.fixture
+def client_id(app, local_cpi):
+
+    client = Client(first_name="ישראל", last_name="כהן", birth_date=date(1960, 5, 1), gender="male")
+    db.session.add(client)
+    db.session.flush()
+    db.session.add(Pension(client_id=client.id, payer_name="קרן", start_date=date(2025, 6, 1)))
+    for j in range(3):
+        db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=20000.0 * (j + 1),
+                             work_start_date=date(1985 + 5 * j, 1, 1), work_end_date=date(1995 + 5 * j, 6, 30)))
+    db.session.commit()
+    yield client.id
+
+@contextmanager
+def capture_writes():
+    writes = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if re.match(r"\s*(INSERT|UPDATE|DELETE)", statement, re.I):
+            # executemany - שורה לכל סט פרמטרים
+            writes.extend([statement] * (len(parameters) if executemany else 1))
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield writes
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+def test_summary_is_read_only_by_default(app, client_id):
+    http = app.test_client()
+    with capture_writes() as writes:
+        resp = http.post("/api/calculate-exemption-summary", json={"client_id": client_id})
+    assert resp.status_code == 200 and writes == []
+    db.session.expire_all()
+    assert all(g.grant_indexed_amount is None for g in Grant.query.filter_by(client_id=client_id))
+
+def test_persist_writes_only_changed_grants(app, client_id):
+    http = app.test_client()
+    with capture_writes() as writes:
+        http.post("/api/calculate-exemption-summary", json={"client_id": client_id, "persist": True})
+    assert len(writes) == 3
+    db.session.expire_all()
+    assert all(g.calc_inputs_hash and g.grant_indexed_amount for g in Grant.query.filter_by(client_id=client_id))
+
+    # אותם קלטים - אין מה לכתוב
+    with capture_writes() as writes:
+        http.post("/api/calculate-exemption-summary", json={"client_id": client_id, "persist": True})
+    assert writes == []
+
+    # שינוי בסכום של מענק אחד - רק הוא נכתב מחדש
+    grant = Grant.query.filter_by(client_id=client_id).first()
+    grant.grant_amount = 12345.0
+    db.session.commit()
+    db.session.expire_all()
+    with capture_writes() as writes:
+        http.post("/api/calculate-exemption-summary", json={"client_id": client_id, "persist": True})
+    assert len(writes) == 1
+
+def test_recalculation_skips_grants_persisted_by_summary(app, client_id):
+    app.test_client().post("/api/calculate-exemption-summary", json={"client_id": client_id, "persist": True})
+    result = recalculate_portfolio(workers=0, report=lambda msg: None)
+    assert result["grants"] == 3 and result["written"] == 0
+
+@pytest.mark.parametrize("path", ["summary", "recalculation"])
+def test_grant_without_result_is_cleared_by_both_paths(app, client_id, path):
+    http = app.test_client()
+    http.post("/api/calculate-exemption-summary", json={"client_id": client_id, "persist": True})
+    grant = Grant.query.filter_by(client_id=client_id).first()
+    grant.work_end_date = None  # אין יותר תוצאה למענק
+    db.session.commit()
+
+    if path == "summary":
+        http.post("/api/calculate-exemption-summary", json={"client_id": client_id, "persist": True})
+    else:
+        recalculate_portfolio(workers=0, report=lambda msg: None)
+    db.session.expire_all()
+    grant = db.session.get(Grant, grant.id)
+    assert (grant.grant_indexed_amount, grant.grant_ratio, grant.limited_indexed_amount,
+            grant.impact_on_exemption) == (0, 0, 0, 0)
+
+    # ריצה של הנתיב השני על אותם קלטים - אין מה לכתוב
+    if path == "summary":
+        assert recalculate_portfolio(workers=0, report=lambda msg: None)["written"] == 0
+    else:
+        with capture_writes() as writes:
+            http.post("/api/calculate-exemption-summary", json={"client_id": client_id, "persist": True})
+        assert writes == []
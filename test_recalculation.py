@@ -0,0 +1,62 @@
+import json
+from datetime import date
+import pytest
+from app.models import db, Client, Grant, Pension
+from app.engine import compute_grant, calculate_eligibility_age
+from app.utils import to_grant_inputs, index_grant_inputs
+from app.recalculation import recalculate_portfolio
+
+@pytest.fixture
+def portfolio(app, local_cpi):
+
+    client_ids = []
+    for i in range(5):
+        client = Client(first_name=f"לקוח {i}", last_name="כהן", birth_date=date(1955 + i, 3, 1), gender="male")
+        db.session.add(client)
+        db.session.flush()
+        client_ids.append(client.id)
+        if i != 2:  # לקוח ללא קצבה מדולג
+            db.session.add(Pension(client_id=client.id, payer_name="קרן", start_date=date(2024, 1, 1)))
+        for j in range(3):
+            db.session.add(Grant(client_id=client.id, employer_name="מעסיק", grant_amount=10000.0 * (j + 1),
+                                 work_start_date=date(1980 + 5 * j, 1, 1), work_end_date=date(1990 + 5 * j, 6, 30)))
+    db.session.commit()
+    yield client_ids
+
+def _expected(client_id):
+    client = db.session.get(Client, client_id)
+    elig = calculate_eligibility_age(client.birth_date, client.gender, client.pensions[0].start_date)
+    grants = Grant.query.filter_by(client_id=client_id).all()
+    indexed = index_grant_inputs(to_grant_inputs(grants), elig)
+    return {g.id: compute_grant(i, elig, indexed[g.id]) for g, i in zip(grants, to_grant_inputs(grants))}
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_recalculation_matches_engine(portfolio, tmp_path, workers):
+    checkpoint = str(tmp_path / "checkpoint.json")
+    result = recalculate_portfolio(chunk_size=2, workers=workers, checkpoint_path=checkpoint, report=lambda msg: None)
+    assert result["clients"] == 4 and result["grants"] == 12
+
+    db.session.expire_all()
+    for client_id in portfolio:
+        grants = Grant.query.filter_by(client_id=client_id).all()
+        if client_id == portfolio[2]:
+            assert all(g.grant_ratio is None for g in grants)
+            continue
+        expected = _expected(client_id)
+        for grant in grants:
+            assert grant.grant_indexed_amount == expected[grant.id].indexed_full
+            assert grant.grant_ratio == expected[grant.id].ratio
+            assert grant.impact_on_exemption == expected[grant.id].impact
+
+def test_resumes_after_checkpoint(portfolio, tmp_path):
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({"last_client_id": portfolio[1], "clients": 2, "grants": 6}))
+
+    result = recalculate_portfolio(chunk_size=10, workers=0, checkpoint_path=str(checkpoint), report=lambda msg: None)
+
+    assert result["clients"] == 4 and result["grants"] == 12
+    db.session.expire_all()
+    assert all(g.grant_ratio is None for g in Grant.query.filter(Grant.client_id <= portfolio[1]))
+    assert all(g.grant_ratio is not None for g in Grant.query.filter(Grant.client_id > portfolio[2]))
+    # ריצה שהושלמה מוחקת את נקודת הביקורת
+    assert not checkpoint.exists()
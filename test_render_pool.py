@@ -0,0 +1,118 @@
+import sys
+import tempfile
+import textwrap
+import pytest
+from app.render_pool import RenderPool, RenderError, RenderTimeout, RenderQueueFull
+
+# תהליך שמדבר בפרוטוקול של wkhtmltopdf --read-args-from-stdin: שורת ארגומנטים לכל
+# עבודה, התקדמות ו-"Done" ב-stderr בסיום
+FAKE_RENDERER = textwrap.dedent("""
+    import os, sys, time
+
+    def parse(line):
+        # כמו parseString של wkhtmltopdf: \\ מבטל את התו הבא, מרכאות מחברות רווחים
+        args, current, in_arg, quoted, escaped = [], "", False, False, False
+        for char in line:
+            if escaped:
+                current, in_arg, escaped = current + char, True, False
+            elif char == "\\\\":
+                escaped = True
+            elif char == '"':
+                quoted, in_arg = not quoted, True
+            elif char.isspace() and not quoted:
+                if in_arg:
+                    args.append(current)
+                current, in_arg = "", False
+            else:
+                current, in_arg = current + char, True
+        return args
+
+    for line in sys.stdin:
+        args = parse(line)
+        source, target = args[-2], args[-1]
+        html = open(source, encoding="utf-8").read()
+        sys.stderr.write("Loading pages (1/6)\\r[====>   ] 50%\\r")
+        if "SLEEP" in html:
+            time.sleep(30)
+        if "FAIL" in html:
+            sys.stderr.write("Exit with code 1 due to network error: HostNotFoundError\\n")
+            sys.stderr.flush()
+            continue
+        with open(target, "wb") as f:
+            f.write(("%PDF-fake " + str(os.getpid()) + " " + " ".join(args[:-2]) + " " + html).encode("utf-8"))
+        sys.stderr.write("Done\\n")
+        sys.stderr.flush()
+""")
+
+@pytest.fixture
+def make_pool(tmp_path):
+    script = tmp_path / "fake_wkhtmltopdf.py"
+    script.write_text(FAKE_RENDERER)
+    pools = []
+
+    def make(**kwargs):
+        pool = RenderPool(command=[sys.executable, str(script)], **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+def test_processes_stay_warm(make_pool):
+    pool = make_pool(size=1)
+    outputs = [pool.render(f"<p>מסמך {i}</p>", {"page-size": "A4"}) for i in range(5)]
+    assert all(output.startswith(b"%PDF") for output in outputs)
+    assert len({output.split()[1] for output in outputs}) == 1  # אותו תהליך
+    assert "מסמך 3".encode() in outputs[3] and b"--page-size A4" in outputs[3]
+    stats = pool.stats()
+    assert stats["processes_started"] == 1 and stats["completed"] == 5 and stats["queued"] == 0
+
+def test_render_many_keeps_order(make_pool):
+    pool = make_pool(size=2)
+    results = pool.render_many([(f"<p>{i}</p>", {"orientation": "landscape"}) for i in range(6)])
+    assert [result.rsplit(b" ", 1)[1] for result in results] == [f"<p>{i}</p>".encode() for i in range(6)]
+    assert pool.stats()["processes_started"] <= 2
+
+def test_timeout_kills_and_replaces_process(make_pool):
+    pool = make_pool(size=1, timeout=0.5)
+    with pytest.raises(RenderTimeout):
+        pool.render("SLEEP")
+    assert pool.render("<p>אחרי</p>").startswith(b"%PDF")
+    stats = pool.stats()
+    assert stats["timeouts"] == 1 and stats["processes_started"] == 2 and stats["processes"] == 1
+
+def test_failed_job(make_pool):
+    pool = make_pool(size=1)
+    results = pool.render_many([("FAIL", None), ("<p>ok</p>", None)])
+    assert isinstance(results[0], RenderError) and "network error" in str(results[0])
+    assert results[1].startswith(b"%PDF")
+    assert pool.stats()["failed"] == 1
+
+def test_queue_is_bounded(make_pool):
+    pool = make_pool(size=1, queue_size=0, timeout=1)
+    running = pool.submit("SLEEP")
+    with pytest.raises(RenderQueueFull):
+        pool.submit("<p>נדחה</p>")
+    assert pool.stats()["rejected"] == 1
+    with pytest.raises(RenderTimeout):
+        running.result()
+
+def test_process_recycled_after_max_jobs(make_pool):
+    pool = make_pool(size=1, max_jobs=2)
+    for i in range(3):
+        pool.render(f"<p>{i}</p>")
+    assert pool.stats()["processes_started"] == 2
+
+def test_job_line_quotes_spaces(make_pool, tmp_path, monkeypatch):
+    # תיקייה זמנית עם רווח, כמו "C:\\Users\\First Last\\AppData\\Local\\Temp"
+    (tmp_path / "temp dir").mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path / "temp dir"))
+    pool = make_pool(size=1)
+    output = pool.render("<p>ok</p>", {"title": 'דו"ח  שנתי', "footer-left": "a\\b"})
+    assert '--title דו"ח  שנתי --footer-left a\\b <p>ok</p>'.encode() in output
+    assert pool.stats()["failed"] == 0
+
+    with pytest.raises(ValueError):
+        pool.submit("<p>x</p>", {"title": "שורה\nשנייה"})
+    assert pool.stats()["submitted"] == 1
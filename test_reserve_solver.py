@@ -0,0 +1,54 @@
+import pytest
+
+@pytest.fixture
+def http(app, local_cpi):
+    yield app.test_client()
+
+@pytest.fixture
+def client_id(http):
+    cid = http.post("/api/clients", json={"first_name": "ישראל", "last_name": "כהן", "tz": "123456789",
+                                          "birth_date": "1960-05-01", "gender": "male"}).get_json()["id"]
+    http.post(f"/api/clients/{cid}/pensions", json={"payer_name": "קרן", "start_date": "2025-06-01"})
+    http.post(f"/api/clients/{cid}/grants", json={"employer_name": "מעסיק", "grant_amount": 100000,
+                                                  "work_start_date": "2000-01-01", "work_end_date": "2015-12-31"})
+    return cid
+
+def _summary(http, cid):
+    return http.post("/api/calculate-exemption-summary", json={"client_id": cid}).get_json()
+
+def test_solved_amount_reaches_target(http, client_id):
+    solved = http.post(f"/api/clients/{client_id}/reserve-grant/solve", json={"target_pension_exempt": 1500}).get_json()
+    assert solved["feasible"] and solved["max_reserved_grant_amount"] > 0
+
+    http.post(f"/api/clients/{client_id}/reserve-grant",
+              json={"reserved_grant_amount": solved["max_reserved_grant_amount"]})
+    summary = _summary(http, client_id)
+    assert summary["pension_exempt"] == pytest.approx(1500, abs=0.01)
+    assert summary["pension_exempt"] == solved["pension_exempt"]
+
+def test_rate_target_and_reverse(http, client_id):
+    by_rate = http.post(f"/api/clients/{client_id}/reserve-grant/solve", json={"target_pension_rate": 10}).get_json()
+    assert by_rate["pension_rate"] >= 10
+
+    reverse = http.post(f"/api/clients/{client_id}/reserve-grant/solve",
+                        json={"reserved_grant_amount": by_rate["max_reserved_grant_amount"]}).get_json()
+    assert reverse["pension_exempt"] == by_rate["pension_exempt"]
+
+    infeasible = http.post(f"/api/clients/{client_id}/reserve-grant/solve", json={"target_pension_rate": 100}).get_json()
+    assert infeasible["feasible"] is False and infeasible["max_reserved_grant_amount"] == 0
+
+def test_requires_exactly_one_target(http, client_id):
+    assert http.post(f"/api/clients/{client_id}/reserve-grant/solve", json={}).status_code == 400
+    assert http.post(f"/api/clients/{client_id}/reserve-grant/solve",
+                     json={"target_pension_rate": 10, "target_pension_exempt": 100}).status_code == 400
+
+def test_degraded_summary_is_not_solved(http, client_id, monkeypatch):
+    from app import indexation
+    monkeypatch.setattr(indexation, "index_grants", lambda requests, *a: [None] * len(requests))
+    resp = http.post(f"/api/clients/{client_id}/reserve-grant/solve", json={"target_pension_exempt": 1500})
+    assert resp.status_code == 503 and resp.get_json()["indexation_failures"]
+
+def test_bad_eligibility_date(http, client_id):
+    resp = http.post(f"/api/clients/{client_id}/reserve-grant/solve",
+                     json={"target_pension_exempt": 1500, "eligibility_date": "bad"})
+    assert resp.status_code == 400
@@ -0,0 +1,82 @@
+import pytest
+from config import Config
+from app import cpi, factor_cache, summary_cache
+from app.cpi import write_cpi_series
+from app.cbs_standin import synthetic_cpi_values
+
+def _create_client(app):
+    http = app.test_client()
+    cid = http.post("/api/clients", json={"first_name": "ישראל", "last_name": "כהן", "tz": "123456789",
+                                          "birth_date": "1960-05-01", "gender": "male"}).get_json()["id"]
+    http.post(f"/api/clients/{cid}/pensions", json={"payer_name": "קרן", "start_date": "2025-06-01"})
+    http.post(f"/api/clients/{cid}/grants", json={"employer_name": "מעסיק", "grant_amount": 50000,
+                                                  "work_start_date": "2000-01-01", "work_end_date": "2010-12-31"})
+    return cid
+
+@pytest.fixture
+def client_id(app, local_cpi):
+    return _create_client(app)
+
+def _summary(app, cid):
+    resp = app.test_client().post("/api/calculate-exemption-summary", json={"client_id": cid})
+    assert resp.status_code == 200
+    return resp.get_json()
+
+def test_unchanged_client_is_served_from_cache(app, client_id):
+    first = _summary(app, client_id)
+    second = _summary(app, client_id)
+    assert first == second
+    assert summary_cache.stats()["misses"] == 1
+    assert summary_cache.stats()["hits"] == 1
+
+def test_write_routes_invalidate(app, client_id):
+    http = app.test_client()
+    before = _summary(app, client_id)
+
+    http.post(f"/api/clients/{client_id}/grants", json={"employer_name": "מעסיק ב", "grant_amount": 20000,
+                                                        "work_start_date": "2011-01-01", "work_end_date": "2015-12-31"})
+    after_grant = _summary(app, client_id)
+    assert after_grant["grants_nominal"] == before["grants_nominal"] + 20000
+
+    http.post(f"/api/clients/{client_id}/reserve-grant", json={"reserved_grant_amount": 10000})
+    after_reserve = _summary(app, client_id)
+    assert after_reserve["reserved_grant_nominal"] == 10000
+    assert summary_cache.stats()["misses"] == 3
+
+def test_new_cpi_vintage_invalidates(app, client_id, local_cpi):
+    _summary(app, client_id)
+    write_cpi_series(synthetic_cpi_values(end_year=2027), local_cpi)
+    cpi.reset_cpi_series()
+    _summary(app, client_id)
+    assert summary_cache.stats()["misses"] == 2
+
+def test_cache_is_size_bounded(app, client_id, monkeypatch):
+    monkeypatch.setattr(Config, "SUMMARY_CACHE_SIZE", 2)
+    for elig in ("2025-06-01", "2025-07-01", "2025-08-01"):
+        summary_cache.get_summary(client_id, elig)
+    stats = summary_cache.stats()
+    assert stats["size"] == 2 and stats["evictions"] == 1
+
+def test_degraded_summary_is_not_cached(app, client_id, monkeypatch):
+    from app import indexation
+    real_index_grants = indexation.index_grants
+    monkeypatch.setattr(indexation, "index_grants", lambda requests, *a: [None] * len(requests))
+    degraded = _summary(app, client_id)
+    assert degraded["indexation_failures"] and degraded["grants_indexed_full"] == 0
+    assert summary_cache.stats()["size"] == 0
+
+    monkeypatch.setattr(indexation, "index_grants", real_index_grants)
+    summary = _summary(app, client_id)
+    assert summary["indexation_failures"] == [] and summary["grants_indexed_full"] > 0
+    assert summary_cache.stats()["size"] == 1
+
+def test_cbs_vintage_invalidates_without_local_series(app, cbs_standin):
+    client_id = _create_client(app)
+    _summary(app, client_id)
+    _summary(app, client_id)
+    assert summary_cache.stats()["misses"] == 1
+
+    # מקדם הבדיקה מול הלמ"ס השתנה - פורסם מדד חדש
+    factor_cache._set_meta(factor_cache._connect(), 'cbs_vintage', 'changed')
+    _summary(app, client_id)
+    assert summary_cache.stats()["misses"] == 2